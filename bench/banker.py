@@ -0,0 +1,156 @@
+import argparse
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent)) # run from anywhere: python bench/banker.py
+
+from scanner.utils.locking import Locking
+
+# Grants per second of the Banker's allocator against the previous implementation (kept below as
+# LegacyLocking), over a replayed random request/release workload. Both must make the same decisions.
+# usage: python bench/banker.py --processes 8 64 256 --resources 1 3 8 --ops 20000
+
+
+class LegacyLocking:
+    # the allocator before the incremental rewrite: deep copy + full O(p^2 r) safety pass per request.
+    # one fix applied: _is_safe used to get new_available itself and grow it, which then became
+    # self.available. it gets a copy here, otherwise the decisions can't be compared
+    def __init__(self, total_resources: List[int], max_claim: List[List[int]]):
+        self._lock = threading.RLock()
+        self.available = total_resources[:]
+        self.max_claim = [row[:] for row in max_claim]
+        self.num_processe = len(max_claim)
+        self.num_resources = len(total_resources)
+        self.allocated = [[0]*self.num_resources for _ in range(self.num_processe)]
+
+    def request(self, pid: int, req: List[int]) -> bool:
+        with self._lock:
+            if any(r > self.max_claim[pid][i] - self.allocated[pid][i] for i, r in enumerate(req)):
+                return False
+            if any(r > self.available[i] for i, r in enumerate(req)):
+                return False
+            new_available = [a - r for a, r in zip(self.available, req)]
+            new_allocated = [row[:] for row in self.allocated]
+            for i in range(self.num_resources):
+                new_allocated[pid][i] += req[i]
+            if not self._is_safe(new_available[:], new_allocated):
+                return False
+            self.available = new_available
+            self.allocated = new_allocated
+            return True
+
+    def release(self, pid: int, rel: List[int]) -> None:
+        with self._lock:
+            for i, r in enumerate(rel):
+                to_release = min(r, self.allocated[pid][i])
+                self.available[i] += to_release
+                self.allocated[pid][i] -= to_release
+
+    def _is_safe(self, work: List[int], allocated: List[List[int]]) -> bool:
+        need = [[self.max_claim[p][i] - allocated[p][i] for i in range(self.num_resources)]
+                for p in range(self.num_processe)]
+        finish = [False]*self.num_processe
+        while True:
+            progressed = False
+            for p in range(self.num_processe):
+                if not finish[p] and all(need[p][i] <= work[i] for i in range(self.num_resources)):
+                    for i in range(self.num_resources):
+                        work[i] += allocated[p][i]
+                    finish[p] = True
+                    progressed = True
+            if not progressed:
+                break
+        return all(finish)
+
+
+def workload(processes: int, resources: int, ops: int, seed: int):
+    # claims sized so the pool is contended: the claims add up to ~2x the total per resource
+    rng = random.Random(seed)
+    total = [max(4, processes * 2) for _ in range(resources)]
+    claims = [[rng.randint(1, 8) for _ in range(resources)] for _ in range(processes)]
+    steps = []
+    for _ in range(ops):
+        pid = rng.randrange(processes)
+        if rng.random() < 0.6:
+            steps.append(("req", pid, [rng.randint(0, 2) for _ in range(resources)]))
+        else:
+            steps.append(("rel", pid, [rng.randint(0, 2) for _ in range(resources)]))
+    return total, claims, steps
+
+
+def replay(cls, total, claims, steps):
+    allocator = cls(total, claims)
+    decisions = []
+    start = time.perf_counter()
+    for kind, pid, vector in steps:
+        if kind == "req":
+            decisions.append(allocator.request(pid, vector))
+        else:
+            allocator.release(pid, vector)
+    return time.perf_counter() - start, decisions, allocator
+
+
+def replay_batched(total, claims, steps, batch: int):
+    # the same workload through request_many, consecutive requests are sent as one batch
+    allocator = Locking(total, claims)
+    decisions = []
+    pending = []
+    start = time.perf_counter()
+    for kind, pid, vector in steps:
+        if kind == "req":
+            pending.append((pid, vector))
+            if len(pending) < batch:
+                continue
+        if pending:
+            decisions.extend(allocator.request_many(pending))
+            pending = []
+        if kind == "rel":
+            allocator.release(pid, vector)
+    if pending:
+        decisions.extend(allocator.request_many(pending))
+    return time.perf_counter() - start, decisions
+
+
+def run(process_counts, resource_counts, ops: int, batch: int = 16, seed: int = 1):
+    # one result row per (processes, resources), also used by bench/run.py
+    for processes in process_counts:
+        for resources in resource_counts:
+            total, claims, steps = workload(processes, resources, ops, seed)
+            t_old, old, _ = replay(LegacyLocking, total, claims, steps)
+            t_new, new, allocator = replay(Locking, total, claims, steps)
+            t_batch, _ = replay_batched(total, claims, steps, batch)
+            assert old == new, f"decisions differ for {processes} processes, {resources} resources"
+            granted = sum(new)
+            yield {'processes': processes, 'resources': resources, 'granted': granted, 'seconds': t_new,
+                   'legacy_grants_per_s': granted / t_old, 'grants_per_s': granted / t_new,
+                   'speedup': t_old / t_new, 'batched_grants_per_s': granted / t_batch,
+                   'fast_path_share': allocator.stats['fast_path'] / max(1, allocator.stats['granted'])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FileLens Banker's allocator benchmark")
+    parser.add_argument("--processes", type=int, nargs="+", default=[8, 64, 256])
+    parser.add_argument("--resources", type=int, nargs="+", default=[1, 3, 8])
+    parser.add_argument("--ops", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=16, help="Batch size for the request_many run. (Default: 16)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'procs':>5} {'res':>3} | {'legacy grants/s':>15} | {'new grants/s':>12} {'speedup':>8} | "
+          f"{'batched grants/s':>16} | {'fast path':>9}")
+    try:
+        for row in run(args.processes, args.resources, args.ops, args.batch, args.seed):
+            print(f"{row['processes']:>5} {row['resources']:>3} | {row['legacy_grants_per_s']:>15,.0f} | "
+                  f"{row['grants_per_s']:>12,.0f} {row['speedup']:>7.1f}x | {row['batched_grants_per_s']:>16,.0f} | "
+                  f"{row['fast_path_share']:>8.0%}")
+    except AssertionError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
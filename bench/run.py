@@ -0,0 +1,267 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT)) # run from anywhere: python bench/run.py
+sys.path.insert(0, str(ROOT / "bench"))
+
+import banker
+import startup
+import treegen
+from scanner.service.prune import PruneRules
+from scanner.service.scan import scan_tree, ScanOptions
+
+# The benchmark suite. Every performance change is judged against it:
+#   python bench/run.py --output before.json                     # on the old commit
+#   python bench/run.py --output after.json --baseline before.json
+# exits with 1 when a result is more than --threshold slower than the baseline.
+#
+# suites: scan (thread/process settings over synthetic trees from treegen.py, and with prune rules), report (PDF at
+# several file counts, cold and with a cached chart), cleanup (age queries, reclaim plan, trash), banker and startup (the
+# standalone scripts in this directory). Trees are kept in --workdir and reused between runs.
+
+SUITES = ["scan", "report", "cleanup", "banker", "startup"]
+SCAN_SHAPES = ["wide", "deep", "tiny", "links", "mixed"]
+NOISE_FLOOR = 0.005 # seconds, results this small are too noisy to compare by ratio
+
+
+def best_of(repeat: int, func, *args, **kwargs) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def scan_settings(cpus: int) -> Dict[str, Dict[str, Any]]:
+    settings = {"thread-1": {"threads": 1}, "thread-4": {"threads": 4}, "thread-16": {"threads": 16}}
+    if cpus > 1:
+        settings[f"process-{cpus}"] = {"threads": 4, "engine": "process", "processes": cpus}
+    return settings
+
+
+def suite_scan(args, results: Dict[str, Any]):
+    for shape in SCAN_SHAPES:
+        tree = args.workdir / f"tree-{shape}"
+        manifest = treegen.generate(tree, shape, args.files, args.seed)
+        scan_tree(str(tree), threads=4) # warm the dentry and inode caches, every setting starts equal
+        for name, kwargs in scan_settings(os.cpu_count() or 1).items():
+            seconds = best_of(args.repeat, scan_tree, str(tree), **kwargs)
+            results[f"scan/{shape}/{name}"] = {"seconds": seconds,
+                                              "files_per_s": round(manifest["total_files"] / seconds)}
+            print(f"scan/{shape}/{name}: {seconds:.3f} s")
+
+    # time saved by prune rules: the mixed tree without its deep and links parts
+    tree = args.workdir / "tree-mixed"
+    rules = PruneRules(["/deep", "/links"])
+    seconds = best_of(args.repeat, scan_tree, str(tree), threads=4, options=ScanOptions(prune=rules))
+    saved = results["scan/mixed/thread-4"]["seconds"] - seconds
+    results["scan/mixed/thread-4-pruned"] = {"seconds": seconds, "saved_s": round(saved, 4)}
+    print(f"scan/mixed/thread-4-pruned: {seconds:.3f} s ({saved:.3f} s saved)")
+
+
+def synthetic_summary(files: int, seed: int) -> Dict[str, Any]:
+    # a scan result without a tree behind it, the reporter only reads the records
+    from scanner.service.scan import new_summary, file_type_of
+    from scanner.utils.filetable import FileTable
+    from scanner.utils.sketches import ScanAggregates
+
+    rng = random.Random(seed)
+    now = time.time()
+    summary = new_summary()
+    table = FileTable()
+    aggregates = ScanAggregates(now)
+    for i in range(files):
+        name = f"file{i:07d}{treegen.EXTENSIONS[i % len(treegen.EXTENSIONS)]}"
+        dir = f"/data/d{i // 1000:04d}"
+        size = int(rng.paretovariate(1.2) * 1024)
+        mtime = now - rng.random() * 5 * treegen.YEAR
+        type_name = file_type_of(name)
+        table.append(dir, name, size, mtime, mtime, type_name)
+        aggregates.add(f"{dir}/{name}", size, mtime, mtime)
+        entry = summary['by_type'].setdefault(type_name, {'count': 0, 'size': 0})
+        entry['count'] += 1
+        entry['size'] += size
+        summary['total_files'] += 1
+        summary['total_size'] += size
+    summary['all_files_details'] = table
+    summary['aggregates'] = aggregates
+    return summary
+
+
+def suite_report(args, results: Dict[str, Any]):
+    try:
+        import matplotlib, reportlab # noqa: F401, the reporter imports them lazily
+    except ImportError as e:
+        print(f"report suite skipped: {e}")
+        return
+    from scanner.service.reporter import Reporter, clear_render_cache
+
+    def cold(reporter, summary):
+        clear_render_cache() # the chart is drawn every time, as on the first report of a scan
+        reporter.write_summary_report(summary, None)
+
+    for files in args.report_files:
+        summary = synthetic_summary(files, args.seed)
+        out = args.workdir / "reports"
+        for mode, stream in (("pdf", False), ("stream", True)):
+            if mode == "pdf" and files > 50000:
+                continue # the full PDF is always streamed at this size anyway
+            reporter = Reporter(out, "bar", False, stream=stream)
+            seconds = best_of(args.repeat, cold, reporter, summary)
+            results[f"report/{mode}/{files}"] = {"seconds": seconds}
+            print(f"report/{mode}/{files}: {seconds:.3f} s")
+        # the same scan again, its chart comes from the render cache
+        reporter = Reporter(out, "bar", False, stream=True)
+        seconds = best_of(args.repeat, reporter.write_summary_report, summary, None)
+        results[f"report/cached/{files}"] = {"seconds": seconds}
+        print(f"report/cached/{files}: {seconds:.3f} s")
+        shutil.rmtree(out, ignore_errors=True)
+
+
+def suite_cleanup(args, results: Dict[str, Any]):
+    try:
+        from scanner.service.cleanup import CleanupManager
+    except ImportError as e:
+        print(f"cleanup suite skipped: {e}")
+        return
+
+    tree = args.workdir / "tree-tiny"
+    treegen.generate(tree, "tiny", args.files, args.seed)
+    files = scan_tree(str(tree), threads=4, collect_files=True)['all_files_details']
+    manager = CleanupManager(30, False)
+
+    def queries():
+        manager._age_index = None # the index build is part of the first query
+        for days in (1, 30, 90, 365, 1000):
+            manager.age_days = days
+            manager.find_old_files(files)
+
+    queries() # first use imports numpy, that is startup cost and not what this measures
+    seconds = best_of(args.repeat, queries)
+    results["cleanup/find_old"] = {"seconds": seconds}
+    print(f"cleanup/find_old: {seconds:.3f} s")
+
+    paths = [Path(path) for path in files.paths()]
+    seconds = best_of(args.repeat, manager.plan_reclaim, paths)
+    results["cleanup/plan_reclaim"] = {"seconds": seconds}
+    print(f"cleanup/plan_reclaim: {seconds:.3f} s")
+
+    # trashing is destructive: a fresh tree per run, and a private trash directory
+    trash_files = max(100, args.files // 10)
+    best = float("inf")
+    saved = os.environ.get("XDG_DATA_HOME")
+    try:
+        for _ in range(args.repeat):
+            target = args.workdir / "tree-trash"
+            treegen.generate(target, "tiny", trash_files, args.seed, force=True)
+            os.environ["XDG_DATA_HOME"] = str(args.workdir / "trash-home")
+            paths = [Path(path) for path in scan_tree(str(target), collect_files=True)['all_files_details'].paths()]
+            start = time.perf_counter()
+            manager.execute_send_to_trash(paths)
+            best = min(best, time.perf_counter() - start)
+            shutil.rmtree(args.workdir / "trash-home", ignore_errors=True)
+    finally:
+        if saved is None:
+            os.environ.pop("XDG_DATA_HOME", None)
+        else:
+            os.environ["XDG_DATA_HOME"] = saved
+    results["cleanup/trash"] = {"seconds": best, "files_per_s": round(trash_files / best)}
+    print(f"cleanup/trash: {best:.3f} s")
+
+
+def suite_banker(args, results: Dict[str, Any]):
+    best: Dict[str, Dict[str, Any]] = {}
+    for _ in range(args.repeat):
+        for row in banker.run([8, 64, 256], [1, 3, 8], ops=5000, seed=args.seed):
+            key = f"banker/p{row['processes']}-r{row['resources']}"
+            if key not in best or row['seconds'] < best[key]['seconds']:
+                best[key] = row
+    for key, row in best.items():
+        results[key] = {"seconds": row['seconds'], "grants_per_s": round(row['grants_per_s']),
+                        "speedup_vs_legacy": round(row['speedup'], 2)}
+        print(f"{key}: {row['grants_per_s']:,.0f} grants/s")
+
+
+def suite_startup(args, results: Dict[str, Any]):
+    measured = startup.measure(max(3, args.repeat))
+    for name, result in measured["commands"].items():
+        key = "startup/" + "-".join(name.replace("-", " ").split()) # "scan --help" -> startup/scan-help
+        results[key] = {"seconds": result["overhead_ms"] / 1000, "heavy_imports": result["heavy_imports"]}
+        print(f"{key}: +{result['overhead_ms']} ms")
+
+
+def metadata(args) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "-C", str(ROOT), "rev-parse", "--short", "HEAD"],
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"time": datetime.datetime.now().isoformat(timespec="seconds"), "commit": commit,
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "files": args.files, "repeat": args.repeat, "seed": args.seed}
+
+
+def compare(baseline: Dict[str, Any], results: Dict[str, Any], threshold: float) -> List[str]:
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get("results", {}).get(key)
+        if not before:
+            continue
+        if max(result["seconds"], before["seconds"]) < NOISE_FLOOR:
+            continue
+        if result["seconds"] > before["seconds"] * (1 + threshold) + NOISE_FLOOR:
+            regressions.append(f"{key}: {result['seconds']:.4f} s vs {before['seconds']:.4f} s "
+                               f"(+{result['seconds'] / before['seconds'] - 1:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FileLens benchmark suite")
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=SUITES)
+    parser.add_argument("--files", type=int, default=20000, help="Files per generated tree. (Default: 20000)")
+    parser.add_argument("--report-files", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3, help="Best of N runs per result. (Default: 3)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workdir", type=Path, default=Path(tempfile.gettempdir()) / "filelens-bench")
+    parser.add_argument("--output", type=Path, help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", type=Path, help="Results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown against the baseline, 0.2 = 20%%. (Default: 0.2)")
+    args = parser.parse_args()
+    args.workdir.mkdir(parents=True, exist_ok=True)
+
+    results: Dict[str, Any] = {}
+    for suite in args.suites:
+        globals()[f"suite_{suite}"](args, results)
+    output = {"meta": metadata(args), "results": results}
+
+    if args.output:
+        args.output.write_text(json.dumps(output, indent=2))
+        print(f"results saved to {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print("REGRESSIONS")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"no regressions against {args.baseline} (threshold {args.threshold:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent)) # run from anywhere: python bench/scaling.py
+
+from scanner.service.scan import scan_tree
+
+# Compares the thread engine and the process engine on 1..N cores.
+# usage: python bench/scaling.py /some/big/tree --max-cores 8 --repeat 3
+
+
+def time_scan(directory: str, repeat: int, **kwargs) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        scan_tree(directory, **kwargs)
+        best = min(best, time.perf_counter() - start) # best of n, less noise from other processes
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FileLens scan engine scaling benchmark")
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--max-cores", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads-per-process", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    directory = str(args.directory)
+    files = scan_tree(directory, threads=4)['total_files'] # warms the page cache too
+    print(f"Tree: {directory} ({files} files), best of {args.repeat} runs")
+    print(f"{'cores':>5} | {'thread (s)':>10} {'speedup':>8} | {'process (s)':>11} {'speedup':>8}")
+
+    thread_base = process_base = None
+    for cores in range(1, args.max_cores + 1):
+        t_thread = time_scan(directory, args.repeat, threads=cores, engine="thread")
+        t_process = time_scan(directory, args.repeat, threads=args.threads_per_process,
+                              engine="process", processes=cores)
+        thread_base = thread_base or t_thread
+        process_base = process_base or t_process
+        print(f"{cores:>5} | {t_thread:>10.3f} {thread_base / t_thread:>7.2f}x | "
+              f"{t_process:>11.3f} {process_base / t_process:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Startup time benchmark. Exits with 1 when startup regressed, so it can run in CI.
+#   python bench/startup.py                                   # absolute limits only
+#   python bench/startup.py --save-baseline bench/startup.json
+#   python bench/startup.py --baseline bench/startup.json     # also compare against a saved run
+#
+# Two checks:
+#   1. heavy modules must not be imported by commands that don't render anything
+#   2. per-command import overhead (command time minus a bare interpreter start) stays under a limit
+
+ROOT = Path(__file__).resolve().parent.parent
+MAIN = str(ROOT / "main.py")
+
+HEAVY_MODULES = ["matplotlib", "reportlab", "numpy", "watchdog", "magic", "send2trash"]
+
+# which heavy modules each command entry point imports, checked in a fresh interpreter
+_MARKER = "__filelens_heavy__"
+_PROBE = """
+import json, sys
+sys.argv = {argv!r}
+sys.path.insert(0, {root!r})
+_MARKER = {marker!r}
+from scanner.cli import terminal
+try:
+    terminal.run_cli()
+except SystemExit:
+    pass
+print("\\n" + _MARKER + json.dumps(sorted(m for m in {heavy!r} if m in sys.modules)))
+"""
+
+
+def commands(tree: str):
+    return {
+        "help": [MAIN, "--help"],
+        "scan": [MAIN, "scan", tree],
+        "scan --help": [MAIN, "scan", "--help"],
+        "interactive": [MAIN, "interactive"],
+    }
+
+
+def best_time(argv, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + argv, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, check=False)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def heavy_imports(argv) -> list:
+    code = _PROBE.format(argv=argv, root=str(ROOT), heavy=HEAVY_MODULES, marker=_MARKER)
+    out = subprocess.run([sys.executable, "-c", code], stdin=subprocess.DEVNULL, capture_output=True, text=True)
+    if _MARKER not in out.stdout:
+        return ["<probe failed>"]
+    return json.loads(out.stdout.rsplit(_MARKER, 1)[1])
+
+
+def measure(repeat: int, verbose: bool = False) -> dict:
+    # {"interpreter_ms", "commands": {name: {"overhead_ms", "heavy_imports"}}}, also used by bench/run.py
+    with tempfile.TemporaryDirectory() as tree: # an empty tree, the scan itself costs nothing
+        interpreter = best_time(["-c", "pass"], repeat)
+        results = {"interpreter_ms": round(interpreter * 1000, 1), "commands": {}}
+        if verbose:
+            print(f"bare interpreter: {interpreter * 1000:.1f} ms")
+
+        for name, argv in commands(tree).items():
+            overhead = max(0.0, best_time(argv, repeat) - interpreter)
+            loaded = heavy_imports(argv)
+            results["commands"][name] = {"overhead_ms": round(overhead * 1000, 1), "heavy_imports": loaded}
+            if verbose:
+                print(f"{name:<14} +{overhead * 1000:7.1f} ms   heavy imports: {', '.join(loaded) or 'none'}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FileLens CLI startup benchmark")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, default=150.0,
+                        help="Maximum import overhead per command in ms. (Default: 150)")
+    parser.add_argument("--baseline", type=Path, help="Saved results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown against the baseline, 0.25 = 25%%. (Default: 0.25)")
+    parser.add_argument("--save-baseline", type=Path, help="Write the results to this file")
+    args = parser.parse_args()
+
+    results = measure(args.repeat, verbose=True)
+    failures = []
+    for name, result in results["commands"].items():
+        if result["heavy_imports"]:
+            failures.append(f"'{name}' imports {', '.join(result['heavy_imports'])}")
+        if result["overhead_ms"] > args.max_ms:
+            failures.append(f"'{name}' import overhead {result['overhead_ms']} ms > {args.max_ms} ms")
+
+    if args.baseline and args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+        for name, result in results["commands"].items():
+            before = baseline.get("commands", {}).get(name)
+            if not before:
+                continue
+            # a few ms of noise are always allowed, small numbers would trip the ratio otherwise
+            limit = before["overhead_ms"] * (1 + args.tolerance) + 5
+            if result["overhead_ms"] > limit:
+                failures.append(f"'{name}' regressed: {result['overhead_ms']} ms vs baseline {before['overhead_ms']} ms")
+
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(results, indent=2))
+        print(f"results saved to {args.save_baseline}")
+
+    if failures:
+        print("FAIL")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
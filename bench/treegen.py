@@ -0,0 +1,160 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, Any
+
+# Synthetic directory trees for the benchmarks, the same shape, names, sizes and times for the
+# same arguments. A manifest in the root records how a tree was made, so an existing tree is
+# reused instead of being generated again (a million files take a while to create).
+#   python bench/treegen.py /tmp/trees/tiny --shape tiny --files 1000000
+#
+# shapes:
+#   wide   one level, many directories with a few files each
+#   deep   a long chain of nested directories
+#   tiny   many small files in directories of FILES_PER_DIR
+#   huge   a few very large files (sparse, they take no disk space)
+#   links  a small tree with hardlinked files and symlink loops back to its ancestors
+#   mixed  a bit of everything, a rough stand-in for a home directory
+
+SHAPES = ["wide", "deep", "tiny", "huge", "links", "mixed"]
+MANIFEST = ".treegen.json"
+FILES_PER_DIR = 1000
+EXTENSIONS = [".txt", ".log", ".py", ".jpg", ".png", ".pdf", ".json", ".csv", ".bin", ""]
+YEAR = 365 * 86400
+
+
+class _Writer:
+    def __init__(self, root: Path, seed: int, now: float):
+        self.root = root
+        self.rng = random.Random(seed)
+        self.now = now
+        self.files = 0
+        self.bytes = 0
+        self.dirs = 0
+
+    def dir(self, path: Path) -> Path:
+        path.mkdir(parents=True, exist_ok=True)
+        self.dirs += 1
+        return path
+
+    def file(self, path: Path, size: int, sparse: bool = False):
+        with open(path, "wb") as f:
+            if sparse:
+                f.truncate(size)
+            elif size:
+                f.write(self.rng.randbytes(min(size, 64)) * (size // 64) + self.rng.randbytes(size % 64))
+        age = self.rng.random() ** 2 * 5 * YEAR # mostly recent, a long tail of old files
+        os.utime(path, (self.now - age * self.rng.random(), self.now - age))
+        self.files += 1
+        self.bytes += size
+
+    def small_file(self, dir: Path, i: int, max_size: int = 4096):
+        ext = EXTENSIONS[i % len(EXTENSIONS)]
+        self.file(dir / f"f{i:07d}{ext}", self.rng.randint(0, max_size))
+
+
+def _wide(w: _Writer, files: int):
+    per_dir = 5
+    for d in range(max(1, files // per_dir)):
+        dir = w.dir(w.root / f"d{d:06d}")
+        for i in range(per_dir):
+            w.small_file(dir, d * per_dir + i)
+
+
+def _deep(w: _Writer, files: int):
+    depth = max(1, min(files // 2, 400)) # deeper paths run into PATH_MAX
+    per_level = max(1, files // depth)
+    dir = w.root
+    n = 0
+    for level in range(depth):
+        dir = w.dir(dir / f"l{level}")
+        for _ in range(per_level):
+            w.small_file(dir, n)
+            n += 1
+
+
+def _tiny(w: _Writer, files: int):
+    dir = None
+    for i in range(files):
+        if i % FILES_PER_DIR == 0:
+            dir = w.dir(w.root / f"b{i // FILES_PER_DIR:05d}")
+        w.small_file(dir, i, max_size=512)
+
+
+def _huge(w: _Writer, files: int):
+    count = max(2, min(files, 16))
+    dir = w.dir(w.root / "big")
+    for i in range(count):
+        w.file(dir / f"huge{i:02d}.bin", (1 << 30) * (1 + i % 4), sparse=True)
+
+
+def _links(w: _Writer, files: int):
+    originals = []
+    for d in range(max(1, files // 20)):
+        dir = w.dir(w.root / f"d{d:04d}" / "inner")
+        for i in range(10):
+            w.small_file(dir, d * 10 + i)
+            originals.append(dir / f"f{d * 10 + i:07d}{EXTENSIONS[(d * 10 + i) % len(EXTENSIONS)]}")
+        os.symlink("../..", dir / "loop") # back to the root, a walker that follows links never ends
+    links = w.dir(w.root / "hardlinks")
+    for i, original in enumerate(originals):
+        os.link(original, links / f"h{i:07d}")
+        w.files += 1
+    os.symlink(".", w.root / "self")
+
+
+def _mixed(w: _Writer, files: int):
+    root = w.root
+    for shape, share in ((_tiny, 0.5), (_wide, 0.2), (_deep, 0.1), (_links, 0.2)):
+        w.root = root / shape.__name__.strip("_")
+        w.dir(w.root)
+        shape(w, max(1, int(files * share)))
+    w.root = root
+    _huge(w, 2)
+
+
+_BUILDERS = {"wide": _wide, "deep": _deep, "tiny": _tiny, "huge": _huge, "links": _links, "mixed": _mixed}
+
+
+def generate(root: Path, shape: str, files: int, seed: int = 1, force: bool = False) -> Dict[str, Any]:
+    # returns the manifest: {shape, files, seed, created, dirs, total_files, total_bytes}
+    if shape not in _BUILDERS:
+        raise ValueError(f"Unknown shape '{shape}', expected one of {', '.join(SHAPES)}")
+    root = Path(root)
+    params = {"shape": shape, "files": files, "seed": seed}
+    manifest_path = root / MANIFEST
+    if manifest_path.exists() and not force:
+        manifest = json.loads(manifest_path.read_text())
+        if all(manifest.get(key) == value for key, value in params.items()):
+            return manifest
+    if root.exists():
+        shutil.rmtree(root)
+    root.mkdir(parents=True)
+
+    started = time.perf_counter()
+    writer = _Writer(root, seed, now=time.time())
+    _BUILDERS[shape](writer, files)
+    manifest = {**params, "created": time.time(), "seconds": round(time.perf_counter() - started, 2),
+                "dirs": writer.dirs, "total_files": writer.files, "total_bytes": writer.bytes}
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic directory trees for FileLens benchmarks")
+    parser.add_argument("root", type=Path)
+    parser.add_argument("--shape", choices=SHAPES, default="mixed")
+    parser.add_argument("--files", type=int, default=10000, help="Approximate number of files. (Default: 10000)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--force", action="store_true", help="Regenerate even if a matching tree exists")
+    args = parser.parse_args()
+    manifest = generate(args.root, args.shape, args.files, args.seed, args.force)
+    print(json.dumps(manifest, indent=2))
+
+
+if __name__ == "__main__":
+    main()
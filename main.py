@@ -1,5 +1,4 @@
 from scanner.cli.terminal import run_cli
-from scanner.service import scan
 
 if __name__=="__main__":
     run_cli()
\ No newline at end of file
@@ -0,0 +1,373 @@
+import argparse
+import datetime
+import shlex
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from scanner.cli.terminal import add_scan_args, print_top_dirs, run_scan, scan_options, write_report
+
+# Interactive shell over one resident scan. "scan" keeps its result in the session: the summary with
+# the FileTable of every file and the directory rollup, plus the AgeIndex, built on the first age
+# query. stats, top, findold, report, export and cleanup answer from that result and do not touch
+# the filesystem again. "refresh" scans the same directory with the same options on a background
+# thread while the prompt stays usable; the new result replaces the old one only once it is
+# complete, so a command always sees one whole scan.
+# Service modules are imported by the commands that need them, the prompt comes up at once.
+
+PROMPT = "FileLens >> "
+EXIT_COMMANDS = ("exit", "quit", "q")
+
+COMMANDS = (
+    ("scan", "Scan a directory and keep the result in the session (same options as 'main.py scan')"),
+    ("stats", "Totals and the largest file types of the current scan"),
+    ("top", "Largest directories (or files with --files) of the current scan"),
+    ("findold", "Files not modified for -d DAYS"),
+    ("report", "Write a PDF report of the current scan"),
+    ("export", "Write the file list of the current scan as csv or jsonl"),
+    ("cleanup", "Move files older than -d DAYS to the trash, after a dry run"),
+    ("refresh", "Rescan the current directory in the background"),
+    ("status", "Which directory is loaded, how old the scan is, whether a refresh is running"),
+    ("help", "Show this list"),
+)
+
+
+class _SessionParser(argparse.ArgumentParser):
+    # a typo must not end the session, errors come back as ValueError instead of sys.exit
+    def error(self, message):
+        raise ValueError(message)
+
+
+class InteractiveSession:
+    def __init__(self, detailed: bool = False):
+        self.detailed = detailed
+        self.parser = self._build_parser() # built once, not for every line
+        self._lock = threading.Lock() # guards the fields below, a refresh swaps them from its thread
+        self.summary: Optional[Dict[str, Any]] = None
+        self.root: Optional[Path] = None
+        self.scan_args: Optional[argparse.Namespace] = None # reused by refresh
+        self.scanned_at: Optional[float] = None
+        self._generation = 0 # bumped by every scan, a refresh started before a newer scan is dropped
+        self._age_index = None
+        self._refresh: Optional[threading.Thread] = None
+        self._notices: List[str] = [] # refresh results, printed before the next prompt
+
+    def _build_parser(self) -> argparse.ArgumentParser:
+        parser = _SessionParser(prog="", add_help=False)
+        subparsers = parser.add_subparsers(dest="command", parser_class=_SessionParser)
+        helps = dict(COMMANDS)
+        add_scan_args(subparsers.add_parser("scan", help=helps["scan"]))
+        subparsers.add_parser("status", help=helps["status"])
+        subparsers.add_parser("help", help=helps["help"])
+
+        stats_parser = subparsers.add_parser("stats", help=helps["stats"])
+        stats_parser.add_argument("--top", "-n", type=int, default=10, help="Number of file types listed. (Default: 10)")
+
+        top_parser = subparsers.add_parser("top", help=helps["top"])
+        top_parser.add_argument("--top", "-n", type=int, default=20, help="Number of rows. (Default: 20)")
+        top_parser.add_argument("--depth", type=int, default=None,
+                                help="Only directories this many levels below the scanned one (1: its subdirectories).")
+        top_parser.add_argument("--files", action="store_true", help="List the largest files instead of directories.")
+
+        findold_parser = subparsers.add_parser("findold", help=helps["findold"])
+        findold_parser.add_argument("-d", "--day", type=float, required=True, help="Age in days")
+        findold_parser.add_argument("--field", choices=["mtime", "atime", "ctime"], default="mtime",
+                                    help="Timestamp compared with the age. (Default: mtime)")
+        findold_parser.add_argument("--top", "-n", type=int, default=20,
+                                    help="Number of files listed, oldest first. (Default: 20)")
+
+        report_parser = subparsers.add_parser("report", help=helps["report"])
+        report_parser.add_argument("--charttype", "-C", choices=["bar", "pie", "none"], default="none",
+                                   help="Chart type for PDF report ('bar','pie','none'). (Default: none)")
+        report_parser.add_argument("--reportdir", "-O", type=Path, default=None,
+                                   help="Directory to save PDF reports. (Default: --reportdir of the scan)")
+        report_parser.add_argument("--list-files", action="store_true", help="Include the list of all files in the report.")
+        report_parser.add_argument("--stream-report", action="store_true",
+                                   help="Only the --top largest files in the PDF, the full list in a csv/jsonl file.")
+        report_parser.add_argument("--export", choices=["csv", "jsonl"], default=None,
+                                   help="Also export the file list as csv or jsonl next to the PDF.")
+        report_parser.add_argument("--top", type=int, default=100,
+                                   help="Number of largest files listed in a streamed report. (Default: 100)")
+        report_parser.add_argument("--top-dirs", type=int, default=20,
+                                   help="Number of largest directories in the report. (Default: 20)")
+
+        export_parser = subparsers.add_parser("export", help=helps["export"])
+        export_parser.add_argument("format", choices=["csv", "jsonl"], nargs="?", default="csv",
+                                   help="File format. (Default: csv)")
+        export_parser.add_argument("--output", "-o", type=Path, default=None,
+                                   help="File to write. (Default: a new file in --reportdir of the scan)")
+
+        cleanup_parser = subparsers.add_parser("cleanup", help=helps["cleanup"])
+        cleanup_parser.add_argument("-d", "--day", type=float, required=True, help="Age in days")
+        cleanup_parser.add_argument("--field", choices=["mtime", "atime", "ctime"], default="mtime",
+                                    help="Timestamp compared with the age. (Default: mtime)")
+        cleanup_parser.add_argument("--min-size", type=int, default=None, help="Only files of at least this many bytes.")
+        cleanup_parser.add_argument("--type", action="append", default=None, dest="types", metavar="EXT",
+                                    help="Only files of this type (.log, no_extension). Repeatable.")
+        cleanup_parser.add_argument("--yes", "-y", action="store_true", help="Do not ask before moving files to the trash.")
+        cleanup_parser.add_argument("--log", type=Path, default=None, help="Write the cleanup result to this file.")
+
+        refresh_parser = subparsers.add_parser("refresh", help=helps["refresh"])
+        refresh_parser.add_argument("--wait", action="store_true", help="Wait for the refresh to finish.")
+        return parser
+
+    # session state
+
+    def _current(self):
+        with self._lock:
+            return self.summary, self.root, self.scan_args, self.scanned_at
+
+    def _swap(self, summary: Dict[str, Any], root: Path, args: argparse.Namespace, scanned_at: float,
+              age_index=None, generation: Optional[int] = None) -> bool:
+        # replaces the resident scan in one step. generation: only if no newer scan came in meanwhile
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return False
+            self._generation += 1
+            self.summary = summary
+            self.root = root
+            self.scan_args = args
+            self.scanned_at = scanned_at
+            self._age_index = age_index
+            return True
+
+    def _ages(self, summary: Dict[str, Any], scanned_at: float):
+        # the AgeIndex of the resident scan, ages are counted from the time of the scan
+        from scanner.utils.ageindex import AgeIndex
+        with self._lock:
+            ages = self._age_index
+        if ages is not None and ages.table is summary['all_files_details']:
+            return ages
+        ages = AgeIndex(summary['all_files_details'], now=scanned_at)
+        with self._lock:
+            if self.summary is summary:
+                self._age_index = ages
+        return ages
+
+    def _notify(self, message: str):
+        with self._lock:
+            self._notices.append(message)
+
+    def _flush_notices(self):
+        with self._lock:
+            notices, self._notices = self._notices, []
+        for message in notices:
+            print(message)
+
+    @property
+    def refreshing(self) -> bool:
+        return self._refresh is not None and self._refresh.is_alive()
+
+    # commands
+
+    def cmd_scan(self, args):
+        if not Path(args.sdirectory).is_dir():
+            print(f"Error: Directory '{args.sdirectory}' is not valid.", file=sys.stderr)
+            return
+        if args.monitor:
+            print("Note: --monitor is not available in the interactive session, use 'refresh'.", file=sys.stderr)
+        options = scan_options(args)
+        options.collect_files = True # everything the other commands need stays in memory
+        options.dir_tree = True
+        scanned_at = time.time()
+        summary = run_scan(args, options)
+        if args.report:
+            write_report(args, summary)
+        self._swap(summary, Path(args.sdirectory).resolve(), args, scanned_at)
+
+    def cmd_stats(self, args):
+        summary, root, _, scanned_at = self._current()
+        print(f"Scan of {root}, {time.time() - scanned_at:.0f} seconds ago{' (refreshing)' if self.refreshing else ''}")
+        print(f"Total number of files: {summary['total_files']}")
+        print(f"Total size: {summary['total_size']} bytes, {summary['total_allocated']} bytes allocated on disk")
+        if 'hardlinks' in summary:
+            print(f"Hardlinks: {summary['hardlinks']['files']} extra names ({summary['hardlinks']['bytes']} bytes)")
+        if summary.get('pruned'):
+            from scanner.service.prune import format_pruned
+            print(format_pruned(summary['pruned']))
+        if summary['errors']:
+            print(f"Errors: {len(summary['errors'])} paths could not be read")
+        by_type = sorted(summary['by_type'].items(), key=lambda item: item[1]['size'], reverse=True)
+        if by_type and args.top > 0:
+            print("Largest file types:")
+            for type_name, data in by_type[:args.top]:
+                print(f" {data['size']:>16} bytes {data['count']:>9} files  {type_name}")
+
+    def cmd_top(self, args):
+        summary = self._current()[0]
+        if args.files:
+            files = summary['all_files_details']
+            for i in files.order_by_size(limit=args.top):
+                print(f" {files.sizes[i]:>16} bytes  {files.path(i)}")
+            return
+        tree = summary['dir_tree']
+        if args.depth is None:
+            print_top_dirs(summary, args.top)
+            return
+        for i in tree.heaviest(args.top, depth=args.depth):
+            row = tree.row(i)
+            print(f" {row['size']:>16} bytes {row['files']:>9} files  {row['path']}")
+
+    def cmd_findold(self, args):
+        summary, _, _, scanned_at = self._current()
+        ages = self._ages(summary, scanned_at)
+        rows = ages.older_than(args.day, args.field)
+        print(f"{len(rows)} files with {args.field} older than {args.day:g} days, {ages.total_size(rows)} bytes.")
+        files = ages.table
+        column = getattr(files, args.field + "s")
+        for i in rows[:max(0, args.top)]:
+            print(f" {datetime.datetime.fromtimestamp(column[i]):%Y-%m-%d} {files.sizes[i]:>14} bytes  {files.path(i)}")
+        if len(rows) > args.top > 0:
+            print(f" ... and {len(rows) - args.top} more")
+
+    def cmd_report(self, args):
+        from scanner.service.reporter import Reporter
+        summary, root, scan_args, _ = self._current()
+        if not (args.list_files or args.stream_report or args.export):
+            # as after a plain 'scan --report', the files were only kept for the other commands
+            summary = {key: value for key, value in summary.items() if key != 'all_files_details'}
+        reporter = Reporter(args.reportdir or scan_args.reportdir, args.charttype, self.detailed,
+                            stream=args.stream_report, top_n=args.top, export_format=args.export, top_dirs=args.top_dirs)
+        reporter.write_summary_report(summary, root)
+
+    def cmd_export(self, args):
+        from scanner.service.reporter import Reporter
+        summary, _, scan_args, _ = self._current()
+        path = args.output
+        if path is None:
+            path = scan_args.reportdir / f"FileLens_Files_{datetime.datetime.now():%Y%m%d_%H%M%S}.{args.format}"
+        elif path.suffix != f".{args.format}":
+            path = path.with_suffix(f".{args.format}") # export_file_list picks the format by suffix
+        path.parent.mkdir(parents=True, exist_ok=True)
+        Reporter(path.parent, "none", self.detailed).export_file_list(summary['all_files_details'], path)
+        print(f"{len(summary['all_files_details'])} files exported to {path}")
+
+    def cmd_cleanup(self, args):
+        from scanner.service.cleanup import CleanupManager
+        from scanner.utils.ageindex import CleanupPolicy
+        if self.refreshing:
+            # the resident scan may still list files an earlier cleanup trashed, its refresh replaces it
+            print("A refresh is running, wait for it ('refresh --wait') before the next cleanup.")
+            return
+        summary, _, _, scanned_at = self._current()
+        ages = self._ages(summary, scanned_at)
+        rows = ages.select(CleanupPolicy(args.day, args.field, args.min_size, args.types))
+        if not len(rows):
+            print("No files found matching the policy.")
+            return
+        manager = CleanupManager(int(args.day), self.detailed)
+        manager.plan_reclaim(ages.table, rows)
+        if not args.yes:
+            try:
+                answer = input(f"Move {len(rows)} files to the trash? [y/N] ")
+            except EOFError:
+                answer = ""
+            if answer.strip().lower() not in ("y", "yes"):
+                print("Cleanup cancelled.")
+                return
+        manager.execute_send_to_trash([Path(path) for path in ages.paths(rows)], log_path=args.log)
+        self.start_refresh() # the trashed files are still in the resident scan until it is replaced
+
+    def cmd_refresh(self, args):
+        if not (args.wait and self.refreshing) and not self.start_refresh():
+            return
+        if args.wait:
+            self._refresh.join()
+        else:
+            print(f"Refreshing {self.root} in the background.")
+
+    def cmd_status(self, args):
+        summary, root, _, scanned_at = self._current()
+        if summary is None:
+            print("No scan loaded.")
+            return
+        print(f"{root}: {summary['total_files']} files, {summary['total_size']} bytes, "
+              f"scanned {time.time() - scanned_at:.0f} seconds ago{', refreshing' if self.refreshing else ''}.")
+
+    def cmd_help(self, args):
+        print("Commands (<command> -h for its options):")
+        for name, text in COMMANDS:
+            print(f"  {name:<9} {text}")
+        print(f"  {'exit':<9} Leave the session")
+
+    # refresh
+
+    def start_refresh(self) -> bool:
+        with self._lock:
+            if self.summary is None:
+                print("No scan loaded, run 'scan <directory>' first.")
+                return False
+            if self._refresh is not None and self._refresh.is_alive():
+                print("A refresh is already running.")
+                return False
+            self._refresh = threading.Thread(target=self._run_refresh, args=(self.root, self.scan_args, self._generation),
+                                             name="filelens-refresh", daemon=True)
+            self._refresh.start()
+            return True
+
+    def _run_refresh(self, root: Path, args: argparse.Namespace, generation: int):
+        from scanner.service.scan import scan_tree
+        from scanner.utils.ageindex import AgeIndex
+        options = scan_options(args)
+        options.collect_files = True
+        options.dir_tree = True
+        start = time.time()
+        try:
+            summary = scan_tree(root, args.threads, args.engine, args.processes, args.index_path, options=options)
+            # built here, the first findold after the swap does not wait for it
+            age_index = AgeIndex(summary['all_files_details'], now=start)
+        except Exception as e:
+            self._notify(f"[Session] Refresh of {root} failed: {e}")
+            return
+        old = self._current()[0]
+        if not self._swap(summary, root, args, start, age_index, generation):
+            return # a scan ran meanwhile, its result is newer
+        self._notify(f"[Session] Refreshed {root} in {time.time() - start:.2f} seconds: "
+                     f"{summary['total_files']} files ({summary['total_files'] - old['total_files']:+d}), "
+                     f"{summary['total_size']} bytes ({summary['total_size'] - old['total_size']:+d}).")
+
+    # loop
+
+    def execute(self, line: str):
+        try:
+            words = shlex.split(line)
+        except ValueError as e:
+            print(f"Invalid command: {e}", file=sys.stderr)
+            return
+        if not words:
+            return
+        try:
+            args = self.parser.parse_args(words)
+        except ValueError as e:
+            print(f"Invalid command: {e}. Type 'help' for command list.", file=sys.stderr)
+            return
+        except SystemExit: # -h printed its help
+            return
+        if args.command not in ("scan", "help", "status", "refresh") and self._current()[0] is None:
+            print("No scan loaded, run 'scan <directory>' first.")
+            return
+        try:
+            getattr(self, "cmd_" + args.command)(args)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+
+    def run(self):
+        print("FileLens interactive session. Type 'help' for command list, 'exit' to leave.")
+        while True:
+            self._flush_notices()
+            try:
+                line = input(PROMPT)
+            except EOFError: # ctrl+d or end of piped input
+                break
+            except KeyboardInterrupt:
+                print()
+                continue
+            if line.strip() in EXIT_COMMANDS:
+                break
+            try:
+                self.execute(line)
+            except KeyboardInterrupt: # stops a running scan, not the session
+                print("\nInterrupted.")
+        self._flush_notices()
@@ -1,8 +1,10 @@
 import argparse
+import contextlib
+import json
 import sys
 import os
+import time
 from pathlib import Path
-from scanner.service.scan import scan
 
 def print_initial_usage_and_exit():
     # message for the first run, and "python main.py" with no args.
@@ -14,15 +16,8 @@ def print_initial_usage_and_exit():
     print("\nFor more information about a specific mode and its options, try:")
     print("  python main.py <mode> --help")
 
-def add_args(parser_obj: argparse.ArgumentParser):
-    # helper function to define the cli args for the script.
-    # 
-    subparsers = parser_obj.add_subparsers(dest="command")
-    scan_parser = subparsers.add_parser("scan", help="Run scan operation")
-    subparsers.add_parser("interactive", help="Start interactive mode")
-    report_parser = subparsers.add_parser("report", help="Create report for scan results")
-    findold_parser = subparsers.add_parser("interactive", help="Start interactive mode")
-
+def add_scan_args(scan_parser: argparse.ArgumentParser):
+    # scan options, shared by "scan" here and in the interactive session
     scan_parser.add_argument(
         "sdirectory",  # Positional argument (no -d flag needed)
         type=Path,
@@ -47,6 +42,100 @@ def add_args(parser_obj: argparse.ArgumentParser):
         default=1,
         help="Number of threads for operations. (Default: 1)"
     )
+    scan_parser.add_argument(
+        "--engine", "-e",
+        choices=["thread", "process"],
+        default="thread",
+        help="Scan engine. 'process' shards subtrees across cores, each process uses --threads threads. (Default: thread)"
+    )
+    scan_parser.add_argument(
+        "--processes", "-p",
+        type=int,
+        default=None,
+        help="Number of worker processes for '--engine process'. (Default: number of cores)"
+    )
+    scan_parser.add_argument(
+        "--index", "-i",
+        type=Path,
+        default=None,
+        dest="index_path",
+        help="Scan index file. Directories unchanged since the last scan with the same index are not listed again."
+    )
+    scan_parser.add_argument(
+        "--telemetry",
+        type=Path,
+        metavar="PATH",
+        help="Write scan metrics to PATH at the end of the scan: Prometheus text for .prom/.txt, JSON otherwise."
+    )
+    scan_parser.add_argument(
+        "--telemetry-interval",
+        type=float,
+        default=0,
+        metavar="SECONDS",
+        help="With --telemetry, also rewrite PATH with a snapshot every SECONDS while scanning."
+    )
+    scan_parser.add_argument(
+        "--race-check",
+        action="store_true",
+        help="Sample accesses to shared scan state and report data races (thread engine). Exit code 1 on races."
+    )
+    scan_parser.add_argument(
+        "--race-sample",
+        type=int,
+        default=4,
+        help="With --race-check, record one in N accesses per thread and variable. (Default: 4)"
+    )
+    scan_parser.add_argument(
+        "--govern",
+        action="store_true",
+        help="Cap open directories, reads and per-device I/O and adapt the active thread count to disk latency."
+    )
+    scan_parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        metavar="PATTERN",
+        help="Skip directories matching a .gitignore style PATTERN (node_modules, /build, **/cache). Repeatable."
+    )
+    scan_parser.add_argument(
+        "--exclude-from",
+        type=Path,
+        metavar="FILE",
+        help="Read exclude patterns from FILE, one per line like a .gitignore."
+    )
+    scan_parser.add_argument(
+        "--max-depth",
+        type=int,
+        default=None,
+        help="Do not descend more than N directories below the scanned directory."
+    )
+    scan_parser.add_argument(
+        "--one-file-system", "-x",
+        action="store_true",
+        help="Stay on the filesystem of the scanned directory, skip everything mounted below it."
+    )
+    scan_parser.add_argument(
+        "--all-filesystems",
+        action="store_true",
+        help="Also scan pseudo (/proc, /sys, /dev) and network filesystems, skipped by default."
+    )
+    scan_parser.add_argument(
+        "--sniff",
+        action="store_true",
+        help="Detect file types from content (first KB of each file) in addition to extensions."
+    )
+    scan_parser.add_argument(
+        "--sniff-budget",
+        type=int,
+        default=256,
+        help="Maximum MB read in total for content detection. (Default: 256)"
+    )
+    scan_parser.add_argument(
+        "--sniff-cache",
+        type=Path,
+        default=None,
+        help="File to cache detected types in, unchanged files are not read again on the next scan."
+    )
     scan_parser.add_argument(
         "--charttype", "-C",
         choices=["bar", "pie", "none"],
@@ -59,13 +148,72 @@ def add_args(parser_obj: argparse.ArgumentParser):
         default=Path.cwd() / "filelens_reports",
         help="Directory to save PDF reports. (Default: ./filelens_reports)"
     )
+    scan_parser.add_argument(
+        "--report", "-r",
+        action="store_true",
+        help="Write a PDF report of the scan to --reportdir."
+    )
+    scan_parser.add_argument(
+        "--list-files",
+        action="store_true",
+        help="Include the list of all files in the report."
+    )
+    scan_parser.add_argument(
+        "--stream-report",
+        action="store_true",
+        help="Bounded memory report: only the --top largest files in the PDF, the full list in a csv/jsonl file."
+    )
+    scan_parser.add_argument(
+        "--export",
+        choices=["csv", "jsonl"],
+        default=None,
+        help="Also export the file list as csv or jsonl next to the PDF."
+    )
+    scan_parser.add_argument(
+        "--top",
+        type=int,
+        default=100,
+        help="Number of largest files listed in a streamed report. (Default: 100)"
+    )
+    scan_parser.add_argument(
+        "--snapshot",
+        type=Path,
+        metavar="PATH",
+        help="Save the scan as a compressed snapshot to PATH, compare two snapshots with 'diff'."
+    )
+    scan_parser.add_argument(
+        "--top-dirs",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Print the N largest directories (with their subdirectories) after the scan, also listed in the report."
+    )
+
+def add_args(parser_obj: argparse.ArgumentParser):
+    # helper function to define the cli args for the script.
+    # 
+    subparsers = parser_obj.add_subparsers(dest="command")
+    scan_parser = subparsers.add_parser("scan", help="Run scan operation")
+    interactive_parser = subparsers.add_parser("interactive", help="Start interactive mode")
+    report_parser = subparsers.add_parser("report", help="Create reports for one or many directories or snapshots")
+    findold_parser = subparsers.add_parser("findold", help="Find files not modified for given days")
+    dupes_parser = subparsers.add_parser("dupes", help="Find duplicate files")
+    diff_parser = subparsers.add_parser("diff", help="Compare two scan snapshots")
+
+    add_scan_args(scan_parser)
+
+    interactive_parser.add_argument(
+        "-v", "--verbose",
+        action="store_true",
+        help="Enable verbose output."
+    )
 
     report_parser.add_argument(
         "rdirectory",  # Positional argument (no -d flag needed)
         type=Path,
-        help="Directory to scan or monitor. Default is the root",
-        nargs="?",  # Makes it optional
-        default=os.path.abspath(os.sep)
+        help="Directories to scan and report, or snapshots (scan --snapshot) to report. Default is the root",
+        nargs="*",
+        default=[]
     )
 
     report_parser.add_argument(
@@ -74,12 +222,289 @@ def add_args(parser_obj: argparse.ArgumentParser):
         default="none",
         help="Chart type for PDF report ('bar','pie','none'). (Default: none)"
     )
+    report_parser.add_argument(
+        "--reportdir", "-O",
+        type=Path,
+        default=Path.cwd() / "filelens_reports",
+        help="Directory to save PDF reports. (Default: ./filelens_reports)"
+    )
+    report_parser.add_argument(
+        "--from-file", "-f",
+        type=Path,
+        metavar="FILE",
+        help="Also report the directories or snapshots listed in FILE, one per line."
+    )
+    report_parser.add_argument(
+        "--processes", "-p",
+        type=int,
+        default=None,
+        help="Number of reports rendered in parallel, one worker process each. (Default: number of cores)"
+    )
+    report_parser.add_argument(
+        "--threads", "-t",
+        type=int,
+        default=1,
+        help="Number of scan threads per worker. (Default: 1)"
+    )
+    report_parser.add_argument(
+        "--top-dirs",
+        type=int,
+        default=20,
+        metavar="N",
+        help="Number of largest directories listed in each report. (Default: 20)"
+    )
+    report_parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=None,
+        help="Directory for rendered charts shared between workers and runs. (Default: REPORTDIR/.filelens_cache)"
+    )
 
+    findold_parser.add_argument(
+        "fdirectory",
+        type=Path,
+        help="Directory to search for old files. Default is the current directory",
+        nargs="?",
+        default=Path.cwd()
+    )
     findold_parser.add_argument(
         "-d", "--day",
-        help="Determine the days passed since last accessed",
-        type=int
+        help="Age in days",
+        type=float,
+        required=True
+    )
+    findold_parser.add_argument(
+        "--field",
+        choices=["mtime", "atime", "ctime"],
+        default="mtime",
+        help="Timestamp compared with the age. (Default: mtime)"
     )
+    findold_parser.add_argument(
+        "--threads", "-t",
+        type=int,
+        default=4,
+        help="Number of threads for scanning. (Default: 4)"
+    )
+    findold_parser.add_argument(
+        "--top", "-n",
+        type=int,
+        default=20,
+        help="Number of files listed, oldest first. (Default: 20)"
+    )
+
+    diff_parser.add_argument("old", type=Path, help="Earlier snapshot (scan --snapshot)")
+    diff_parser.add_argument("new", type=Path, help="Later snapshot")
+    diff_parser.add_argument(
+        "--top", "-n",
+        type=int,
+        default=10,
+        help="Number of largest changes listed per kind. (Default: 10)"
+    )
+    diff_parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print the diff as JSON."
+    )
+
+    dupes_parser.add_argument(
+        "ddirectory",
+        type=Path,
+        help="Directory to search for duplicates. Default is the current directory",
+        nargs="?",
+        default=Path.cwd()
+    )
+    dupes_parser.add_argument(
+        "--threads", "-t",
+        type=int,
+        default=4,
+        help="Number of threads for scanning and hashing. (Default: 4)"
+    )
+    dupes_parser.add_argument(
+        "--top", "-n",
+        type=int,
+        default=20,
+        help="Number of duplicate groups to list. (Default: 20)"
+    )
+
+def prune_rules(args):
+    from scanner.service.prune import PruneRules, DEFAULT_SKIP_FS, read_exclude_file
+    excludes = list(args.exclude)
+    if args.exclude_from:
+        excludes.extend(read_exclude_file(args.exclude_from))
+    return PruneRules(excludes, args.max_depth, args.one_file_system,
+                      skip_fs=() if args.all_filesystems else DEFAULT_SKIP_FS)
+
+def scan_options(args):
+    from scanner.service.scan import ScanOptions
+    collect_files = args.report and (args.list_files or args.stream_report or bool(args.export))
+    return ScanOptions(collect_files=collect_files or bool(args.snapshot) or args.monitor,
+                       sniff=args.sniff, sniff_budget=args.sniff_budget * 1024 * 1024, sniff_cache=args.sniff_cache,
+                       govern=args.govern, prune=prune_rules(args),
+                       dir_tree=args.report or args.top_dirs > 0 or bool(args.snapshot))
+
+def write_report(args, summary):
+    from scanner.service.reporter import Reporter
+
+    if not (args.list_files or args.stream_report or args.export):
+        # collected for --snapshot or --monitor only, the PDF lists directories
+        summary = {key: value for key, value in summary.items() if key != 'all_files_details'}
+    reporter = Reporter(args.reportdir, args.charttype, args.verbose, stream=args.stream_report,
+                        top_n=args.top, export_format=args.export, top_dirs=args.top_dirs or 20)
+    reporter.write_summary_report(summary, args.sdirectory)
+
+def watch_directory(args):
+    # started before the scan, so the changes made while it runs are applied to its summary too
+    from scanner.service.monitor import DirMonitor
+
+    def show(summary, changes):
+        print(f"[Monitor] {changes} changes applied. Total files: {summary['total_files']}, "
+              f"total size: {summary['total_size']} bytes")
+
+    try:
+        return DirMonitor(args.sdirectory, on_update=show, detailed=args.verbose, prune=prune_rules(args)).watch()
+    except (RuntimeError, OSError) as e: # no watchdog, or out of inotify watches
+        print(f"Error: {e}", file=sys.stderr)
+        return None
+
+def run_monitor(monitor, summary):
+    # keeps the scanned summary current until ctrl+c
+    monitor.start(summary)
+    try:
+        print(f"Monitoring {monitor.root}, press Ctrl+C to stop.")
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Monitoring stopped.")
+    finally:
+        monitor.stop()
+    return monitor.snapshot()
+
+def run_dupes(directory, threads: int, top: int):
+    from scanner.service.analysis import DuplicateFinder, wasted_bytes
+    from scanner.service.stream import iter_scan
+
+    # only paths and sizes are needed, the records are grouped as they are listed instead of collected first
+    try:
+        groups = DuplicateFinder(threads=threads).find(iter_scan(directory, threads))
+    except NotADirectoryError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return []
+    print(f"{len(groups)} duplicate groups, {wasted_bytes(groups)} bytes wasted.")
+    for group in groups[:top]:
+        print(f" {group['wasted']:>14} bytes wasted, {len(group['paths'])} copies of {group['size']} bytes:")
+        for path in group['paths']:
+            print(f"    {path}")
+    return groups
+
+def run_findold(directory, days: float, field: str, threads: int, top: int):
+    from scanner.service.stream import iter_scan
+
+    # streamed, only the old files are kept and not a record of every file
+    cutoff = time.time() - days * 86400
+    try:
+        old = [record for record in iter_scan(directory, threads) if getattr(record, field) < cutoff]
+    except NotADirectoryError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return []
+    old.sort(key=lambda record: getattr(record, field))
+    print(f"{len(old)} files with {field} older than {days:g} days, {sum(record.size for record in old)} bytes.")
+    for record in old[:max(0, top)]:
+        print(f" {time.strftime('%Y-%m-%d', time.localtime(getattr(record, field)))} {record.size:>14} bytes  {record.path}")
+    if len(old) > top > 0:
+        print(f" ... and {len(old) - top} more")
+    return old
+
+def scan_telemetry(args):
+    if not getattr(args, "telemetry", None):
+        return None
+    from scanner.service.telemetry import ScanTelemetry
+    interval = args.telemetry_interval
+    return ScanTelemetry(args.threads, interval=interval or 1.0, snapshot_path=args.telemetry if interval else None)
+
+def finish_telemetry(args, telemetry):
+    if telemetry is None:
+        return
+    from scanner.service.telemetry import format_report
+    if args.verbose:
+        print(format_report(telemetry.report()))
+    telemetry.write(args.telemetry)
+    print(f"Scan metrics written to {args.telemetry}")
+
+def save_snapshot(args, summary):
+    if not args.snapshot or not summary.get('total_files'):
+        return
+    from scanner.service.snapshot import write_snapshot
+    path = write_snapshot(summary, args.snapshot, args.sdirectory)
+    print(f"Snapshot saved to {path} ({path.stat().st_size} bytes)")
+
+def run_diff(old: Path, new: Path, top: int, as_json: bool):
+    from scanner.service.snapshot import diff_snapshots, format_diff
+    try:
+        diff = diff_snapshots(old, new, top)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(diff, indent=2) if as_json else format_diff(diff, top))
+    return diff
+
+def print_top_dirs(summary, n: int):
+    tree = summary.get('dir_tree')
+    if tree is None or not n:
+        return
+    print("Largest directories:")
+    for i in tree.heaviest(n):
+        row = tree.row(i)
+        print(f" {row['size']:>16} bytes {row['files']:>9} files  {row['path']}")
+
+def run_reports(args):
+    from scanner.service.batch import report_many
+
+    sources = list(args.rdirectory)
+    if args.from_file:
+        with open(args.from_file, encoding="utf-8") as f:
+            sources.extend(Path(line.strip()) for line in f if line.strip() and not line.startswith("#"))
+    if not sources:
+        sources = [Path(os.path.abspath(os.sep))]
+    done = 0
+
+    def show(result):
+        nonlocal done
+        done += 1
+        outcome = f"error: {result['error']}" if result['error'] else (result['report'] or "no files, no report")
+        print(f"[{done}/{len(sources)}] {result['source']} ({result['files']} files, {result['seconds']:.2f} s): {outcome}")
+
+    start = time.time()
+    results = report_many(sources, args.reportdir, args.charttype, args.processes, args.threads, args.top_dirs,
+                          args.cache_dir, on_result=show)
+    failed = sum(1 for result in results if result['error'])
+    print(f"{len(results) - failed} of {len(results)} sources reported to {args.reportdir} "
+          f"in {time.time() - start:.2f} seconds.")
+    if failed:
+        sys.exit(1)
+    return results
+
+def run_scan(args, options=None):
+    # scan modules are imported here, not at startup, so --help and the shell prompt come up fast
+    from scanner.service.scan import scan
+    options = options or scan_options(args)
+    race_check = getattr(args, "race_check", False)
+    session = contextlib.nullcontext()
+    if race_check:
+        from scanner.utils import racecheck
+        if args.engine == "process":
+            print("Note: --race-check only sees the parent process with the process engine.", file=sys.stderr)
+        session = racecheck.session(args.race_sample)
+    telemetry = scan_telemetry(args)
+    with session as checker: # only the scan itself is checked
+        summary = scan(args.sdirectory, args.threads, args.engine, args.processes, args.index_path,
+                       options=options, telemetry=telemetry)
+    finish_telemetry(args, telemetry)
+    print_top_dirs(summary, args.top_dirs)
+    save_snapshot(args, summary)
+    if race_check:
+        summary['race_check'] = checker.report()
+        print(racecheck.format_report(summary['race_check']))
+    return summary
 
 def run_cli():
     parser = argparse.ArgumentParser(description='Welcome to FileLens')
@@ -87,33 +512,26 @@ def run_cli():
     args = parser.parse_args()
 
     if args.command == "scan":
-        scan(args.sdirectory, args.threads)
+        try:
+            prune_rules(args) # a bad exclude pattern is a usage error, reported before anything starts
+        except ValueError as e:
+            parser.error(str(e))
+        monitor = watch_directory(args) if args.monitor else None
+        summary = run_scan(args)
+        if args.report:
+            write_report(args, summary)
+        if monitor is not None:
+            run_monitor(monitor, summary)
+        if summary.get('race_check', {}).get('races'):
+            sys.exit(1) # lets CI fail the run
+    if args.command == "report":
+        run_reports(args)
+    if args.command == "findold":
+        run_findold(args.fdirectory, args.day, args.field, args.threads, args.top)
+    if args.command == "dupes":
+        run_dupes(args.ddirectory, args.threads, args.top)
+    if args.command == "diff":
+        run_diff(args.old, args.new, args.top, args.json)
     if args.command == "interactive":
-        print_initial_usage_and_exit()
-        while True:
-            enter = input("FileLens >> ")
-
-            if enter == "exit" or enter == "quit" or enter == "q":
-                break
-
-            try:
-                args = parser.parse_args(enter.split())  # Parse user input
-            except SystemExit:
-                print("Invalid command. Type 'help' for command list.")
-
-            if args.command == "scan":
-                scan(args.sdirectory, args.threads)
-            elif args.command == "report":
-                #handler.report(args.rdirectory, args.charttype)
-                return
-            elif args.command == "findold":
-                #handler.findold(args.day)
-                return
-            elif args.command == "cleanup":
-                #handler.cleanup()
-                return
-            elif args.command == "config":
-                #handler.config()
-                return
-            elif args.command == "help":
-                return
\ No newline at end of file
+        from scanner.cli.interactive import InteractiveSession
+        InteractiveSession(detailed=args.verbose).run()
@@ -0,0 +1,175 @@
+import concurrent.futures
+import hashlib
+import mmap
+import os
+import sys
+from typing import Dict, Any, Iterable, List, Tuple, Union
+
+from scanner.utils.filetable import FileTable
+
+# Duplicate detection in stages, every stage only looks at what the previous one could not rule out:
+#   1. group by exact size (no I/O, sizes come from the scan)
+#   2. hash of the first and last EDGE_BYTES of each candidate
+#   3. full content hash, only for files still matching after stage 2
+# Paths that are hardlinks of the same inode are one file, not duplicates.
+
+EDGE_BYTES = 64 * 1024
+READ_BUFFER = 1024 * 1024
+MMAP_THRESHOLD = 8 * 1024 * 1024 # bigger files are hashed through mmap, smaller ones with buffered reads
+
+
+def _new_hash():
+    return hashlib.blake2b(digest_size=20)
+
+
+def _edge_hash(path: str, size: int) -> bytes:
+    h = _new_hash()
+    with open(path, 'rb') as f:
+        if size <= 2 * EDGE_BYTES: # head and tail cover the whole file, this is already the full hash
+            h.update(f.read())
+        else:
+            h.update(f.read(EDGE_BYTES))
+            f.seek(size - EDGE_BYTES)
+            h.update(f.read(EDGE_BYTES))
+    return h.digest()
+
+
+def _full_hash(path: str, size: int) -> bytes:
+    h = _new_hash()
+    with open(path, 'rb', buffering=0) as f:
+        if size >= MMAP_THRESHOLD:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    h.update(mapped) # hashlib drops the GIL for big buffers, pool threads really run in parallel
+                return h.digest()
+            except (ValueError, OSError):
+                f.seek(0)
+                h = _new_hash()
+        buffer = bytearray(READ_BUFFER)
+        view = memoryview(buffer)
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            h.update(view[:n])
+    return h.digest()
+
+
+def _iter_sized_paths(files: Union[FileTable, Iterable[Dict[str, Any]]]) -> Iterable[Tuple[str, int]]:
+    if isinstance(files, FileTable):
+        for i in range(len(files)):
+            yield files.path(i), files.sizes[i]
+        return
+    for record in files:
+        if isinstance(record, tuple): # a stream.FileRecord
+            yield record.path, record.size
+            continue
+        path = record.get('path')
+        size = record.get('size')
+        if path and isinstance(size, int):
+            yield str(path), size
+
+
+class DuplicateFinder:
+    def __init__(self, threads: int = 4, min_size: int = 1, detailed: bool = False):
+        self.threads = max(1, threads)
+        self.min_size = max(1, min_size) # empty files are all "equal", never worth reporting
+        self.detailed = detailed
+        self.stats = {'candidates': 0, 'edge_hashed': 0, 'full_hashed': 0, 'hardlinks_skipped': 0, 'errors': 0}
+        self._links: Dict[str, List[str]] = {} # kept path -> its other hardlinks, filled by find()
+
+    def _group_by_size(self, files) -> Dict[int, List[str]]:
+        by_size: Dict[int, List[str]] = {}
+        for path, size in _iter_sized_paths(files):
+            if size >= self.min_size:
+                by_size.setdefault(size, []).append(path)
+        return {size: paths for size, paths in by_size.items() if len(paths) > 1}
+
+    def _hash_groups(self, executor, groups: List[Tuple[Any, int, List[str]]], hash_func) -> List[Tuple[Any, int, List[str]]]:
+        # hashes every path of every group in the pool and splits the groups by digest
+        futures = {}
+        for key, size, paths in groups:
+            for path in paths:
+                futures[executor.submit(hash_func, path, size)] = (key, size, path)
+
+        split: Dict[Tuple[Any, bytes], Tuple[int, List[str]]] = {}
+        for future in concurrent.futures.as_completed(futures):
+            key, size, path = futures[future]
+            try:
+                digest = future.result()
+            except OSError as e:
+                self.stats['errors'] += 1
+                if self.detailed:
+                    print(f"Cannot read {path}: {e}", file=sys.stderr)
+                continue
+            split.setdefault((key, digest), (size, []))[1].append(path)
+        return [(digest, size, paths) for (_, digest), (size, paths) in split.items() if len(paths) > 1]
+
+    def _drop_hardlinks(self, size: int, paths: List[str]) -> List[str]:
+        # keeps one path per (dev, ino), hardlinks share their data so they waste nothing.
+        # the other links are remembered, trashing a copy only frees space once all its links are gone
+        seen: Dict[Tuple[int, int], str] = {}
+        unique = []
+        for path in sorted(paths):
+            try:
+                st = os.stat(path)
+            except OSError:
+                self.stats['errors'] += 1
+                continue
+            if st.st_size != size: # changed since the scan, the size group no longer holds
+                continue
+            key = (st.st_dev, st.st_ino)
+            if key in seen:
+                self.stats['hardlinks_skipped'] += 1
+                self._links.setdefault(seen[key], []).append(path)
+                continue
+            seen[key] = path
+            unique.append(path)
+        return unique
+
+    def find(self, files: Union[FileTable, Iterable[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        # files: a FileTable, scan records or stream.iter_scan() FileRecords, read once.
+        # returns [{'size', 'paths', 'wasted', 'hardlinks'}] sorted by wasted bytes, biggest first.
+        # 'paths' has one path per distinct file, 'hardlinks' maps such a path to its other links
+        self._links = {}
+        by_size = self._group_by_size(files)
+        groups = []
+        for size, paths in by_size.items():
+            unique = self._drop_hardlinks(size, paths)
+            if len(unique) > 1:
+                groups.append((size, size, unique))
+        self.stats['candidates'] = sum(len(paths) for _, _, paths in groups)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.threads) as executor:
+            groups = self._hash_groups(executor, groups, _edge_hash)
+            self.stats['edge_hashed'] = self.stats['candidates']
+
+            done = [g for g in groups if g[1] <= 2 * EDGE_BYTES] # the edge hash already read these completely
+            pending = [g for g in groups if g[1] > 2 * EDGE_BYTES]
+            self.stats['full_hashed'] = sum(len(paths) for _, _, paths in pending)
+            done.extend(self._hash_groups(executor, pending, _full_hash))
+
+        result = []
+        for _, size, paths in done:
+            paths.sort()
+            result.append({'size': size, 'paths': paths, 'wasted': size * (len(paths) - 1),
+                           'hardlinks': {path: self._links[path] for path in paths if path in self._links}})
+        result.sort(key=lambda group: group['wasted'], reverse=True)
+        if self.detailed:
+            print(f"Found {len(result)} duplicate groups, {sum(g['wasted'] for g in result)} bytes wasted.")
+        return result
+
+
+def wasted_bytes(groups: List[Dict[str, Any]]) -> int:
+    return sum(group['wasted'] for group in groups)
+
+
+def duplicate_candidates(groups: List[Dict[str, Any]]) -> List[str]:
+    # every copy except the first one of each group, with all of its hardlinks
+    extra = []
+    for group in groups:
+        links = group.get('hardlinks', {})
+        for path in group['paths'][1:]:
+            extra.append(path)
+            extra.extend(links.get(path, ()))
+    return extra
@@ -0,0 +1,86 @@
+import concurrent.futures
+import os
+import re
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Batch reports: one PDF per scan root or snapshot, rendered by a pool of worker processes.
+# Rendering is Python bound (matplotlib, reportlab), threads would only take turns on the GIL.
+# A worker scans (or loads) one source, writes its report and returns a small result row, the
+# summaries never cross the process boundary. Workers keep matplotlib and reportlab imported between
+# jobs and share a chart cache directory, so a chart is drawn once per distinct content.
+#   results = report_many(["/vol/a", "/vol/b", "nightly/c.flsnap"], Path("reports"), "bar", processes=8)
+
+CACHE_DIR_NAME = ".filelens_cache" # under the report directory unless a cache_dir is given
+
+
+def report_label(source: Path) -> str:
+    # the file name part for one source: /mnt/projects/alpha -> alpha, c.flsnap -> c
+    name = (source.stem if source.is_file() else source.name) or "root"
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name)
+
+
+def _report_one(source: str, output_dir: Path, chart_type: str, threads: int, top_dirs: int,
+                cache_dir: Optional[Path]) -> Dict[str, Any]:
+    from scanner.service.reporter import Reporter
+
+    start = time.time()
+    result = {'source': source, 'report': None, 'files': 0, 'seconds': 0.0, 'error': None}
+    path = Path(source)
+    try:
+        if path.is_dir():
+            from scanner.service.scan import scan_tree, ScanOptions
+            summary = scan_tree(source, threads, options=ScanOptions(dir_tree=True))
+            scanned = path
+        else:
+            from scanner.service.snapshot import read_summary
+            summary = read_summary(path)
+            summary.pop('all_files_details', None) # like a scan without --list-files, the PDF lists directories
+            scanned = Path(summary['snapshot']['root'])
+        reporter = Reporter(output_dir, chart_type, False, top_dirs=top_dirs, cache_dir=cache_dir)
+        report = reporter.write_summary_report(summary, scanned, label=report_label(path))
+        result['report'] = str(report) if report else None
+        result['files'] = summary['total_files']
+    except Exception as e: # one broken volume must not stop the other reports
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = round(time.time() - start, 3)
+    return result
+
+
+def report_many(sources: Iterable, output_dir: Path, chart_type: str = "none", processes: Optional[int] = None,
+                threads: int = 1, top_dirs: int = 20, cache_dir: Optional[Path] = None,
+                on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+    # sources: directories to scan and report, or snapshot files (scan --snapshot) to report.
+    # returns one result row per source in the given order: source, report (PDF path or None when
+    # there were no files), files, seconds, error. on_result(row) is called as each report finishes.
+    sources = [str(source) for source in sources]
+    if not sources:
+        return []
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    cache_dir = Path(cache_dir) if cache_dir is not None else output_dir / CACHE_DIR_NAME
+    processes = max(1, min(processes or os.cpu_count() or 1, len(sources)))
+    job = (output_dir, chart_type, max(1, threads), top_dirs, cache_dir)
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(sources)
+    if processes == 1: # no pool to start for a single worker
+        for i, source in enumerate(sources):
+            results[i] = _report_one(source, *job)
+            if on_result is not None:
+                on_result(results[i])
+        return results
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {executor.submit(_report_one, source, *job): i for i, source in enumerate(sources)}
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                result = future.result()
+                results[futures[future]] = result
+                if on_result is not None:
+                    on_result(result)
+        except BaseException: # ctrl+c: reports not started yet are dropped, running ones finish
+            for future in futures:
+                future.cancel()
+            raise
+    return results
@@ -1,70 +1,280 @@
+import concurrent.futures
+import datetime
+import os
 import time
 import sys
+import urllib.parse
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Union
 
-from send2trash import send2trash, TrashPermissionError
+from send2trash import send2trash
+
+from scanner.utils.ageindex import AgeIndex, CleanupPolicy
+from scanner.utils.filetable import FileTable
 
 class CleanupManager:
     def __init__(self, age_days: int, detailed: bool):
         self.age_days = age_days
         self.detailed = detailed # detailed is still used for other operational messages
+        self._age_index: Optional[AgeIndex] = None
+        self._indexed_files = None
 
-    def find_old_files(self, all_files: List[Dict[str, Any]]) -> List[Path]:
-        crit_time = time.time() - (self.age_days * 86400) #cutoff timestamp is the current time minus the age in days
-        old_files: List[Path] = []
+    def age_index(self, all_files: Union[List[Dict[str, Any]], FileTable]) -> AgeIndex:
+        # built once per scan result and reused, repeated findold queries are a binary search each.
+        # a FileTable the monitor keeps current is indexed again after it changed (its version moved).
+        # records that can't be age checked are skipped (and listed with detailed) when it is built
+        index = self._age_index
+        if index is None or self._indexed_files is not all_files or \
+                (isinstance(all_files, FileTable) and index.version != all_files.version):
+            self._age_index = AgeIndex(all_files, on_invalid=self._invalid_record)
+            self._indexed_files = all_files
+        return self._age_index
 
-        for file in all_files:
-            path_str = file.get('path')
-            mtime = file.get('mtime') # modification time
-            if not path_str or not isinstance(mtime, (int, float)):
-                if self.detailed:
-                    print(f"Invalid file for age check, {file}", file=sys.stderr) # i use sys.stderr for error messages
-                continue
+    def _invalid_record(self, record: Dict[str, Any]):
+        if self.detailed:
+            print(f"Invalid file for age check, {record}", file=sys.stderr) # i use sys.stderr for error messages
 
-            p = Path(path_str).resolve()
-            if mtime < crit_time:
-                old_files.append(p)
+    def find_old_files(self, all_files: Union[List[Dict[str, Any]], FileTable]) -> List[Path]:
+        # files not modified for age_days. answered from the scan records only, the filesystem is not
+        # touched again until the files are actually trashed (paths from scan_tree are already absolute)
+        return self.find_files(all_files, CleanupPolicy(older_than_days=self.age_days))
+
+    def find_files(self, all_files: Union[List[Dict[str, Any]], FileTable], policy: CleanupPolicy) -> List[Path]:
+        index = self.age_index(all_files)
+        rows = index.select(policy)
+        old_files = [Path(path) for path in index.paths(rows)]
 
         if self.detailed and old_files:
-            print(f"Found {len(old_files)} files older than {self.age_days} days.")
+            print(f"Found {len(old_files)} files matching the policy, {index.total_size(rows)} bytes.")
         elif self.detailed:
-             print(f"No files found older than {self.age_days} days.")
+             print("No files found matching the policy.")
 
         return old_files
 
-    def execute_send_to_trash(self, paths_to_trash: List[Path]):        
+    def find_duplicate_files(self, all_files: Union[List[Dict[str, Any]], FileTable], threads: int = 4) -> List[Path]:
+        # extra copies of duplicate files (one copy per group is kept), ready for execute_send_to_trash
+        from scanner.service.analysis import DuplicateFinder, duplicate_candidates, wasted_bytes
+
+        groups = DuplicateFinder(threads=threads, detailed=self.detailed).find(all_files)
+        extra = [Path(path) for path in duplicate_candidates(groups)]
+        if self.detailed:
+            print(f"Found {len(extra)} duplicate copies in {len(groups)} groups, {wasted_bytes(groups)} bytes reclaimable.")
+        return extra
+
+    def plan_reclaim(self, files: Union[List[Dict[str, Any]], FileTable, List[Path]],
+                     indices: Optional[Sequence[int]] = None) -> Dict[str, Any]:
+        # dry run: how many files and bytes trashing `files` would reclaim per directory.
+        # sizes come from the scan records (for a FileTable only the rows in `indices`), plain paths are
+        # lstat'ed. nothing is opened, moved or deleted.
+        by_dir: Dict[str, Dict[str, int]] = {}
+        missing = 0
+
+        def add(path_str: str, size: int):
+            entry = by_dir.setdefault(os.path.dirname(path_str), {'count': 0, 'bytes': 0})
+            entry['count'] += 1
+            entry['bytes'] += size
+
+        if isinstance(files, FileTable):
+            for i in (range(len(files)) if indices is None else indices):
+                add(files.path(i), files.sizes[i])
+        else:
+            for item in files:
+                if isinstance(item, dict):
+                    if item.get('path'):
+                        add(str(item['path']), int(item.get('size', 0) or 0))
+                    continue
+                try:
+                    add(str(item), os.lstat(item).st_size)
+                except OSError:
+                    missing += 1
+
+        plan = {
+            'total_files': sum(entry['count'] for entry in by_dir.values()),
+            'total_bytes': sum(entry['bytes'] for entry in by_dir.values()),
+            'missing': missing,
+            'by_dir': dict(sorted(by_dir.items(), key=lambda item: item[1]['bytes'], reverse=True)),
+        }
+        print(f"[Cleanup] Dry run: {plan['total_files']} files, {plan['total_bytes']} bytes would be reclaimed "
+              f"in {len(by_dir)} directories.")
+        if self.detailed:
+            for dir, entry in list(plan['by_dir'].items())[:20]:
+                print(f"  {entry['bytes']:>14} bytes  {entry['count']:>7} files  {dir}")
+        return plan
+
+    def execute_send_to_trash(self, paths_to_trash: List[Path], workers: int = 8, log_path: Optional[Path] = None,
+                              batch_size: int = 256) -> Dict[str, Any]:
+        # Moves files to the trash in batches on a bounded pool. Paths are grouped by filesystem; files on the
+        # same filesystem as the home trash are renamed straight into it (one rename plus a small .trashinfo
+        # write), everything else goes through send2trash. One aggregated result, optionally written to log_path.
+        result = {'trashed': 0, 'failed': 0, 'fast_path': 0, 'failures': []}
         if not paths_to_trash:
             if self.detailed:
                 print("No files specified to trash.")
-            return
+            return result
 
-        success_count = 0
-        failure_count = 0
         print(f"Moving {len(paths_to_trash)} files to trash.")
-
+        start = time.time()
+        workers = max(1, workers)
+        valid = []
         for path in paths_to_trash:
-            if not isinstance(path, Path):
-                if self.detailed:
-                    print(f"Invalid path provided for {path}", file=sys.stderr)
-                failure_count += 1
-                continue
+            if isinstance(path, (Path, str)):
+                valid.append(str(path))
+            else:
+                result['failed'] += 1
+                result['failures'].append((str(path), "invalid path"))
 
-            if not path.exists():
-                if self.detailed:
-                    print(f"File no longer exists - {path}", file=sys.stderr)
-                failure_count += 1
-                continue
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            # lstat in batches: existence check and the device for grouping in one call
+            by_dev: Dict[int, List[str]] = {}
+            chunks = [valid[i:i + batch_size] for i in range(0, len(valid), batch_size)]
+            for stated, failures in executor.map(_lstat_batch, chunks):
+                for path, dev in stated:
+                    by_dev.setdefault(dev, []).append(path)
+                result['failed'] += len(failures)
+                result['failures'].extend(failures)
 
-            try:
-                send2trash(str(path)) # send2trash expects a string path
-                success_count += 1
+            trash = _HomeTrash.detect()
+            futures = []
+            for dev, paths in by_dev.items():
+                fast = trash is not None and trash.dev == dev
+                for i in range(0, len(paths), batch_size):
+                    futures.append(executor.submit(_trash_batch, paths[i:i + batch_size], trash if fast else None))
+
+            done = 0
+            last_report = time.time()
+            for future in concurrent.futures.as_completed(futures):
+                trashed, fast_count, failures = future.result()
+                result['trashed'] += trashed
+                result['fast_path'] += fast_count
+                result['failed'] += len(failures)
+                result['failures'].extend(failures)
+                done += trashed + len(failures)
+                if self.detailed and time.time() - last_report >= 2: # one progress line every 2s, not one per file
+                    last_report = time.time()
+                    print(f"[Cleanup] {done}/{len(valid)} processed...")
+
+        result['seconds'] = round(time.time() - start, 2)
+        print(f"{result['trashed']} files successfully cleaned, {result['failed']} files failed to be cleaned.")
+        if result['failures'] and not log_path:
+            print(f"First failure: {result['failures'][0][0]}: {result['failures'][0][1]}", file=sys.stderr)
+        if log_path:
+            _write_trash_log(Path(log_path), result)
+            print(f"[Cleanup] Result log written to {log_path}")
+        return result
 
-                if self.detailed:
-                    print(f"[Cleanup] Successfully trashed: {path}")
 
-            except Exception as e: #fixed error handlings
-                print(f"Error trashing {path}: {e}", file=sys.stderr)
-                failure_count += 1
+def _lstat_batch(paths: List[str]) -> Tuple[List[Tuple[str, int]], List[Tuple[str, str]]]:
+    stated, failures = [], []
+    for path in paths:
+        try:
+            stated.append((path, os.lstat(path).st_dev))
+        except FileNotFoundError:
+            failures.append((path, "file no longer exists"))
+        except OSError as e:
+            failures.append((path, str(e)))
+    return stated, failures
 
-        print(f"{success_count} files successfully cleaned, {failure_count} files failed to be cleaned.")
\ No newline at end of file
+
+def _trash_batch(paths: List[str], trash: Optional["_HomeTrash"]) -> Tuple[int, int, List[Tuple[str, str]]]:
+    trashed = fast_count = 0
+    failures = []
+    for path in paths:
+        try:
+            if trash is not None and trash.move(path):
+                fast_count += 1
+            else:
+                send2trash(path)
+            trashed += 1
+        except Exception as e:
+            failures.append((path, str(e)))
+    return trashed, fast_count, failures
+
+
+def _write_trash_log(log_path: Path, result: Dict[str, Any]):
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_path, 'w', encoding='utf-8') as log:
+        log.write(f"time: {datetime.datetime.now():%Y-%m-%d %H:%M:%S}\n")
+        log.write(f"trashed: {result['trashed']} (fast path: {result['fast_path']})\n")
+        log.write(f"failed: {result['failed']}\n")
+        log.write(f"seconds: {result['seconds']}\n")
+        for path, error in result['failures']:
+            log.write(f"FAILED\t{path}\t{error}\n")
+
+
+class _HomeTrash:
+    # freedesktop.org home trash ($XDG_DATA_HOME/Trash), the same place send2trash uses for files on
+    # the home filesystem. Only used on Linux/BSD desktops where that spec applies.
+    # Nothing is created until the first file is moved, detect() only looks.
+    def __init__(self, root: Path, dev: int):
+        self.root = root
+        self.dev = dev
+        self.files_dir = root / "files"
+        self.info_dir = root / "info"
+        self._ready = False
+
+    @classmethod
+    def detect(cls) -> Optional["_HomeTrash"]:
+        if sys.platform in ("win32", "darwin", "cygwin"):
+            return None
+        data_home = os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+        root = Path(data_home) / "Trash"
+        existing = root
+        while not os.path.lexists(existing) and existing != existing.parent:
+            existing = existing.parent # the trash is created on this filesystem
+        try:
+            return cls(root, os.stat(existing).st_dev)
+        except OSError:
+            return None
+
+    def _prepare(self):
+        # on the first move, workers racing here all succeed with exist_ok
+        if not self._ready:
+            self.files_dir.mkdir(parents=True, exist_ok=True, mode=0o700)
+            self.info_dir.mkdir(parents=True, exist_ok=True, mode=0o700)
+            self._ready = True
+
+    def move(self, path: str) -> bool:
+        # into the trash as the spec orders it: the .trashinfo is created with O_EXCL first, which reserves
+        # the name, then the file is moved. False means "not handled here", the caller falls back to send2trash
+        abs_path = os.path.abspath(path)
+        if abs_path.startswith(str(self.root) + os.sep):
+            return False
+        try:
+            self._prepare()
+        except OSError:
+            return False
+        base = os.path.basename(abs_path)
+        info = ("[Trash Info]\n"
+                f"Path={urllib.parse.quote(abs_path, safe='/')}\n"
+                f"DeletionDate={datetime.datetime.now():%Y-%m-%dT%H:%M:%S}\n").encode()
+        for n in range(1, 1000):
+            name = base if n == 1 else f"{base}.{n}"
+            info_path = self.info_dir / f"{name}.trashinfo"
+            try:
+                # O_EXCL reserves the name atomically, concurrent workers never pick the same one
+                fd = os.open(info_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+            except FileExistsError:
+                continue
+            try:
+                os.write(fd, info)
+            finally:
+                os.close(fd)
+            target = self.files_dir / name
+            try:
+                # link + unlink instead of rename: a link fails on an existing target, a rename would
+                # silently replace a file left there without its info file
+                os.link(abs_path, target, follow_symlinks=False)
+            except FileExistsError: # such a leftover, try the next name
+                os.unlink(info_path)
+                continue
+            except OSError: # no hardlinks on this filesystem, or not allowed (protected_hardlinks)
+                os.unlink(info_path)
+                return False
+            try:
+                os.unlink(abs_path)
+            except OSError: # the original stays, so the trash must not keep a copy
+                os.unlink(target)
+                os.unlink(info_path)
+                raise
+            return True
+        return False
@@ -0,0 +1,134 @@
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+# Persistent scan index: one row per directory with the aggregates of the files
+# directly inside it and the list of its subdirectories as [path, dev, ino], keyed by (st_dev, st_ino, mtime).
+# `extra` holds the allocated size and the multi-link files, so hardlinks in reused rows are still counted once.
+# On a rescan a directory whose key did not change is not listed again, its cached row is reused.
+#
+# A directory's mtime only changes when entries are added, removed or renamed in it, so a file
+# rewritten in place keeps its old cached size until its directory changes.
+
+SCHEMA_VERSION = 2
+
+# directories modified this close to the scan start are not cached, their mtime may not
+# move again if they change in the same timestamp tick (same idea as git's "racy" entries)
+RACY_WINDOW_NS = 2 * 1_000_000_000
+
+DIRS_TABLE = ("CREATE TABLE IF NOT EXISTS dirs ("
+              " path TEXT PRIMARY KEY,"
+              " dev INTEGER NOT NULL, ino INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+              " total_files INTEGER NOT NULL, total_size INTEGER NOT NULL,"
+              " by_type TEXT NOT NULL, subdirs TEXT NOT NULL, extra TEXT NOT NULL)")
+
+
+def dir_key(st: os.stat_result) -> Tuple[int, int, int]:
+    return (st.st_dev, st.st_ino, st.st_mtime_ns)
+
+
+def _subtree_bounds(root: str) -> Tuple[str, str]:
+    # every path below root sorts between root + sep and root + (sep + 1)
+    root = root.rstrip(os.sep) or os.sep
+    prefix = root if root.endswith(os.sep) else root + os.sep
+    return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+
+class ScanIndex:
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path))
+        self._conn.execute("PRAGMA journal_mode=WAL") # readers in pool processes don't block the writer
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(DIRS_TABLE)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None:
+            self._conn.execute("INSERT INTO meta VALUES ('version', ?)", (str(SCHEMA_VERSION),))
+        elif int(row[0]) != SCHEMA_VERSION:
+            # old layout, start over instead of migrating a cache
+            self._conn.execute("DROP TABLE dirs")
+            self._conn.execute(DIRS_TABLE)
+            self._conn.execute("UPDATE meta SET value = ? WHERE key = 'version'", (str(SCHEMA_VERSION),))
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def load(self, root) -> Dict[str, tuple]:
+        # rows of root and everything below it, path -> (dev, ino, mtime_ns, files, size, by_type, subdirs, extra)
+        root = str(root)
+        low, high = _subtree_bounds(root)
+        cache = {}
+        query = ("SELECT path, dev, ino, mtime_ns, total_files, total_size, by_type, subdirs, extra FROM dirs"
+                 " WHERE path = ? OR (path >= ? AND path < ?)")
+        for path, *row in self._conn.execute(query, (root, low, high)):
+            cache[path] = tuple(row)
+        return cache
+
+    def get(self, path) -> Optional[tuple]:
+        return self._conn.execute(
+            "SELECT dev, ino, mtime_ns, total_files, total_size, by_type, subdirs, extra FROM dirs WHERE path = ?",
+            (str(path),)).fetchone()
+
+    def apply(self, updates: List[tuple], removed: List[str]):
+        # writes every changed row and drops the subtrees that disappeared, in one transaction
+        with self._conn:
+            for path in removed:
+                low, high = _subtree_bounds(path)
+                self._conn.execute("DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)", (path, low, high))
+            self._conn.executemany("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", updates)
+
+
+def scan_dir_cached(dir: str, cache: Dict[str, tuple], scan_start_ns: int, scan_dir,
+                    reuse: bool = True) -> Tuple[List[Tuple[str, int, int]], Dict[str, Any], Optional[tuple], List[str]]:
+    # returns (subdirs as (path, dev, ino), partial, row to store or None, subtrees removed since the last scan).
+    # with reuse=False the directory is always listed, the row is only refreshed
+    try:
+        st = os.stat(dir)
+    except OSError:
+        subdirs, partial = scan_dir(dir) # let the normal listing record the error
+        return subdirs, partial, None, []
+
+    key = dir_key(st)
+    cached = cache.get(dir)
+    if reuse and cached is not None and tuple(cached[:3]) == key:
+        _, _, _, files, size, by_type, subdirs, extra = cached
+        extra = json.loads(extra)
+        partial = {'total_files': files, 'total_size': size, 'total_allocated': extra.get('allocated', size),
+                   'by_type': json.loads(by_type), 'errors': [], 'index': {'reused': 1, 'listed': 0}}
+        if extra.get('links'):
+            # no per-file data in a reused row, nothing was aggregated
+            partial['links'] = {(dev, ino): (link_size, allocated, type_name, dir, None)
+                                for dev, ino, link_size, allocated, type_name in extra['links']}
+        if extra.get('hardlinks'):
+            partial['hardlinks'] = extra['hardlinks']
+        return [tuple(subdir) for subdir in json.loads(subdirs)], partial, None, []
+
+    subdirs, partial = scan_dir(dir)
+    partial['index'] = {'reused': 0, 'listed': 1}
+
+    removed = []
+    if cached is not None:
+        removed = sorted({subdir[0] for subdir in json.loads(cached[6])} - {path for path, _, _ in subdirs})
+
+    row = None
+    if not partial['errors'] and key[2] < scan_start_ns - RACY_WINDOW_NS:
+        extra = {'allocated': partial.get('total_allocated', partial['total_size'])}
+        if partial.get('links'):
+            extra['links'] = [[*link, *value[:3]] for link, value in partial['links'].items()]
+        if partial.get('hardlinks'):
+            extra['hardlinks'] = partial['hardlinks']
+        row = (dir, *key, partial['total_files'], partial['total_size'],
+               json.dumps(partial['by_type'], separators=(',', ':')), json.dumps(subdirs, separators=(',', ':')),
+               json.dumps(extra, separators=(',', ':')))
+    return subdirs, partial, row, removed
@@ -0,0 +1,357 @@
+import os
+import stat
+import sys
+import threading
+import time
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError: # watchdog is only needed for monitoring, scans work without it
+    Observer = None
+    FileSystemEventHandler = object
+
+from scanner.service.prune import PruneRules
+from scanner.service.scan import new_summary, file_type_of, BLOCK_SIZE, HAS_BLOCKS
+from scanner.utils.filetable import FileTable
+
+# pending change kinds, a later event on the same path overrides an earlier one
+CHANGED = 1
+DELETED = 2
+CHANGED_DIR = 3 # created or moved in, its content has to be walked once
+DELETED_DIR = 4
+
+
+class _EventCollector(FileSystemEventHandler):
+    # only records which paths changed, all the work happens in the DirMonitor apply thread
+    def __init__(self, monitor: "DirMonitor"):
+        super().__init__()
+        self.monitor = monitor
+
+    def on_any_event(self, event):
+        if event.event_type in ("opened", "closed_no_write"):
+            return
+        src = os.fsdecode(event.src_path)
+        if event.event_type == "moved":
+            dest = os.fsdecode(event.dest_path)
+            self.monitor._push(src, DELETED_DIR if event.is_directory else DELETED)
+            self.monitor._push(dest, CHANGED_DIR if event.is_directory else CHANGED)
+        elif event.event_type == "deleted":
+            self.monitor._push(src, DELETED_DIR if event.is_directory else DELETED)
+        elif event.is_directory:
+            if event.event_type == "created":
+                self.monitor._push(src, CHANGED_DIR)
+            # modified events on directories only mean their listing changed, the entries get their own events
+        else:
+            self.monitor._push(src, CHANGED)
+
+
+class DirMonitor:
+    # Keeps a scan summary of root up to date from watchdog events.
+    # The observer is scheduled before the initial state is read (taken over from a scan or walked), events
+    # that arrive meanwhile are applied after it, so nothing changed during the walk is lost.
+    # Files live in a FileTable, a scan's all_files_details is used as is; rows of deleted files are reused.
+    # A file with several names is counted once, under its first known name, the other names go to
+    # summary['hardlinks'] like in a scan. Pruned directories (prune rules) are not walked and their events dropped.
+    # Events are coalesced per path and applied as deltas in batches, after `debounce` seconds
+    # without new events (or at the latest after `max_delay`), so an untar or rm -rf is one update.
+    def __init__(self, root, debounce: float = 0.5, max_delay: float = 5.0,
+                 on_update: Optional[Callable[[Dict[str, Any], int], None]] = None, detailed: bool = False,
+                 prune: Optional[PruneRules] = None):
+        if Observer is None:
+            raise RuntimeError("Monitoring needs the 'watchdog' package: pip install watchdog")
+        self.root = os.path.abspath(root)
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.on_update = on_update
+        self.detailed = detailed
+        rules = prune.bind(self.root) if prune is not None else None
+        self.prune = rules if rules is not None and rules.active else None
+        self._pruned_dirs: Dict[str, bool] = {} # directory -> in a pruned subtree, filled by the event thread
+
+        self.summary = new_summary()
+        self.summary['by_dir'] = {} # dir -> {'count', 'size'} of the files directly inside
+        self.summary['hardlinks'] = {'files': 0, 'bytes': 0}
+        self.table = FileTable()
+        self._rows: Dict[str, Dict[str, int]] = {} # dir -> name -> table row of the live files
+        self._free: List[int] = [] # rows of deleted files
+        self._inodes: Dict[Tuple[int, int], List[int]] = {} # (st_dev, st_ino) -> rows naming it, the first is counted
+
+        self._lock = threading.Lock() # guards summary and the table against snapshot() readers
+        self._pending: Dict[str, int] = {}
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._last_event = 0.0
+        self._first_event = 0.0
+        self._stopping = threading.Event()
+        self._observer = None
+        self._applier = None
+
+    # state changes, callers hold self._lock
+
+    def _count(self, row: int, sign: int):
+        table = self.table
+        size = table.sizes[row]
+        summary = self.summary
+        summary['total_files'] += sign
+        summary['total_size'] += sign * size
+        summary['total_allocated'] += sign * table.allocated[row]
+        for totals, key in ((summary['by_type'], table.type_name(row)),
+                            (summary['by_dir'], table.dir_pool[table.dir_ids[row]])):
+            entry = totals.setdefault(key, {'count': 0, 'size': 0})
+            entry['count'] += sign
+            entry['size'] += sign * size
+            if entry['count'] == 0:
+                del totals[key]
+
+    def _count_link(self, row: int, sign: int):
+        stats = self.summary['hardlinks']
+        stats['files'] += sign
+        stats['bytes'] += sign * self.table.sizes[row]
+
+    def _index_row(self, row: int):
+        table = self.table
+        self._rows.setdefault(table.dir_pool[table.dir_ids[row]], {})[table.names[row]] = row
+        key = table.links.get(row)
+        if key is not None:
+            rows = self._inodes.setdefault(key, [])
+            rows.append(row)
+            if len(rows) > 1: # another name of a file already counted
+                self._count_link(row, 1)
+                return
+        self._count(row, 1)
+
+    def _add_file(self, dir: str, name: str, st: os.stat_result):
+        self._remove_file(dir, name)
+        size = st.st_size
+        values = (dir, name, size, st.st_mtime, st.st_atime, file_type_of(name), st.st_ctime,
+                  st.st_blocks * BLOCK_SIZE if HAS_BLOCKS else size,
+                  (st.st_dev, st.st_ino) if st.st_nlink > 1 else None)
+        if self._free:
+            row = self._free.pop()
+            self.table.replace(row, *values)
+        else:
+            row = len(self.table)
+            self.table.append(*values)
+        self._index_row(row)
+
+    def _remove_file(self, dir: str, name: str):
+        names = self._rows.get(dir)
+        row = names.pop(name, None) if names else None
+        if row is None:
+            return
+        if not names:
+            del self._rows[dir]
+        key = self.table.links.pop(row, None)
+        if key is None:
+            self._count(row, -1)
+        else:
+            rows = self._inodes[key]
+            counted = rows[0] == row
+            rows.remove(row)
+            if not counted:
+                self._count_link(row, -1)
+            elif rows: # the next name takes over the count
+                self._count(row, -1)
+                self._count_link(rows[0], -1)
+                self._count(rows[0], 1)
+            else:
+                self._count(row, -1)
+            if not rows:
+                del self._inodes[key]
+        self.table.forget(row)
+        self._free.append(row)
+
+    def _remove_tree(self, prefixes: Tuple[str, ...]):
+        # one pass over the known directories for every deleted directory in the batch
+        exact = set(prefixes)
+        below = tuple(p + os.sep for p in prefixes)
+        doomed = [dir for dir in self._rows if dir in exact or dir.startswith(below)]
+        for dir in doomed:
+            for name in list(self._rows.get(dir, ())):
+                self._remove_file(dir, name)
+
+    def _seed(self, files: FileTable, summary: Dict[str, Any]):
+        # takes over a scan's table instead of walking the tree again, the totals are rebuilt from its rows
+        self.table = files
+        for row in range(len(files)):
+            self._index_row(row)
+        self.summary['errors'] = list(summary.get('errors', ()))
+
+    def _walk(self, top: str):
+        # adds every file below top, used for the initial state without a scan and for directories moved in
+        stack = [top]
+        while stack:
+            dir = stack.pop()
+            try:
+                with os.scandir(dir) as entries:
+                    for item in entries:
+                        try:
+                            if item.is_dir(follow_symlinks=False):
+                                if self.prune is None or self.prune.reason(
+                                        item.path, item.stat(follow_symlinks=False).st_dev) is None:
+                                    stack.append(item.path)
+                            elif item.is_file(follow_symlinks=False):
+                                self._add_file(dir, item.name, item.stat(follow_symlinks=False))
+                        except OSError:
+                            pass
+            except OSError as e:
+                if self.detailed:
+                    print(f"[Monitor] Cannot read {dir}: {e}", file=sys.stderr)
+
+    def _apply_path(self, path: str, kind: int):
+        dir, name = os.path.split(path)
+        if kind == CHANGED:
+            try:
+                st = os.lstat(path)
+            except OSError: # already gone again, e.g. a temp file
+                self._remove_file(dir, name)
+                return
+            if stat.S_ISREG(st.st_mode):
+                self._add_file(dir, name, st)
+            else:
+                self._remove_file(dir, name)
+        elif kind == DELETED:
+            self._remove_file(dir, name)
+        elif kind == CHANGED_DIR:
+            # whatever was at this path before is dropped and the path is read again from disk
+            self._remove_tree((path,))
+            self._remove_file(dir, name)
+            try:
+                st = os.lstat(path)
+            except OSError:
+                return
+            if stat.S_ISDIR(st.st_mode):
+                self._walk(path)
+            elif stat.S_ISREG(st.st_mode):
+                self._add_file(dir, name, st)
+
+    # event plumbing
+
+    def _pruned(self, path: str, is_dir: bool) -> bool:
+        # path is in a pruned subtree (or is a pruned directory), the recursive observer still reports those
+        if self.prune is None:
+            return False
+        dir = path if is_dir else os.path.dirname(path)
+        cache = self._pruned_dirs
+        chain = []
+        while dir != self.root and dir.startswith(self.prune.root_prefix) and dir not in cache:
+            chain.append(dir)
+            dir = os.path.dirname(dir)
+        pruned = cache.get(dir, False)
+        for dir in reversed(chain):
+            pruned = pruned or self.prune.reason(dir) is not None
+            cache[dir] = pruned
+        return pruned
+
+    def _push(self, path: str, kind: int):
+        if self._pruned(path, kind in (CHANGED_DIR, DELETED_DIR)):
+            return
+        now = time.monotonic()
+        with self._pending_lock:
+            if not self._pending:
+                self._first_event = now
+            previous = self._pending.get(path)
+            # a pending directory change must survive a later file event on the same path name
+            if previous in (DELETED_DIR, CHANGED_DIR) and kind in (CHANGED, DELETED):
+                kind = CHANGED_DIR if kind == CHANGED else DELETED_DIR
+            self._pending[path] = kind
+            self._last_event = now
+        self._wakeup.set()
+
+    def _apply_loop(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait()
+            # debounce: wait until the burst is quiet, but never longer than max_delay
+            while not self._stopping.is_set():
+                with self._pending_lock:
+                    now = time.monotonic()
+                    quiet_for = now - self._last_event
+                    waited = now - self._first_event
+                if quiet_for >= self.debounce or waited >= self.max_delay:
+                    break
+                time.sleep(min(self.debounce - quiet_for, self.max_delay - waited, self.debounce))
+            with self._pending_lock:
+                batch = self._pending
+                self._pending = {}
+                self._wakeup.clear()
+            if batch:
+                self._apply_batch(batch)
+
+    def _apply_batch(self, batch: Dict[str, int]):
+        with self._lock:
+            deleted_dirs = tuple(path for path, kind in batch.items() if kind == DELETED_DIR)
+            if deleted_dirs:
+                self._remove_tree(deleted_dirs)
+            for path, kind in batch.items():
+                if kind == DELETED_DIR:
+                    self._remove_file(*os.path.split(path))
+                else:
+                    self._apply_path(path, kind)
+        if self.detailed:
+            print(f"[Monitor] Applied {len(batch)} coalesced changes.")
+        if self.on_update is not None:
+            self.on_update(self.snapshot(), len(batch))
+
+    # public api
+
+    def watch(self):
+        # starts collecting events, start() applies them. called before a scan whose summary goes to
+        # start(), the changes made while that scan runs are applied too
+        if self._observer is None:
+            observer = Observer()
+            observer.schedule(_EventCollector(self), self.root, recursive=True)
+            observer.start()
+            self._observer = observer
+        return self
+
+    def start(self, summary: Optional[Dict[str, Any]] = None):
+        # summary: a scan of root with all_files_details, its FileTable is taken over. without one the tree is walked
+        self.watch()
+        files = summary.get('all_files_details') if summary is not None else None
+        with self._lock:
+            if isinstance(files, FileTable):
+                self._seed(files, summary)
+            else:
+                self._walk(self.root)
+        self._stopping.clear()
+        self._applier = threading.Thread(target=self._apply_loop, name="filelens-monitor", daemon=True)
+        self._applier.start()
+        return self
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        self._stopping.set()
+        self._wakeup.set()
+        if self._applier is not None:
+            self._applier.join()
+            self._applier = None
+        with self._pending_lock: # whatever arrived last still counts
+            batch = self._pending
+            self._pending = {}
+        if batch:
+            self._apply_batch(batch)
+
+    def snapshot(self) -> Dict[str, Any]:
+        # copy of the current summary, safe to hand to the Reporter
+        with self._lock:
+            summary = self.summary
+            return {
+                'total_files': summary['total_files'],
+                'total_size': summary['total_size'],
+                'total_allocated': summary['total_allocated'],
+                'hardlinks': dict(summary['hardlinks']),
+                'by_type': {k: dict(v) for k, v in summary['by_type'].items()},
+                'by_dir': {k: dict(v) for k, v in summary['by_dir'].items()},
+                'errors': list(summary['errors']),
+            }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
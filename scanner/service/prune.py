@@ -0,0 +1,189 @@
+import copy
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Prune rules, checked for every subdirectory before it is queued, so a pruned subtree is never
+# opened. All exclude patterns are compiled into one regular expression; the mount table is read
+# once into a set of mount points to skip. Checks run cheapest first: depth, mount point, pattern,
+# then the device for one_filesystem, taken from the stat data the listing already has.
+#
+# exclude patterns follow .gitignore for directories:
+#   node_modules      a name without "/" matches at any depth
+#   /build, src/tmp   a "/" anchors the pattern to the scan root
+#   *, ?, [a-z]       do not match "/", ** matches any number of directories (a/**/b, **/cache)
+#   a trailing "/" is ignored (only directories are pruned), lines starting with # are comments.
+# Negated patterns ("!keep") are not supported, a pruned directory is never listed to find them.
+
+# mounted by the kernel, nothing on them is a user's file
+PSEUDO_FS = frozenset({
+    "proc", "sysfs", "devtmpfs", "devpts", "cgroup", "cgroup2", "securityfs", "debugfs", "tracefs",
+    "pstore", "bpf", "configfs", "fusectl", "mqueue", "hugetlbfs", "binfmt_misc", "autofs", "efivarfs",
+    "selinuxfs", "rpc_pipefs", "nsfs",
+})
+# slow to walk and usually scanned on the server itself
+NETWORK_FS = frozenset({"nfs", "nfs4", "cifs", "smbfs", "smb3", "afs", "ceph", "9p", "fuse.sshfs", "davfs", "fuse.rclone"})
+DEFAULT_SKIP_FS = PSEUDO_FS | NETWORK_FS
+MOUNTS = "/proc/mounts"
+
+REASONS = ("exclude", "depth", "filesystem", "mount")
+
+
+def read_mounts(path: str = MOUNTS) -> Dict[str, str]:
+    # mount point -> filesystem type. no mount table (macOS, Windows): nothing is skipped by type
+    mounts: Dict[str, str] = {}
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 3:
+                    # spaces and tabs in mount points are octal escaped: /mnt/my\040disk
+                    point = re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), fields[1])
+                    mounts[point] = fields[2]
+    except OSError:
+        pass
+    return mounts
+
+
+def _translate(glob: str) -> str:
+    # one gitignore glob to a regex over the path relative to the scan root
+    anchored = "/" in glob
+    pattern = glob.lstrip("/")
+    out = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            # like fnmatch.translate: a "]" right after "[" or "[!" is a member, not the end,
+            # and a "[" without its "]" is a literal
+            j = i + 1
+            if pattern[j:j + 1] in ("!", "^"):
+                j += 1
+            if pattern[j:j + 1] == "]":
+                j += 1
+            end = pattern.find("]", j)
+            if end < 0:
+                out.append(re.escape(c))
+                i += 1
+                continue
+            body = pattern[i + 1:end]
+            negate = body[:1] in ("!", "^")
+            if negate:
+                body = body[1:]
+            # characters with a meaning inside a regex set are literals in a glob set, "-" keeps its ranges
+            body = re.sub(r"([\\\[\]^&~|])", r"\\\1", body)
+            out.append("[" + ("^" if negate else "") + body + "]")
+            i = end + 1
+        else:
+            out.append(re.escape(c))
+            i += 1
+    regex = "".join(out) if anchored else "(?:.*/)?" + "".join(out)
+    try: # e.g. a bad range like "[z-a]"
+        re.compile(regex)
+    except re.error:
+        raise ValueError(f"invalid prune pattern {glob!r}") from None
+    return regex
+
+
+def compile_excludes(patterns: Iterable[str]) -> Optional["re.Pattern"]:
+    alternatives = []
+    for pattern in patterns:
+        pattern = pattern.strip()
+        if not pattern or pattern.startswith("#"):
+            continue
+        if pattern.startswith("!"):
+            raise ValueError(f"Negated exclude pattern '{pattern}' is not supported.")
+        pattern = pattern.rstrip("/")
+        if pattern:
+            alternatives.append(_translate(pattern))
+    if not alternatives:
+        return None
+    return re.compile("(?:" + "|".join(alternatives) + r")\Z", re.DOTALL)
+
+
+def read_exclude_file(path) -> List[str]:
+    # a .gitignore style file, one pattern per line
+    with open(path, encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+class PruneRules:
+    # plain attributes and a compiled pattern, so it pickles into pool processes with ScanOptions
+    def __init__(self, excludes: Iterable[str] = (), max_depth: Optional[int] = None, one_filesystem: bool = False,
+                 skip_fs: Iterable[str] = DEFAULT_SKIP_FS, mounts: Optional[Dict[str, str]] = None):
+        self.excludes = list(excludes)
+        self.pattern = compile_excludes(self.excludes)
+        self.max_depth = max_depth # 0 lists only the root, 1 its subdirectories too, ...
+        self.one_filesystem = one_filesystem
+        self.skip_fs = frozenset(skip_fs)
+        if mounts is None:
+            mounts = read_mounts() if self.skip_fs else {}
+        self.mount_points = frozenset(point for point, fs_type in mounts.items() if fs_type in self.skip_fs)
+        self.skip_mounts = self.mount_points
+        self.root = None
+        self.root_prefix = None
+        self.root_dev = None
+
+    def bind(self, root: str) -> "PruneRules":
+        # a copy for one scan: relative paths, depths and the device are taken from the scan root
+        rules = copy.copy(self)
+        root = os.path.abspath(root)
+        rules.root = root
+        rules.root_prefix = root.rstrip(os.sep) + os.sep
+        rules.root_dev = os.stat(root).st_dev if self.one_filesystem else None
+        # the scan root itself is never skipped, scanning /proc on purpose still works
+        rules.skip_mounts = self.mount_points - {root}
+        return rules
+
+    def reason(self, path: str, dev: Optional[int] = None) -> Optional[str]:
+        # why path would be pruned, None to scan it. path is under the bound root, dev its st_dev if known
+        prefix = self.root_prefix or os.sep
+        rel = path[len(prefix):] if path.startswith(prefix) else path.lstrip(os.sep)
+        if self.max_depth is not None and rel.count(os.sep) + 1 > self.max_depth:
+            return "depth"
+        if path in self.skip_mounts:
+            return "mount"
+        if self.pattern is not None and self.pattern.match(rel if os.sep == "/" else rel.replace(os.sep, "/")):
+            return "exclude"
+        if self.root_dev is not None:
+            if dev is None:
+                try:
+                    dev = os.lstat(path).st_dev
+                except OSError:
+                    return None # let the listing report it
+            if dev != self.root_dev:
+                return "filesystem"
+        return None
+
+    def filter(self, subdirs: List[Tuple[str, int, int]], counts: Dict[str, int]) -> List[Tuple[str, int, int]]:
+        # (path, st_dev, st_ino) of the subdirectories to scan, pruned ones are counted per reason into counts
+        kept = []
+        for subdir in subdirs:
+            reason = self.reason(subdir[0], subdir[1])
+            if reason is None:
+                kept.append(subdir)
+            else:
+                counts[reason] = counts.get(reason, 0) + 1
+        return kept
+
+    @property
+    def active(self) -> bool:
+        return bool(self.pattern is not None or self.max_depth is not None or self.one_filesystem or self.skip_mounts)
+
+
+def format_pruned(counts: Dict[str, int]) -> str:
+    parts = [f"{counts[reason]} by {reason}" for reason in REASONS if counts.get(reason)]
+    return f"Pruned {sum(counts.values())} directories ({', '.join(parts)})." if parts else "Nothing pruned."
@@ -1,29 +1,64 @@
 
+import collections
+import csv
+import hashlib
+import io
+import itertools
+import os
 import sys
 import datetime
+import heapq
+import json
+import tempfile
+import threading
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Union, Iterable, Tuple
 
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from matplotlib.ticker import MaxNLocator
+from scanner.utils.dirtree import DirTree
+from scanner.utils.filetable import FileTable
+from scanner.utils.sketches import ScanAggregates
 
-from reportlab.platypus import (
-    SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
-)
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import LETTER
+# matplotlib and reportlab take most of a second to import, they are only loaded when a chart
+# or a PDF is actually rendered so that scans, --help and the interactive shell start fast.
+
+# Rendered charts are cached as PNG bytes under a hash of what they show (chart type and the top
+# file types), so a report of an unchanged scan does not draw its chart again. The cache is kept per
+# process and, with cache_dir, on disk where other processes and later runs find it. Charts reach
+# the PDF from memory, no fixed temporary file is shared between reports.
+CHART_VERSION = 1 # part of the cache key, bump when the chart drawing changes
+CHART_CACHE_SIZE = 32 # charts kept in memory per process
+CACHE_DIR_FILES = 1024 # charts kept in a cache_dir, the least recently used are removed first
+
+_chart_cache: "collections.OrderedDict[str, bytes]" = collections.OrderedDict()
+_chart_cache_lock = threading.Lock()
+
+
+def clear_render_cache():
+    with _chart_cache_lock:
+        _chart_cache.clear()
+
+
+def _pyplot():
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
 
 
 class Reporter:
-    def __init__(self, output_dir: Path, chart_type: str, detailed: bool):
+    def __init__(self, output_dir: Path, chart_type: str, detailed: bool, stream: bool = False, top_n: int = 100,
+                 export_format: Optional[str] = None, stream_threshold: int = 50000, chunk_rows: int = 500,
+                 top_dirs: int = 20, cache_dir: Optional[Path] = None):
         self.output_dir = output_dir
         self.chart_type = chart_type
         self.detailed = detailed
-        self._temp_chart_path: Path = self.output_dir / "_chart_temp_filelens.png"
+        self.stream = stream # PDF gets the top_n largest files, the full list goes to a csv/jsonl file next to it
+        self.top_n = top_n
+        self.export_format = export_format # 'csv' or 'jsonl', also written without stream when set
+        self.stream_threshold = stream_threshold # bigger file lists are always streamed
+        self.chunk_rows = chunk_rows
+        self.top_dirs = top_dirs # rows in the largest directories section, from summary_data['dir_tree']
+        self.cache_dir = cache_dir # rendered charts shared with other processes and later runs, see _cached_chart
 
         if self.chart_type in ["bar", "pie"]:
             try:
@@ -45,6 +80,26 @@ class Reporter:
             unit += 1
         return (f"{num:.2f} {units[unit]}") # format size with 2 decimal places
     
+    def _disk_usage_lines(self, summary_data: Dict[str, Any]) -> List[str]:
+        # only summaries from a scan have these, monitor snapshots don't
+        lines = []
+        if 'total_allocated' in summary_data:
+            lines.append(f"On Disk    : {self.convert_size(summary_data['total_allocated'])} (allocated blocks)")
+        if summary_data.get('hardlinks'):
+            links = summary_data['hardlinks']
+            lines.append(f"Hardlinks  : {links['files']} extra names, {self.convert_size(links['bytes'])} not counted twice")
+        return lines
+
+    def _largest_dirs(self, summary_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        tree: Optional[DirTree] = summary_data.get('dir_tree')
+        if tree is None or not len(tree) or self.top_dirs <= 0:
+            return []
+        # the scan root holds everything, the rows below it are the interesting part. it is left out by
+        # having no parent, not by rank: a directory holding the whole tree ties with the root
+        roots = set(tree.roots())
+        ids = [i for i in tree.heaviest(self.top_dirs + len(roots)) if i not in roots]
+        return [tree.row(i) for i in ids[:self.top_dirs]]
+
     def format_summary_text(self, summary_data: Dict[str, Any], scan_path_for_report: Optional[Path] = None) -> str:
         lines = [" "
             "    FileLens Scan Summary",
@@ -52,6 +107,7 @@ class Reporter:
             f"Report Time: {datetime.datetime.now():%Y-%m-%d %H:%M:%S}", # fix formatted datetime syntax
             f"Total Files: {summary_data.get('total_files', 0)}",
             f"Total Size : {self.convert_size(summary_data.get('total_size', 0))}",
+            *self._disk_usage_lines(summary_data),
             ""]
         
         stats = summary_data.get('by_type', {})
@@ -71,16 +127,83 @@ class Reporter:
                 lines.append(f" {type_name:<40} : {count_str:>7} files, {size_str:>10}")
         else:
             lines.append(" No specific file type data found.")
-        
+
+        largest_dirs = self._largest_dirs(summary_data)
+        if largest_dirs:
+            lines.append("Largest directories (with everything below them):")
+            for row in largest_dirs:
+                lines.append(f" {self.convert_size(row['size']):>10} {row['files']:>9} files  {row['path']}")
+
+        aggregates: Optional[ScanAggregates] = summary_data.get('aggregates')
+        if aggregates is not None:
+            quantiles = aggregates.quantiles()
+            lines.append("File size quantiles: " + ", ".join(f"{name} {self.convert_size(int(value))}"
+                                                             for name, value in quantiles.items()))
+            lines.append("File size distribution:")
+            for low, high, count, size in aggregates.size_histogram.rows():
+                lines.append(f" {self.convert_size(low):>10} - {self.convert_size(high):<10} : {count:>7} files, {self.convert_size(size):>10}")
+            lines.append("Files by last modification:")
+            for label, count, size in aggregates.mtime_ages.rows():
+                lines.append(f" {label:<12} : {count:>7} files, {self.convert_size(size):>10}")
+            lines.append("Largest files:")
+            for size, path in aggregates.largest.items()[:10]:
+                lines.append(f" {self.convert_size(size):>10}  {path}")
+
         lines.append("     End of Summary")
         output = "\n".join(lines)
         return output
     
     
-    def _generate_chart_image(self, summary_data: Dict[str, Any]) -> bool:
+    def _cached_chart(self, key: str) -> Optional[bytes]:
+        with _chart_cache_lock:
+            png = _chart_cache.get(key)
+            if png is not None:
+                _chart_cache.move_to_end(key)
+                return png
+        if self.cache_dir is None:
+            return None
+        path = Path(self.cache_dir) / f"{key}.png"
+        try:
+            png = path.read_bytes()
+            os.utime(path) # the mtime orders the cache files for eviction
+        except OSError:
+            return None
+        self._remember_chart(key, png)
+        return png
+
+    def _remember_chart(self, key: str, png: bytes):
+        with _chart_cache_lock:
+            _chart_cache[key] = png
+            _chart_cache.move_to_end(key)
+            while len(_chart_cache) > CHART_CACHE_SIZE:
+                _chart_cache.popitem(last=False)
+
+    def _store_chart(self, key: str, png: bytes):
+        self._remember_chart(key, png)
+        if self.cache_dir is None:
+            return
+        cache_dir = Path(self.cache_dir)
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            # a temporary file per writer, renamed into place: processes rendering the same chart don't collide
+            fd, tmp = tempfile.mkstemp(dir=cache_dir, prefix=f".{key[:12]}-", suffix=".tmp")
+            with os.fdopen(fd, 'wb') as out:
+                out.write(png)
+            os.replace(tmp, cache_dir / f"{key}.png")
+            cached = list(cache_dir.glob("*.png"))
+            if len(cached) > CACHE_DIR_FILES:
+                cached.sort(key=lambda path: path.stat().st_mtime)
+                for path in cached[:len(cached) - CACHE_DIR_FILES]:
+                    path.unlink(missing_ok=True)
+        except OSError as e: # the cache is only a shortcut, the report is written anyway
+            if self.detailed:
+                print(f"[Reporter] Chart cache {cache_dir} not updated: {e}", file=sys.stderr)
+
+    def _generate_chart_image(self, summary_data: Dict[str, Any]) -> Optional[bytes]:
+        # the chart as PNG bytes, from the render cache when an equal chart was drawn before
         type_stats = summary_data.get('by_type', {}) # a dictionary with file types as keys and their stats as values
         if not type_stats or self.chart_type == "none":
-            return False
+            return None
 
         types_counts_sorted = sorted(
             ((type_name, data['count'])
@@ -92,10 +215,20 @@ class Reporter:
         
         if not top_types_data:
             if self.detailed: print("No data suitable for chart generation.")
-            return False
-            
+            return None
+
+        key = hashlib.sha1(json.dumps([CHART_VERSION, self.chart_type, top_types_data]).encode()).hexdigest()
+        png = self._cached_chart(key)
+        if png is not None:
+            if self.detailed:
+                print(f"[Reporter] Chart reused from the render cache ({key[:12]}).")
+            return png
+
         labels, counts = zip(*top_types_data) # unzipping the sorted data into labels and counts
 
+        plt = _pyplot()
+        from matplotlib.ticker import MaxNLocator
+
         figure, ax = plt.subplots(figsize=(10, 7)) # matplotlib.pyplot.subplots creates a figure and a set of axes.
 
         if self.chart_type == "bar":
@@ -125,15 +258,137 @@ class Reporter:
             ax.set_title("Top 10 File Types Distribution by Count", fontsize=14)
 
 
-        figure.savefig(str(self._temp_chart_path), bbox_inches='tight', dpi=150) # saving the figure
-        if self.detailed:
-            print(f"Chart image saved temporarily to: {self._temp_chart_path}")
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format='png', bbox_inches='tight', dpi=150) # saving the figure
         plt.close(figure) # closes a figure window.
-        return True
+        png = buffer.getvalue()
+        self._store_chart(key, png)
+        if self.detailed:
+            print(f"[Reporter] Chart rendered ({len(png)} bytes, {key[:12]}).")
+        return png
+
+
+    def _largest_files(self, all_files: Union[List[Dict[str, Any]], FileTable], n: int) -> List[Tuple[int, str]]:
+        # bounded heap of n entries instead of sorting every file
+        if isinstance(all_files, FileTable):
+            sizes = all_files.sizes
+            top = heapq.nlargest(n, range(len(all_files)), key=sizes.__getitem__)
+            return [(sizes[i], all_files.path(i)) for i in top]
+        top = heapq.nlargest(n, all_files, key=lambda f: f.get('size', 0))
+        return [(f.get('size', 0), str(f.get('path', 'N/A'))) for f in top]
+
+    def _append_file_tables(self, story: list, rows: Iterable[Tuple[str, int]], styles):
+        # one Table per chunk_rows rows with plain string cells, reportlab lays out small tables much faster
+        # than one huge table of Paragraphs
+        from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+        from reportlab.lib.units import inch
+        from reportlab.lib import colors
+
+        header = [Paragraph("<b>File Path</b>", styles['Normal']), Paragraph("<b>Size</b>", styles['Normal'])]
+        style = TableStyle([
+            ('BACKGROUND', (0,0), (-1,0), colors.darkblue),
+            ('TEXTCOLOR',(0,0),(-1,0),colors.whitesmoke),
+            ('ALIGN',(0,0),(-1,-1),'LEFT'),
+            ('ALIGN',(1,0),(-1,-1),'RIGHT'),
+            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0,1), (-1,-1), 8),
+            ('BOTTOMPADDING', (0,0), (-1,0), 10),
+            ('BACKGROUND',(0,1),(-1,-1),colors.lightgrey),
+            ('GRID',(0,0),(-1,-1),0.5,colors.grey),
+            ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+            ('LEFTPADDING', (0,0), (-1,-1), 5),
+            ('RIGHTPADDING', (0,0), (-1,-1), 5),
+        ])
+        chunk = [header]
+        for path_str, size in rows:
+            display_path = path_str if len(path_str) < 90 else "..." + path_str[-87:]
+            chunk.append([display_path, self.convert_size(size)])
+            if len(chunk) > self.chunk_rows:
+                story.append(Table(chunk, colWidths=[5.5*inch, 2.0*inch], style=style, repeatRows=1))
+                chunk = [header]
+        if len(chunk) > 1:
+            story.append(Table(chunk, colWidths=[5.5*inch, 2.0*inch], style=style, repeatRows=1))
+        story.append(Spacer(1, 0.2*inch))
+
+    def _append_aggregate_tables(self, story: list, aggregates: ScanAggregates, styles):
+        # size and age distributions straight from the scan sketches, no per-file data needed
+        from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+        from reportlab.lib.units import inch
+        from reportlab.lib import colors
 
+        style = TableStyle([
+            ('BACKGROUND', (0,0), (-1,0), colors.darkslategray),
+            ('TEXTCOLOR',(0,0),(-1,0),colors.whitesmoke),
+            ('ALIGN',(0,0),(-1,-1),'LEFT'),
+            ('ALIGN',(1,0),(-1,-1),'RIGHT'),
+            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+            ('BACKGROUND',(0,1),(-1,-1),colors.ghostwhite),
+            ('GRID',(0,0),(-1,-1),0.5,colors.darkgrey),
+            ('LEFTPADDING', (0,0), (-1,-1), 5),
+            ('RIGHTPADDING', (0,0), (-1,-1), 5),
+        ])
+        quantiles = aggregates.quantiles()
+        story.append(Paragraph("File Size Distribution:", styles['h2']))
+        story.append(Paragraph("Size quantiles: " + ", ".join(f"{name} {self.convert_size(int(value))}"
+                                                           for name, value in quantiles.items()), styles['Normal']))
+        story.append(Spacer(1, 0.1 * inch))
+        rows = [["Size Range", "Files", "Total Size"]]
+        for low, high, count, size in aggregates.size_histogram.rows():
+            rows.append([f"{self.convert_size(low)} - {self.convert_size(high)}", str(count), self.convert_size(size)])
+        story.append(Table(rows, colWidths=[3.0*inch, 1.5*inch, 2.0*inch], style=style))
+        story.append(Spacer(1, 0.2*inch))
 
-    def _create_pdf_report(self, summary_data: Dict[str, Any], chart_image_exists_and_valid: bool, scan_path_for_report: Optional[Path] = None):
-        pdf_file_path = self.output_dir / f"FileLens_Report_{datetime.datetime.now():%Y%m%d_%H%M%S}.pdf" # datetime formatting
+        for title, histogram in (("Files by Last Modification:", aggregates.mtime_ages),
+                                 ("Files by Last Access:", aggregates.atime_ages)):
+            story.append(Paragraph(title, styles['h2']))
+            story.append(Spacer(1, 0.1 * inch))
+            rows = [["Age", "Files", "Total Size"]]
+            rows.extend([label, str(count), self.convert_size(size)] for label, count, size in histogram.rows())
+            story.append(Table(rows, colWidths=[3.0*inch, 1.5*inch, 2.0*inch], style=style))
+            story.append(Spacer(1, 0.2*inch))
+
+    def export_file_list(self, all_files: Union[List[Dict[str, Any]], FileTable], export_path: Path) -> Path:
+        # writes every file row by row (csv or jsonl by suffix), nothing is collected in memory
+        is_table = isinstance(all_files, FileTable)
+        # an unknown atime (NaN in a FileTable) is written as null / an empty csv field
+        rows = ((all_files.path(i), all_files.sizes[i], all_files.mtimes[i],
+                 all_files.atimes[i] if all_files.atimes[i] == all_files.atimes[i] else None, all_files.type_name(i))
+                for i in range(len(all_files))) if is_table else \
+               ((str(f.get('path', '')), f.get('size', 0), f.get('mtime'), f.get('atime'), f.get('type')) for f in all_files)
+
+        with open(export_path, 'w', newline='', encoding='utf-8') as out:
+            if export_path.suffix == ".jsonl":
+                for path, size, mtime, atime, type_name in rows:
+                    out.write(json.dumps({'path': path, 'size': size, 'mtime': mtime, 'atime': atime, 'type': type_name}))
+                    out.write("\n")
+            else:
+                writer = csv.writer(out)
+                writer.writerow(["path", "size", "mtime", "atime", "type"])
+                writer.writerows(rows)
+        print(f"[Reporter] File list exported: {export_path.resolve()}")
+        return export_path
+
+    def _new_report_path(self, label: Optional[str] = None) -> Path:
+        # the name is claimed by creating the file, reports started in the same second (other threads,
+        # processes, a batch) get _2, _3, ... instead of overwriting each other
+        stem = f"FileLens_Report_{label + '_' if label else ''}{datetime.datetime.now():%Y%m%d_%H%M%S}" # datetime formatting
+        for n in itertools.count(1):
+            path = self.output_dir / (f"{stem}_{n}.pdf" if n > 1 else f"{stem}.pdf")
+            try:
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+                return path
+            except FileExistsError:
+                continue
+
+    def _create_pdf_report(self, summary_data: Dict[str, Any], chart_image: Optional[bytes],
+                           scan_path_for_report: Optional[Path] = None, label: Optional[str] = None) -> Path:
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.lib.units import inch
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import LETTER
+
+        pdf_file_path = self._new_report_path(label)
         doc = SimpleDocTemplate(str(pdf_file_path), pagesize=LETTER) # reportlab.platypus.SimpleDocTemplate -> basic pdf document structure.
         styles = getSampleStyleSheet() # pre-defined text styles.
         story: list = [] 
@@ -144,10 +399,12 @@ class Reporter:
         story.append(Paragraph(f"Target Path Scanned: {str(scan_path_for_report.resolve()) if scan_path_for_report else 'N/A'}", styles['Normal']))
         story.append(Paragraph(f"Total Files: {summary_data.get('total_files', 0)}", styles['Normal']))
         story.append(Paragraph(f"Total Size: {self.convert_size(summary_data.get('total_size', 0))}", styles['Normal']))
+        for line in self._disk_usage_lines(summary_data):
+            story.append(Paragraph(line, styles['Normal']))
         story.append(Spacer(1, 0.2 * inch))
 
-        if chart_image_exists_and_valid and self._temp_chart_path.exists():
-            img = Image(str(self._temp_chart_path), width=7 * inch, height=5 * inch) # flowable for images.
+        if chart_image:
+            img = Image(io.BytesIO(chart_image), width=7 * inch, height=5 * inch) # flowable for images.
             img.hAlign = 'CENTER'
             story.append(img)
             story.append(Spacer(1, 0.2 * inch))
@@ -195,55 +452,85 @@ class Reporter:
                 story.append(pdf_table_types)
                 story.append(Spacer(1, 0.2*inch))
 
-        all_files_details: Optional[List[Dict[str, Any]]] = summary_data.get('all_files_details')
-        if all_files_details:
-            story.append(Paragraph("All Scanned Files (Sorted by Size - Largest First):", styles['h2']))
+        largest_dirs = self._largest_dirs(summary_data)
+        if largest_dirs:
+            story.append(Paragraph(f"Top {len(largest_dirs)} Largest Directories (including subdirectories):", styles['h2']))
             story.append(Spacer(1, 0.1 * inch))
+            rows = [["Directory", "Files", "Total Size", "Own Files Size"]]
+            for row in largest_dirs:
+                path = row['path'] if len(row['path']) < 70 else "..." + row['path'][-67:]
+                rows.append([path, str(row['files']), self.convert_size(row['size']), self.convert_size(row['own_size'])])
+            story.append(Table(rows, colWidths=[4.0*inch, 0.9*inch, 1.2*inch, 1.3*inch], repeatRows=1, style=TableStyle([
+                ('BACKGROUND', (0,0), (-1,0), colors.darkslategray),
+                ('TEXTCOLOR',(0,0),(-1,0),colors.whitesmoke),
+                ('ALIGN',(0,0),(-1,-1),'LEFT'),
+                ('ALIGN',(1,0),(-1,-1),'RIGHT'),
+                ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0,1), (-1,-1), 8),
+                ('BACKGROUND',(0,1),(-1,-1),colors.ghostwhite),
+                ('GRID',(0,0),(-1,-1),0.5,colors.darkgrey),
+                ('LEFTPADDING', (0,0), (-1,-1), 5),
+                ('RIGHTPADDING', (0,0), (-1,-1), 5),
+            ])))
+            story.append(Spacer(1, 0.2*inch))
 
-            sorted_all_files = sorted(all_files_details, key=lambda x: x.get('size', 0), reverse=True)
-            
-            table_content_all_files = [
-                [Paragraph("<b>File Path</b>", styles['Normal']), Paragraph("<b>Size</b>", styles['Normal'])]
-            ]
-            for file_detail in sorted_all_files:
-                path_str = str(file_detail.get('path', 'N/A'))
-                display_path = path_str if len(path_str) < 70 else "..." + path_str[-67:]
-                table_content_all_files.append([
-                    Paragraph(display_path, styles['Normal']),
-                    self.convert_size(file_detail.get('size', 0))
-                ])
-            
-            if len(table_content_all_files) > 1:
-                pdf_table_all_files = Table(table_content_all_files, colWidths=[5.5*inch, 2.0*inch])
-                pdf_table_all_files.setStyle(TableStyle([
-                    ('BACKGROUND', (0,0), (-1,0), colors.darkblue),
-                    ('TEXTCOLOR',(0,0),(-1,0),colors.whitesmoke),
-                    ('ALIGN',(0,0),(-1,-1),'LEFT'),
-                    ('ALIGN',(1,0),(-1,-1),'RIGHT'),
-                    ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-                    ('BOTTOMPADDING', (0,0), (-1,0), 10),
-                    ('BACKGROUND',(0,1),(-1,-1),colors.lightgrey),
-                    ('GRID',(0,0),(-1,-1),0.5,colors.grey),
-                    ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-                    ('LEFTPADDING', (0,0), (-1,-1), 5),
-                    ('RIGHTPADDING', (0,0), (-1,-1), 5),
-                ]))
-                story.append(pdf_table_all_files)
+        aggregates: Optional[ScanAggregates] = summary_data.get('aggregates')
+        if aggregates is not None:
+            self._append_aggregate_tables(story, aggregates, styles)
+
+        all_files_details: Optional[Union[List[Dict[str, Any]], FileTable]] = summary_data.get('all_files_details')
+        if all_files_details:
+            stream = self.stream or len(all_files_details) > self.stream_threshold
+            if stream:
+                # bounded memory: only the top-N rows go into the PDF, the full listing is streamed to a file
+                story.append(Paragraph(f"Top {self.top_n} Largest Files:", styles['h2']))
+                story.append(Spacer(1, 0.1 * inch))
+                if aggregates is not None and aggregates.largest.k >= self.top_n: # already picked during the scan
+                    largest = aggregates.largest.items()[:self.top_n]
+                else:
+                    largest = self._largest_files(all_files_details, self.top_n)
+                rows = ((path, size) for size, path in largest)
+                self._append_file_tables(story, rows, styles)
+                export_path = self.export_file_list(all_files_details, pdf_file_path.with_suffix(f".{self.export_format or 'csv'}"))
+                story.append(Paragraph(f"Full listing of {len(all_files_details)} files: {export_path.name}", styles['Normal']))
                 story.append(Spacer(1, 0.2*inch))
+            else:
+                story.append(Paragraph("All Scanned Files (Sorted by Size - Largest First):", styles['h2']))
+                story.append(Spacer(1, 0.1 * inch))
+                if isinstance(all_files_details, FileTable): # sorts the size column only, rows are built on demand
+                    rows = ((all_files_details.path(i), all_files_details.sizes[i]) for i in all_files_details.order_by_size())
+                else:
+                    rows = ((str(f.get('path', 'N/A')), f.get('size', 0))
+                            for f in sorted(all_files_details, key=lambda x: x.get('size', 0), reverse=True))
+                self._append_file_tables(story, rows, styles)
+                if self.export_format:
+                    self.export_file_list(all_files_details, pdf_file_path.with_suffix(f".{self.export_format}"))
+        elif aggregates is not None and aggregates.largest.heap:
+            # no per-file records, the top-K kept during the scan still gives the largest files
+            story.append(Paragraph(f"Top {min(self.top_n, len(aggregates.largest.heap))} Largest Files:", styles['h2']))
+            story.append(Spacer(1, 0.1 * inch))
+            self._append_file_tables(story, ((path, size) for size, path in aggregates.largest.items()[:self.top_n]), styles)
         else:
             if self.detailed:
                 story.append(Paragraph("Detailed list of all files not available in summary data.", styles['Normal']))
                 story.append(Spacer(1, 0.2*inch))
 
-        doc.build(story) # compiles the story into a PDF.
+        try:
+            doc.build(story) # compiles the story into a PDF.
+        except BaseException:
+            pdf_file_path.unlink(missing_ok=True) # no empty or half written report under the claimed name
+            raise
         print(f"[Reporter] PDF report successfully generated: {pdf_file_path.resolve()}")
+        return pdf_file_path
 
 
-    def write_summary_report(self, summary_data: Dict[str, Any], scan_path_for_report: Optional[Path] = None):
+    def write_summary_report(self, summary_data: Dict[str, Any], scan_path_for_report: Optional[Path] = None,
+                             label: Optional[str] = None) -> Optional[Path]:
+        # returns the PDF path, None when nothing was written. label goes into the file name
         if not summary_data or not summary_data.get('total_files', 0):
             if self.detailed:
                 print("[Reporter] No summary data or no files found. Skipping PDF report generation.")
-            return
+            return None
 
         generate_pdf_report = self.chart_type in ["bar", "pie", "none"]
         should_generate_chart = self.chart_type in ["bar", "pie"]
@@ -251,28 +538,19 @@ class Reporter:
         if not generate_pdf_report:
             if self.detailed:
                 print(f"[Reporter] Chart type is '{self.chart_type}'. PDF report generation is skipped as type is not bar, pie, or none.")
-            if self._temp_chart_path.exists():
-                self._temp_chart_path.unlink()
-                if self.detailed:
-                    print(f"[Reporter] Temporary chart file '{self._temp_chart_path}' deleted (PDF generation skipped).")
-            return
+            return None
 
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
-        chart_generated_successfully = False
+        chart_image = None
         if should_generate_chart:
             if self.detailed:
                 print(f"[Reporter] Chart type is '{self.chart_type}'. Attempting chart generation.")
-            chart_generated_successfully = self._generate_chart_image(summary_data)
+            chart_image = self._generate_chart_image(summary_data)
         elif self.detailed:
             print(f"[Reporter] Chart type is '{self.chart_type}'. Chart generation skipped; proceeding with PDF.")
         
         if self.detailed:
             print(f"[Reporter] Attempting PDF report generation for chart_type '{self.chart_type}'.")
         
-        self._create_pdf_report(summary_data, chart_generated_successfully, scan_path_for_report)
-        
-        if self._temp_chart_path.exists():
-            self._temp_chart_path.unlink()
-            if self.detailed:
-                print(f"[Reporter] Temporary chart file '{self._temp_chart_path}' deleted.")
+        return self._create_pdf_report(summary_data, chart_image, scan_path_for_report, label)
@@ -1,72 +1,585 @@
 import concurrent.futures
+import contextlib
+import copy
+import itertools
+import threading
 import time
 import os
-import threading
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 
-def scan(start_directory, threads): #sdirectory, monitor, verbose, threads, charttype, reportdir
-    start_time = time.time()
-    processed_or_queued = set() #to avoid repetition
-    active_futures = {}
-    count = 0
-    totalsize = 0
-    lock = threading.RLock()
+from scanner.service.index import ScanIndex, scan_dir_cached
+from scanner.service.prune import PruneRules, format_pruned
+from scanner.service.scheduler import WorkStealingScheduler
+from scanner.service.telemetry import ScanMetrics, ScanTelemetry, merge_metrics
+from scanner.utils import racecheck
+from scanner.utils.dirtree import DirTree
+from scanner.utils.filetable import FileTable
+from scanner.utils.resources import ResourceGovernor, NO_CLAIM
+from scanner.utils.sniff import TypeSniffer, DEFAULT_BUDGET
+from scanner.utils.sketches import ScanAggregates, merge_aggregates
+
+
+class ScanOptions:
+    # what a scan collects on top of the totals, plain attributes so it pickles into pool processes
+    def __init__(self, collect_files: bool = False, sniff: bool = False, sniff_budget: int = DEFAULT_BUDGET,
+                 sniff_cache: Optional[Path] = None, aggregates: bool = True, top_k: int = 100,
+                 reference_time: Optional[float] = None, govern: bool = False, telemetry: bool = False,
+                 prune: Optional[PruneRules] = None, dir_tree: bool = False):
+        self.collect_files = collect_files
+        self.aggregates = aggregates # fixed-size sketches in summary_data['aggregates'], see utils/sketches.py
+        self.top_k = top_k
+        self.reference_time = reference_time # "now" for the age histograms, set when the scan starts
+        self.sniff = sniff # content based types in summary_data['by_mime'], reads the first KB of files
+        self.sniff_budget = sniff_budget
+        self.sniff_cache = sniff_cache
+        self.telemetry = telemetry # time directories and stat calls into summary_data['metrics'], see service/telemetry.py
+        self.govern = govern # claim fds, reads and device lanes through a ResourceGovernor, see utils/resources.py
+        self.dir_tree = dir_tree # per directory rollup in summary_data['dir_tree'], see utils/dirtree.py
+        self.prune = prune # subtrees never queued, see service/prune.py. None: PruneRules(), pseudo and network filesystems
+
+    @property
+    def needs_files(self) -> bool:
+        # an index row only holds directory totals, these options need every file to be listed
+        return self.collect_files or self.sniff
 
-    def worker(dir):
-        nonlocal count, totalsize
-        subdirectories_found = []
+    def make_sniffer(self, threads: int, budget: Optional[int] = None,
+                     governor: Optional[ResourceGovernor] = None) -> Optional[TypeSniffer]:
+        if not self.sniff:
+            return None
+        return TypeSniffer(self.sniff_budget if budget is None else budget, threads, self.sniff_cache,
+                           governor=governor)
 
-        for item in os.scandir(dir) :
+    def make_governor(self, threads: int) -> Optional[ResourceGovernor]:
+        # one per threaded scan (per process with the process engine), the fd limit is per process
+        if not self.govern:
+            return None
+        return ResourceGovernor(threads, sniff_threads=threads if self.sniff else 0)
+
+
+DEFAULT_OPTIONS = ScanOptions()
+BLOCK_SIZE = 512 # st_blocks unit on Linux, macOS and the BSDs
+HAS_BLOCKS = os.name != "nt" # no st_blocks on Windows, the allocated size falls back to st_size
+
+
+def new_summary() -> Dict[str, Any]:
+    # empty partial result, same shape Reporter.write_summary_report expects.
+    # total_size is the apparent size (st_size), total_allocated what the files take on disk (st_blocks)
+    return {
+        'total_files': 0,
+        'total_size': 0,
+        'total_allocated': 0,
+        'by_type': {},
+        'errors': [],
+    }
+
+
+def merge_summary(into: Dict[str, Any], part: Dict[str, Any]) -> Dict[str, Any]:
+    # folds a partial summary into another one, done once per directory task
+    into['total_files'] += part['total_files']
+    into['total_size'] += part['total_size']
+    into['total_allocated'] = into.get('total_allocated', 0) + part.get('total_allocated', 0)
+    by_type = into['by_type']
+    for type_name, data in part['by_type'].items():
+        entry = by_type.get(type_name)
+        if entry is None:
+            by_type[type_name] = dict(data)
+        else:
+            entry['count'] += data['count']
+            entry['size'] += data['size']
+    into['errors'].extend(part['errors'])
+    if 'hardlinks' in part: # names of a file that was already counted, not in the totals
+        stats = into.setdefault('hardlinks', {'files': 0, 'bytes': 0})
+        stats['files'] += part['hardlinks']['files']
+        stats['bytes'] += part['hardlinks']['bytes']
+    if part.get('links'):
+        # (dev, ino) -> (size, allocated, type, directory, aggregated) of files with more than one name.
+        # a file counted by both sides was met in two directories, the part's count is taken back out
+        # of the totals, its directory's row and, when aggregated is (path, mtime, atime), its aggregates
+        links = into.get('links')
+        if links is None:
+            links = into['links'] = {}
+        for key, value in part['links'].items():
+            if key not in links:
+                links[key] = value
+                continue
+            size, allocated, type_name, dir, aggregated = value
+            if aggregated is not None and part.get('aggregates') is not None:
+                part['aggregates'].remove(aggregated[0], size, aggregated[1], aggregated[2])
+            if 'dir_tree' in part:
+                part['dir_tree'].discount(dir, 1, size, allocated)
+            into['total_files'] -= 1
+            into['total_size'] -= size
+            into['total_allocated'] -= allocated
+            entry = by_type[type_name]
+            entry['count'] -= 1
+            entry['size'] -= size
+            stats = into.setdefault('hardlinks', {'files': 0, 'bytes': 0})
+            stats['files'] += 1
+            stats['bytes'] += size
+    if 'index' in part: # only present when the scan ran with a ScanIndex
+        stats = into.setdefault('index', {'reused': 0, 'listed': 0})
+        stats['reused'] += part['index']['reused']
+        stats['listed'] += part['index']['listed']
+    if 'by_mime' in part: # only present when the scan sniffed file contents
+        by_mime = into.setdefault('by_mime', {})
+        for mime, data in part['by_mime'].items():
+            entry = by_mime.get(mime)
+            if entry is None:
+                by_mime[mime] = dict(data)
+            else:
+                entry['count'] += data['count']
+                entry['size'] += data['size']
+        stats = into.setdefault('sniff', {})
+        for key, value in part.get('sniff', {}).items():
+            stats[key] = stats.get(key, 0) + value
+        if part.get('sniff_links'):
+            # (dev, ino) -> (mime, size, stats key) of files with several names, see TypeSniffer. one sniffer
+            # counts such a file once, a file whose names two sniffers (pool processes) met is taken out again
+            sniff_links = into.setdefault('sniff_links', {})
+            for key, value in part['sniff_links'].items():
+                if value is None:
+                    continue
+                if key not in sniff_links:
+                    sniff_links[key] = value
+                    continue
+                mime, size, stat = value
+                entry = by_mime[mime]
+                entry['count'] -= 1
+                entry['size'] -= size
+                if not entry['count']:
+                    del by_mime[mime]
+                if stat is not None:
+                    stats[stat] -= 1
+    if 'governor' in part: # only present when the scan ran with a ResourceGovernor
+        stats = into.setdefault('governor', {})
+        for key, value in part['governor'].items():
+            if key in ('peak_workers', 'final_workers', 'fd_budget'): # per governor levels, not counters
+                stats[key] = max(stats.get(key, 0), value)
+            else:
+                stats[key] = stats.get(key, 0) + value
+    if part.get('pruned'): # directories skipped by prune rules, per reason
+        pruned = into.setdefault('pruned', {})
+        for reason, count in part['pruned'].items():
+            pruned[reason] = pruned.get(reason, 0) + count
+    if part.get('aggregates') is not None:
+        into['aggregates'] = merge_aggregates(into.get('aggregates'), part['aggregates'])
+    if part.get('metrics') is not None:
+        into['metrics'] = merge_metrics(into.get('metrics'), part['metrics'])
+    if 'dir_tree' in part: # only present with ScanOptions.dir_tree, one row per listed directory
+        if 'dir_tree' in into:
+            into['dir_tree'].extend(part['dir_tree'])
+        else:
+            into['dir_tree'] = part['dir_tree']
+    if 'all_files_details' in part: # only present when the scan collects per-file records
+        if 'all_files_details' in into:
+            into['all_files_details'].extend(part['all_files_details'])
+        else:
+            into['all_files_details'] = part['all_files_details']
+    return into
+
+
+def file_type_of(name: str) -> str:
+    # extension based type, "no_extension" for files like Makefile
+    ext = os.path.splitext(name)[1].lower()
+    return ext if ext else "no_extension"
+
+
+def _error_entry(path, e: Exception) -> Dict[str, str]:
+    return {'path': str(path), 'error': f"{type(e).__name__}: {getattr(e, 'strerror', None) or e}"}
+
+
+def _list_entries(entries, subdirs: List[Tuple[str, int, int]], errors: List[Dict[str, str]],
+                  stat_times: Optional[List[int]] = None) -> Iterator[Tuple[os.DirEntry, os.stat_result]]:
+    # the regular files of one open scandir listing with their lstat results, shared by _scan_dir and
+    # stream.iter_scan. subdirectories go to subdirs as (path, st_dev, st_ino), entries that fail
+    # (PermissionError, FileNotFoundError when removed mid-scan, ...) to errors. stat_times gets each file's lstat ns
+    with entries:
+        for item in entries:
             try:
-                current_item_path = os.path.join(dir, item.name)
                 if item.is_dir(follow_symlinks=False):
-                    #print(f"Directory: {item.path}")
-                    subdirectories_found.append(item.path)
+                    st = item.stat(follow_symlinks=False) # a mount point gives the mounted root's ids
+                    subdirs.append((item.path, st.st_dev, st.st_ino))
                 elif item.is_file(follow_symlinks=False):
-                    try:
-                        with lock:
-                            count += 1
-                    except FileNotFoundError:
-                        pass
-                    #print(f"File: {item.path}")
-                    #do calculation!!!!!!!!!!!!!!
-            except PermissionError:
-                print("Permission denied!")
-            except FileNotFoundError:
-                print("Directory not found!")
-        
-        return subdirectories_found
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
-        if os.path.isdir(start_directory):
-            dir_to_scan = start_directory
-            processed_or_queued.add(os.path.realpath(start_directory))
+                    if stat_times is None:
+                        st = item.stat(follow_symlinks=False)
+                    else:
+                        stat_started = time.perf_counter_ns()
+                        st = item.stat(follow_symlinks=False)
+                        stat_times.append(time.perf_counter_ns() - stat_started)
+                    yield item, st
+            except OSError as e:
+                errors.append(_error_entry(item.path, e))
+
+
+def _scan_dir(dir, options: ScanOptions = DEFAULT_OPTIONS, sniffer: Optional[TypeSniffer] = None,
+              governor: Optional[ResourceGovernor] = None, dev: int = 0) -> Tuple[List[Tuple[str, int, int]], Dict[str, Any]]:
+    # lists one directory into its own partial, so no lock is taken per file.
+    # subdirectories come back as (path, st_dev, st_ino), the walk recognises a directory it has seen by those.
+    # dev: the directory's st_dev from its parent's listing, picks the governor's device lane
+    partial = new_summary()
+    files = None
+    if options.collect_files:
+        files = partial['all_files_details'] = FileTable()
+    sniff_candidates = [] if sniffer is not None else None
+    aggregates = None
+    if options.aggregates:
+        aggregates = partial['aggregates'] = ScanAggregates(options.reference_time, options.top_k)
+    metrics = None
+    stat_times = None
+    if options.telemetry:
+        metrics = partial['metrics'] = ScanMetrics()
+        stat_times = []
+        dir_started = time.perf_counter_ns()
+    by_type = partial['by_type']
+    subdirectories_found = []
+    count = 0
+    totalsize = 0
+    allocated_total = 0
+    links = None # files with more than one name, see merge_summary
+
+    # with a governor the directory handle and a device lane are claimed first, only for the listing itself
+    claim = governor.listing(dev) if governor is not None else NO_CLAIM
+    with claim:
+        try:
+            entries = os.scandir(dir) if governor is None else governor.scandir(dir)
+        except OSError as e:
+            partial['errors'].append(_error_entry(dir, e))
+            if options.dir_tree:
+                partial['dir_tree'] = DirTree()
+                partial['dir_tree'].add(dir, 0, 0, 0)
+            return subdirectories_found, partial
+
+        for item, st in _list_entries(entries, subdirectories_found, partial['errors'], stat_times):
+            size = st.st_size
+            allocated = st.st_blocks * BLOCK_SIZE if HAS_BLOCKS else size
+            type_name = file_type_of(item.name)
+            counted = True
+            if st.st_nlink > 1:
+                if links is None:
+                    links = partial['links'] = {}
+                key = (st.st_dev, st.st_ino)
+                if key in links: # a second name in the same directory
+                    counted = False
+                    stats = partial.setdefault('hardlinks', {'files': 0, 'bytes': 0})
+                    stats['files'] += 1
+                    stats['bytes'] += size
+                else:
+                    links[key] = (size, allocated, type_name, dir,
+                                  (item.path, st.st_mtime, st.st_atime) if aggregates is not None else None)
+            if files is not None:
+                files.append(dir, item.name, size, st.st_mtime, st.st_atime, type_name, st.st_ctime,
+                             allocated, (st.st_dev, st.st_ino) if st.st_nlink > 1 else None)
+            if not counted:
+                continue # listed under every name. counted, aggregated and sniffed once, see merge_summary
+            if aggregates is not None:
+                aggregates.add(item.path, size, st.st_mtime, st.st_atime)
+            count += 1
+            totalsize += size
+            allocated_total += allocated
+            if sniff_candidates is not None:
+                sniff_candidates.append((item.path, st.st_dev, st.st_ino, size, st.st_mtime_ns, st.st_nlink))
+            entry = by_type.get(type_name)
+            if entry is None:
+                by_type[type_name] = {'count': 1, 'size': size}
+            else:
+                entry['count'] += 1
+                entry['size'] += size
+        claim.entries = count + len(subdirectories_found)
+    if metrics is not None:
+        for stat_ns in stat_times:
+            metrics.stat_ns.add(stat_ns)
+        metrics.add_dir(dir, time.perf_counter_ns() - dir_started, sum(stat_times))
+
+    if sniff_candidates:
+        sniffer.submit(sniff_candidates) # sniffed in the sniffer's pool, results are collected at the end
+
+    partial['total_files'] = count
+    partial['total_size'] = totalsize
+    partial['total_allocated'] = allocated_total
+    if options.dir_tree:
+        partial['dir_tree'] = DirTree()
+        partial['dir_tree'].add(dir, count, totalsize, allocated_total)
+    return subdirectories_found, partial
+
+
+def _scan_dir_indexed(dir, cache, scan_start_ns, options: ScanOptions = DEFAULT_OPTIONS,
+                      sniffer: Optional[TypeSniffer] = None, governor: Optional[ResourceGovernor] = None, dev: int = 0):
+    # cached rows have no per-file data, with needs_files every directory is listed and the index only refreshed
+    result = scan_dir_cached(dir, cache, scan_start_ns, lambda d: _scan_dir(d, options, sniffer, governor, dev),
+                             reuse=not options.needs_files)
+    partial = result[1]
+    if options.dir_tree and 'dir_tree' not in partial: # reused from the index, the row has the directory's totals
+        partial['dir_tree'] = DirTree()
+        partial['dir_tree'].add(dir, partial['total_files'], partial['total_size'],
+                                partial.get('total_allocated', partial['total_size']))
+    return result
+
+
+def _finish_sniffer(summary: Dict[str, Any], sniffer: Optional[TypeSniffer]):
+    if sniffer is not None:
+        merge_summary(summary, {**new_summary(), 'by_mime': sniffer.finish(), 'sniff': sniffer.stats,
+                                'sniff_links': sniffer.links})
+
+
+def _scan_threaded(start_directory, threads: int, options: ScanOptions = DEFAULT_OPTIONS,
+                   cache: Optional[Dict[str, tuple]] = None, scan_start_ns: int = 0,
+                   sniff_budget: Optional[int] = None,
+                   telemetry: Optional[ScanTelemetry] = None) -> Tuple[Dict[str, Any], List[tuple], List[str]]:
+    # returns the summary plus the index rows to write and the subtrees that disappeared (both empty without a cache)
+    # the walk runs on a work-stealing scheduler (service/scheduler.py), every worker folds its directories
+    # into its own partial and the partials are merged once at the end
+    governor = options.make_governor(threads)
+    sniffer = options.make_sniffer(threads, sniff_budget, governor)
+    race = racecheck.CHECKER # None unless scan --race-check, then shared state accesses are sampled
+    root = os.stat(start_directory)
+    processed_or_queued = {(root.st_dev, root.st_ino)} # (st_dev, st_ino) of every directory queued, to avoid repetition
+    visited_lock = threading.Lock()
+    prune = options.prune if options.prune is not None and options.prune.active else None
+
+    worker_ids = itertools.count()
+
+    def new_state():
+        return {'summary': new_summary(), 'updates': [], 'removed': [], 'race_var': f"scan.summary.{next(worker_ids)}"}
+
+    def scan_one(state, item):
+        dir, dev = item # the device comes from the parent's listing, the governor needs no stat of its own
+        if cache is None:
+            new_subdirs, partial = _scan_dir(dir, options, sniffer, governor, dev)
         else:
-            print("Error: Directory '{start_directory' is not valid.}")
-        
-        future = executor.submit(worker, dir_to_scan)
-        active_futures[future] = dir_to_scan #to match futures with its directory
-
-        while active_futures:
-            done_futures, _ = concurrent.futures.wait(active_futures.keys(),
-                                            return_when=concurrent.futures.FIRST_COMPLETED) # _ represents not done futures
-            
-            for future in done_futures:
-                original_dir_scanned = active_futures.pop(future) #get directory back from matching
-
-                try:
-                    new_subdirs = future.result()
-
-                    for subdir in new_subdirs:
-                        real_subdir_path = os.path.realpath(subdir)
-                        if real_subdir_path not in processed_or_queued:
-                            processed_or_queued.add(subdir)
-                            new_future = executor.submit(worker, real_subdir_path)
-
-                            active_futures[new_future] = real_subdir_path
-                except Exception as e:
-                    pass
-                    #print(f"Task for directory '{original_dir_scanned}' raised an exception: {e}")
-        
-        print("Scanning complete.")
-        print(f"Time taken for the scan: {time.time()-start_time:.2f} seconds")
-        print(f"Total number of files scanned: {count}")
\ No newline at end of file
+            new_subdirs, partial, update, removed = _scan_dir_indexed(dir, cache, scan_start_ns, options, sniffer,
+                                                                      governor, dev)
+            if update is not None:
+                state['updates'].append(update)
+            state['removed'].extend(removed)
+        merge_summary(state['summary'], partial) # the worker's own partial, no lock
+        if race is not None:
+            race.write(state['race_var']) # one variable per worker, a second thread writing it is a bug
+        if not new_subdirs:
+            return ()
+        if prune is not None:
+            new_subdirs = prune.filter(new_subdirs, state['summary'].setdefault('pruned', {}))
+        fresh = []
+        with visited_lock: # once per directory, not per subdirectory
+            if race is not None:
+                race.read("scan.visited", "scan.visited_lock")
+            for path, dev, ino in new_subdirs:
+                key = (dev, ino)
+                if key not in processed_or_queued: # a bind mount or mount loop reaches a directory twice
+                    processed_or_queued.add(key)
+                    fresh.append((path, dev))
+            if fresh and race is not None:
+                race.write("scan.visited", "scan.visited_lock")
+        return fresh
+
+    def scan_failed(state, item, e):
+        state['summary']['errors'].append(_error_entry(item[0], e))
+
+    tick = None
+    if telemetry is not None:
+        def tick(states, pending):
+            # a rough live view from the workers' partials, only counters are read while they run.
+            # the reads take no lock, --race-check reports them against the workers' writes
+            live = ScanMetrics()
+            files = 0
+            for state in states:
+                if race is not None:
+                    race.read(state['race_var'])
+                files += state['summary']['total_files']
+                metrics = state['summary'].get('metrics')
+                if metrics is not None:
+                    live.dirs += metrics.dirs
+                    live.busy_ns += metrics.busy_ns
+            telemetry.tick({**new_summary(), 'total_files': files, 'metrics': live}, pending)
+
+    scheduler = WorkStealingScheduler(threads, scan_one, on_error=scan_failed)
+    states = scheduler.run([(start_directory, root.st_dev)], new_state, telemetry.interval if telemetry is not None else None, tick)
+    if telemetry is not None:
+        telemetry.queue_peak(scheduler.stats['max_pending'])
+
+    summary = new_summary()
+    index_updates: List[tuple] = []
+    index_removed: List[str] = []
+    for state in states:
+        merge_summary(summary, state['summary'])
+        index_updates.extend(state['updates'])
+        index_removed.extend(state['removed'])
+
+    if telemetry is not None and sniffer is not None:
+        with telemetry.phase("sniff_finish"):
+            _finish_sniffer(summary, sniffer)
+    else:
+        _finish_sniffer(summary, sniffer)
+    if governor is not None:
+        summary['governor'] = governor.summary()
+    return summary, index_updates, index_removed
+
+
+def _scan_shard(shard: str, threads: int, options: ScanOptions, index_path: Optional[Path] = None,
+                scan_start_ns: int = 0, sniff_budget: Optional[int] = None):
+    # runs inside a pool process: a threaded scan of one subtree, only the compact summary goes back
+    if index_path is None:
+        return _scan_threaded(shard, threads, options, sniff_budget=sniff_budget)
+    with ScanIndex(index_path) as index:
+        cache = index.load(shard) # only this subtree's rows, not the whole index
+    return _scan_threaded(shard, threads, options, cache, scan_start_ns, sniff_budget)
+
+
+def _split_tree(start_directory, min_shards: int, max_depth: int = 3, index: Optional[ScanIndex] = None,
+                scan_start_ns: int = 0, options: ScanOptions = DEFAULT_OPTIONS,
+                sniffer: Optional[TypeSniffer] = None) -> Tuple[Dict[str, Any], List[str], List[tuple], List[str]]:
+    # expands the top of the tree breadth first in the parent until there are enough subtrees
+    # to keep every process busy. files met on the way are counted here.
+    summary = new_summary()
+    index_updates: List[tuple] = []
+    index_removed: List[str] = []
+    frontier = [str(start_directory)]
+    depth = 0
+    while frontier and depth < max_depth and (depth == 0 or len(frontier) < min_shards):
+        next_frontier = []
+        for dir in frontier:
+            if index is None:
+                subdirs, partial = _scan_dir(dir, options, sniffer)
+            else:
+                row = index.get(dir)
+                subdirs, partial, update, removed = _scan_dir_indexed(dir, {dir: row} if row else {}, scan_start_ns,
+                                                                     options, sniffer)
+                if update is not None:
+                    index_updates.append(update)
+                index_removed.extend(removed)
+            merge_summary(summary, partial)
+            if options.prune is not None and options.prune.active:
+                subdirs = options.prune.filter(subdirs, summary.setdefault('pruned', {}))
+            next_frontier.extend(path for path, _, _ in subdirs)
+        frontier = next_frontier
+        depth += 1
+    return summary, frontier, index_updates, index_removed
+
+
+def _scan_multiprocess(start_directory, threads: int, processes: int, options: ScanOptions = DEFAULT_OPTIONS,
+                       index: Optional[ScanIndex] = None, scan_start_ns: int = 0,
+                       telemetry: Optional[ScanTelemetry] = None) -> Tuple[Dict[str, Any], List[tuple], List[str]]:
+    sniffer = options.make_sniffer(threads)
+    summary, shards, index_updates, index_removed = _split_tree(
+        start_directory, min_shards=processes * 4, index=index, scan_start_ns=scan_start_ns,
+        options=options, sniffer=sniffer)
+    shard_budget = None
+    if sniffer is not None:
+        _finish_sniffer(summary, sniffer)
+        shard_budget = max(0, sniffer.budget_left) // max(1, len(shards)) # what the parent left, shared evenly
+    if not shards:
+        return summary, index_updates, index_removed
+
+    index_path = index.db_path if index is not None else None
+    # biggest subtrees are unknown up front, so shards are handed out one by one as processes free up
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {executor.submit(_scan_shard, shard, threads, options, index_path, scan_start_ns, shard_budget): shard
+                   for shard in shards}
+        pending = len(futures)
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                partial, updates, removed = future.result()
+            except Exception as e:
+                summary['errors'].append(_error_entry(futures[future], e))
+                continue
+            merge_summary(summary, partial)
+            index_updates.extend(updates)
+            index_removed.extend(removed)
+            if telemetry is not None:
+                pending -= 1
+                telemetry.tick(summary, pending)
+    return summary, index_updates, index_removed
+
+
+def scan_tree(start_directory, threads: int = 1, engine: str = "thread", processes: Optional[int] = None,
+              index_path: Optional[Path] = None, collect_files: bool = False,
+              options: Optional[ScanOptions] = None, telemetry: Optional[ScanTelemetry] = None) -> Dict[str, Any]:
+    # quiet version of scan(), returns the summary_data dict.
+    # with index_path, directories whose (dev, ino, mtime) did not change since the last run are not listed again.
+    # with collect_files, summary_data['all_files_details'] is a FileTable of every file.
+    # with telemetry, summary_data['telemetry'] holds its report, see service/telemetry.py
+    if options is None:
+        options = ScanOptions(collect_files=collect_files)
+    if engine not in ("thread", "process"):
+        raise ValueError(f"Unknown scan engine '{engine}'. Use 'thread' or 'process'.")
+    threads = max(1, threads)
+    start_directory = os.path.abspath(start_directory) # index rows are keyed by absolute path
+    options = copy.copy(options) # the caller's options are not changed
+    if options.aggregates and options.reference_time is None:
+        options.reference_time = time.time() # same age reference in every worker and process
+    if telemetry is not None:
+        options.telemetry = True
+    options.prune = (options.prune or PruneRules()).bind(start_directory) # relative paths and depths from this root
+    processes = processes or os.cpu_count() or 1
+    if telemetry is not None:
+        telemetry.threads = threads * (processes if engine == "process" else 1)
+    phase = telemetry.phase if telemetry is not None else lambda name: contextlib.nullcontext()
+
+    if index_path is None:
+        with phase("walk"):
+            if engine == "process":
+                summary = _scan_multiprocess(start_directory, threads, processes, options, telemetry=telemetry)[0]
+            else:
+                summary = _scan_threaded(start_directory, threads, options, telemetry=telemetry)[0]
+    else:
+        scan_start_ns = time.time_ns()
+        with ScanIndex(index_path) as index:
+            if engine == "process":
+                with phase("walk"):
+                    summary, updates, removed = _scan_multiprocess(
+                        start_directory, threads, processes, options, index, scan_start_ns, telemetry)
+            else:
+                with phase("index_load"):
+                    cache = index.load(start_directory)
+                with phase("walk"):
+                    summary, updates, removed = _scan_threaded(start_directory, threads, options, cache, scan_start_ns,
+                                                               telemetry=telemetry)
+                del cache
+            with phase("index_apply"):
+                index.apply(updates, removed)
+        if summary.get('index', {}).get('reused') and 'aggregates' in summary:
+            # reused directories have no per-file data, sketches over the rest would be misleading
+            del summary['aggregates']
+    summary.pop('links', None) # only needed while partials are merged
+    summary.pop('sniff_links', None)
+    if 'dir_tree' in summary:
+        with phase("rollup"):
+            summary['dir_tree'].rollup()
+    if telemetry is not None:
+        summary['telemetry'] = telemetry.finish(summary)
+    return summary
+
+
+def scan(start_directory, threads, engine: str = "thread", processes: Optional[int] = None,
+         index_path: Optional[Path] = None, collect_files: bool = False, options: Optional[ScanOptions] = None,
+         telemetry: Optional[ScanTelemetry] = None): #sdirectory, monitor, verbose, threads, charttype, reportdir
+    start_time = time.time()
+
+    if not os.path.isdir(start_directory):
+        print(f"Error: Directory '{start_directory}' is not valid.")
+        return new_summary()
+
+    summary = scan_tree(start_directory, threads, engine, processes, index_path, collect_files, options, telemetry)
+
+    print("Scanning complete.")
+    print(f"Time taken for the scan: {time.time()-start_time:.2f} seconds")
+    print(f"Total number of files scanned: {summary['total_files']}")
+    print(f"Total size: {summary['total_size']} bytes, {summary['total_allocated']} bytes allocated on disk")
+    if 'hardlinks' in summary:
+        print(f"Hardlinks: {summary['hardlinks']['files']} extra names of already counted files "
+              f"({summary['hardlinks']['bytes']} bytes not counted twice)")
+    if 'index' in summary:
+        print(f"Directories listed: {summary['index']['listed']}, reused from index: {summary['index']['reused']}")
+    if 'sniff' in summary:
+        stats = summary['sniff']
+        print(f"Content types: {stats.get('sniffed', 0)} files sniffed, {stats.get('cached', 0)} from cache, "
+              f"{stats.get('unclassified', 0)} over the read budget ({stats.get('bytes_read', 0)} bytes read)")
+    if 'governor' in summary:
+        stats = summary['governor']
+        print(f"Resource governor: {stats['final_workers']} workers at the end (peak {stats['peak_workers']}), "
+              f"{stats['waits']} waits, {stats['emfile_retries']} retries on fd exhaustion")
+    if summary.get('pruned'):
+        print(format_pruned(summary['pruned']))
+    if summary['errors']:
+        print(f"{len(summary['errors'])} entries could not be read (permission denied or removed during scan).")
+    return summary
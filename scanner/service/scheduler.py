@@ -0,0 +1,152 @@
+import collections
+import random
+import threading
+from typing import Any, Callable, Iterable, List, Optional
+
+# Work-stealing scheduler for tree walks. Every worker owns a deque of tasks, a task is a batch of
+# up to `batch_size` sibling items (directories), so a tree of tiny directories is not one task
+# per directory. A worker takes its own newest task (LIFO, depth first, which keeps the number of
+# pending tasks around depth x fan-out / batch_size); an idle worker steals the oldest task of
+# another worker (FIFO, the shallowest, usually the biggest remaining subtree).
+# Workers keep their results in their own state object, nothing is merged while the walk runs,
+# and the calling thread only sleeps until the walk is done (or wakes for on_tick).
+# deque.append/pop/popleft are atomic in CPython, the deques themselves need no lock.
+
+DEFAULT_BATCH = 16
+IDLE_WAIT = 0.005 # seconds an idle worker sleeps before it tries to steal again
+
+
+class WorkStealingScheduler:
+    def __init__(self, threads: int, handler: Callable[[Any, Any], Iterable[Any]], batch_size: int = DEFAULT_BATCH,
+                 on_error: Optional[Callable[[Any, Any, Exception], None]] = None, name: str = "filelens-walk"):
+        # handler(state, item) processes one item with the worker's state and returns its children.
+        # on_error(state, item, exception) gets exceptions the handler did not handle itself.
+        self.threads = max(1, threads)
+        self.handler = handler
+        self.batch_size = max(1, batch_size)
+        self.on_error = on_error
+        self.name = name
+        self._deques: List[collections.deque] = [collections.deque() for _ in range(self.threads)]
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._pending = 0 # tasks pushed and not finished yet, the walk is done at 0
+        self._idle = 0
+        self._done = threading.Event()
+        self._cancelled = False
+        self._error: Optional[BaseException] = None # the first exception that escaped a handler, raised by run()
+        self.stats = {'tasks': 0, 'items': 0, 'steals': 0, 'max_pending': 0}
+
+    def _push(self, worker: int, items: List[Any]):
+        batch = self.batch_size
+        chunks = [items[i:i + batch] for i in range(0, len(items), batch)]
+        with self._lock:
+            self._pending += len(chunks)
+            if self._pending > self.stats['max_pending']:
+                self.stats['max_pending'] = self._pending
+            own = self._deques[worker]
+            for chunk in reversed(chunks): # the first chunk ends up on top, children come out in listing order
+                own.append(chunk)
+            if self._idle:
+                self._wakeup.notify(len(chunks))
+
+    def _take(self, worker: int) -> Optional[List[Any]]:
+        try:
+            return self._deques[worker].pop() # own newest task
+        except IndexError:
+            pass
+        n = self.threads
+        start = random.randrange(n)
+        for k in range(n):
+            victim = (start + k) % n
+            if victim == worker:
+                continue
+            try:
+                task = self._deques[victim].popleft() # the victim's oldest task
+            except IndexError:
+                continue
+            with self._lock:
+                self.stats['steals'] += 1
+            return task
+        return None
+
+    def _work(self, worker: int, state: Any):
+        handler = self.handler
+        while not self._done.is_set():
+            task = self._take(worker)
+            if task is None:
+                with self._lock:
+                    if self._pending == 0 or self._done.is_set():
+                        break
+                    self._idle += 1
+                    self._wakeup.wait(IDLE_WAIT)
+                    self._idle -= 1
+                continue
+
+            children: List[Any] = []
+            try:
+                for item in task:
+                    if self._cancelled:
+                        break
+                    try:
+                        found = handler(state, item)
+                        if found:
+                            children.extend(found)
+                    except Exception as e:
+                        if self.on_error is None:
+                            raise
+                        self.on_error(state, item, e)
+                if children and not self._cancelled:
+                    self._push(worker, children)
+            except BaseException as e: # no on_error, or on_error raised: the walk stops, run() raises it
+                with self._lock:
+                    if self._error is None:
+                        self._error = e
+                self.cancel()
+            finally: # the task is finished either way, or run() would wait for it forever
+                with self._lock:
+                    self.stats['tasks'] += 1
+                    self.stats['items'] += len(task)
+                    self._pending -= 1
+                    if self._pending == 0:
+                        self._done.set()
+                        self._wakeup.notify_all()
+
+    def cancel(self):
+        # workers finish the item they are on and stop, run() returns what was collected so far
+        self._cancelled = True
+        self._done.set()
+        with self._lock:
+            self._wakeup.notify_all()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def run(self, roots: List[Any], make_state: Callable[[], Any], tick_interval: Optional[float] = None,
+            on_tick: Optional[Callable[[List[Any], int], None]] = None) -> List[Any]:
+        # walks from roots and returns every worker's state. on_tick(states, pending tasks) is called
+        # from this thread every tick_interval seconds while the walk runs. an exception a handler
+        # did not hand to on_error stops the walk and is raised here
+        states = [make_state() for _ in range(self.threads)]
+        if not roots:
+            return states
+        self._push(0, list(roots))
+        workers = [threading.Thread(target=self._work, args=(i, states[i]), name=f"{self.name}-{i}", daemon=True)
+                   for i in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        try:
+            if on_tick is not None and tick_interval:
+                while not self._done.wait(tick_interval):
+                    on_tick(states, self._pending)
+            else:
+                self._done.wait()
+        except BaseException: # ctrl+c in the calling thread stops the workers too
+            self.cancel()
+            raise
+        finally:
+            for thread in workers:
+                thread.join()
+        if self._error is not None:
+            raise self._error
+        return states
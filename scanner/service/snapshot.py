@@ -0,0 +1,318 @@
+import gzip
+import heapq
+import json
+import os
+import struct
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Tuple
+
+from scanner.service.scan import file_type_of, new_summary
+from scanner.utils.dirtree import DirTree
+from scanner.utils.filetable import FileTable, UNKNOWN_TIME
+
+# Scan snapshots: one file per scan, written from a summary_data with all_files_details, small
+# enough to keep one per day. Two snapshots are compared with a merge join over their sorted
+# records, read block by block, so a diff holds one block of each file and the top-N heaps in memory.
+#
+# layout (little endian), the whole file gzip compressed unless written with compress=False:
+#   MAGIC, version u16, meta length u32, meta JSON (root, created, totals, by_type)
+#   blocks: byte length u32, record count u32, records; a block with count 0 ends the file
+#   record: shared prefix u32, suffix length u32, kind u8, size i64, mtime f64, files i64, suffix
+#   (version 1 stored both lengths as u16, it is still read)
+# Records are sorted by (path as bytes, kind). Paths are front coded against the previous record
+# of the same block, the first record of a block stores its full path. Directory records hold the
+# size and file count of their whole subtree; own sizes are total minus the children's totals.
+# Access times are not stored, a read snapshot has UNKNOWN_TIME atimes.
+
+MAGIC = b"FLSNAP"
+VERSION = 2
+FILE = 0
+DIR = 1
+KINDS = {FILE: "files", DIR: "dirs"}
+BLOCK_RECORDS = 4096
+_HEADER = struct.Struct("<HI")
+_BLOCK = struct.Struct("<II")
+_RECORDS = {1: struct.Struct("<HHBqdq"), 2: struct.Struct("<IIBqdq")} # by version
+_RECORD = _RECORDS[VERSION]
+
+Record = Tuple[bytes, int, int, float, int] # (path, kind, size, mtime, files)
+
+
+def _dir_tree_from_files(files: FileTable, root: str) -> DirTree:
+    # own totals per directory of the file table, plus the directories between them and the root
+    own: Dict[str, List[int]] = {}
+    pool = files.dir_pool
+    for dir_id, size in zip(files.dir_ids, files.sizes):
+        totals = own.setdefault(pool[dir_id], [0, 0])
+        totals[0] += 1
+        totals[1] += size
+    for dir in list(own):
+        while dir != root and dir.startswith(root):
+            dir = os.path.dirname(dir)
+            if dir in own:
+                break
+            own[dir] = [0, 0]
+    tree = DirTree()
+    for dir, (count, size) in own.items():
+        tree.add(dir, count, size, size)
+    return tree.rollup()
+
+
+def _records(summary: Dict[str, Any], root: str) -> List[Record]:
+    files = summary.get('all_files_details')
+    if files is None:
+        raise ValueError("A snapshot needs the per-file records of a scan (collect_files=True).")
+    if not isinstance(files, FileTable):
+        files = FileTable.from_records(files)
+    fsencode = os.fsencode
+    sep = fsencode(os.sep)
+    dirs = [dir if dir.endswith(sep) else dir + sep for dir in map(fsencode, files.dir_pool)] # encoded once per directory
+    records: List[Record] = [(dirs[dir_id] + fsencode(name), FILE, size, mtime, 1)
+                             for dir_id, name, size, mtime in zip(files.dir_ids, files.names, files.sizes, files.mtimes)]
+    tree = summary.get('dir_tree')
+    if tree is None:
+        tree = _dir_tree_from_files(files, root)
+    elif not tree.rolled_up:
+        tree.rollup()
+    records.extend((os.fsencode(tree.paths[i]), DIR, tree.total_size[i], 0.0, tree.total_files[i])
+                   for i in range(len(tree)))
+    records.sort(key=lambda record: (record[0], record[1]))
+    return records
+
+
+def write_snapshot(summary: Dict[str, Any], path, root, compress: bool = True) -> Path:
+    # writes summary_data (with all_files_details) as a snapshot, returns the path
+    path = Path(path)
+    root = os.path.abspath(str(root))
+    records = _records(summary, root)
+    meta = {
+        'root': root,
+        'created': time.time(),
+        'total_files': summary['total_files'],
+        'total_size': summary['total_size'],
+        'total_allocated': summary.get('total_allocated', summary['total_size']),
+        'by_type': summary['by_type'],
+        'records': len(records),
+    }
+    meta_bytes = json.dumps(meta, separators=(',', ':')).encode()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    raw = open(tmp, "wb")
+    out = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6, mtime=0) if compress else raw
+    try:
+        out.write(MAGIC + _HEADER.pack(VERSION, len(meta_bytes)) + meta_bytes)
+        pack = _RECORD.pack
+        for start in range(0, len(records), BLOCK_RECORDS):
+            block = bytearray()
+            previous = b""
+            for name, kind, size, mtime, count in records[start:start + BLOCK_RECORDS]:
+                # longest common prefix by bisection, slice compares run in C
+                shared = 0
+                high = min(len(previous), len(name))
+                while shared < high:
+                    middle = (shared + high + 1) // 2
+                    if previous[:middle] == name[:middle]:
+                        shared = middle
+                    else:
+                        high = middle - 1
+                suffix = name[shared:]
+                block += pack(shared, len(suffix), kind, size, mtime, count)
+                block += suffix
+                previous = name
+            out.write(_BLOCK.pack(len(block), min(BLOCK_RECORDS, len(records) - start)))
+            out.write(block)
+        out.write(_BLOCK.pack(0, 0))
+    finally:
+        if out is not raw:
+            out.close()
+        raw.close()
+    os.replace(tmp, path) # a crash mid-write leaves the old snapshot in place
+    return path
+
+
+class SnapshotReader:
+    # streams the records of one snapshot, a block at a time
+    def __init__(self, path):
+        self.path = Path(path)
+        raw = open(self.path, "rb")
+        compressed = raw.read(2) == b"\x1f\x8b"
+        raw.seek(0)
+        self._file = gzip.GzipFile(fileobj=raw, mode="rb") if compressed else raw
+        self._raw = raw
+        self.compressed = compressed
+        head = self._read(len(MAGIC) + _HEADER.size)
+        if head[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a FileLens snapshot.")
+        version, meta_length = _HEADER.unpack_from(head, len(MAGIC))
+        if version not in _RECORDS:
+            self.close()
+            raise ValueError(f"{self.path} is a version {version} snapshot, this FileLens reads up to version {VERSION}.")
+        self.version = version
+        self.meta: Dict[str, Any] = json.loads(self._read(meta_length))
+
+    def _read(self, size: int) -> bytes:
+        data = self._file.read(size)
+        if len(data) != size:
+            raise ValueError(f"{self.path} is truncated.")
+        return data
+
+    def close(self):
+        if self._file is not self._raw:
+            self._file.close()
+        self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self) -> Iterator[Record]:
+        unpack = _RECORDS[self.version].unpack_from
+        record_size = _RECORDS[self.version].size
+        while True:
+            length, count = _BLOCK.unpack(self._read(_BLOCK.size))
+            if not count:
+                return
+            block = self._read(length)
+            offset = 0
+            name = b""
+            for _ in range(count):
+                shared, suffix_length, kind, size, mtime, files = unpack(block, offset)
+                offset += record_size
+                name = name[:shared] + block[offset:offset + suffix_length]
+                offset += suffix_length
+                yield name, kind, size, mtime, files
+
+
+def read_summary(path) -> Dict[str, Any]:
+    # a snapshot back as summary_data, with all_files_details and dir_tree, e.g. for the Reporter
+    summary = new_summary()
+    files = FileTable()
+    tree = DirTree()
+    with SnapshotReader(path) as reader:
+        for name, kind, size, mtime, count in reader:
+            name = os.fsdecode(name)
+            if kind == FILE:
+                files.append_path(name, size, mtime, UNKNOWN_TIME, file_type_of(os.path.basename(name)), UNKNOWN_TIME)
+            else:
+                tree.add(name, 0, 0, 0)
+                tree.total_files.append(count)
+                tree.total_size.append(size)
+        meta = reader.meta
+    for key in ('total_files', 'total_size', 'total_allocated', 'by_type'):
+        summary[key] = meta[key]
+    summary['all_files_details'] = files
+    summary['snapshot'] = {'root': meta['root'], 'created': meta['created']}
+    # directories hold their subtree totals, the tree is linked and own = total - the children's totals
+    tree.link()
+    own_files = array('q', tree.total_files)
+    own_size = array('q', tree.total_size)
+    for i, parent in enumerate(tree.parents):
+        if parent >= 0:
+            own_files[parent] -= tree.total_files[i]
+            own_size[parent] -= tree.total_size[i]
+    tree.own_files = own_files
+    tree.own_size = own_size
+    tree.own_allocated = array('q', own_size) # allocated sizes are not stored
+    tree.total_allocated = array('q', tree.total_size)
+    summary['dir_tree'] = tree
+    return summary
+
+
+def _change() -> Dict[str, int]:
+    return {'count': 0, 'bytes': 0}
+
+
+def diff_snapshots(old_path, new_path, top: int = 20) -> Dict[str, Any]:
+    # merge join of two snapshots. added/removed count their size, grown/shrunk the size change;
+    # a file whose size stayed but whose mtime moved is 'modified'. largest keeps the top changes
+    categories = ("added", "removed", "grown", "shrunk", "modified")
+    result: Dict[str, Any] = {kind: {category: _change() for category in categories} for kind in KINDS.values()}
+    largest: Dict[str, Dict[str, List[tuple]]] = {kind: {category: [] for category in categories[:4]}
+                                                  for kind in KINDS.values()}
+
+    def note(kind: int, category: str, amount: int, name: bytes, old_size: int, new_size: int):
+        stats = result[KINDS[kind]][category]
+        stats['count'] += 1
+        stats['bytes'] += amount
+        if category == "modified" or top <= 0:
+            return
+        heap = largest[KINDS[kind]][category]
+        entry = (amount, name, old_size, new_size)
+        if len(heap) < top:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    with SnapshotReader(old_path) as old, SnapshotReader(new_path) as new:
+        old_records = iter(old)
+        new_records = iter(new)
+        a = next(old_records, None)
+        b = next(new_records, None)
+        while a is not None or b is not None:
+            if b is None or (a is not None and (a[0], a[1]) < (b[0], b[1])):
+                note(a[1], "removed", a[2], a[0], a[2], 0)
+                a = next(old_records, None)
+            elif a is None or (b[0], b[1]) < (a[0], a[1]):
+                note(b[1], "added", b[2], b[0], 0, b[2])
+                b = next(new_records, None)
+            else:
+                if b[2] > a[2]:
+                    note(a[1], "grown", b[2] - a[2], a[0], a[2], b[2])
+                elif b[2] < a[2]:
+                    note(a[1], "shrunk", a[2] - b[2], a[0], a[2], b[2])
+                elif a[1] == FILE and a[3] != b[3]:
+                    note(a[1], "modified", 0, a[0], a[2], b[2])
+                a = next(old_records, None)
+                b = next(new_records, None)
+        old_meta, new_meta = old.meta, new.meta
+
+    by_type = {}
+    for type_name in set(old_meta['by_type']) | set(new_meta['by_type']):
+        before = old_meta['by_type'].get(type_name, {'count': 0, 'size': 0})
+        after = new_meta['by_type'].get(type_name, {'count': 0, 'size': 0})
+        delta = {'count': after['count'] - before['count'], 'size': after['size'] - before['size']}
+        if delta['count'] or delta['size']:
+            by_type[type_name] = delta
+    result['by_type'] = dict(sorted(by_type.items(), key=lambda item: abs(item[1]['size']), reverse=True))
+    result['total'] = {'files': new_meta['total_files'] - old_meta['total_files'],
+                       'size': new_meta['total_size'] - old_meta['total_size']}
+    result['old'] = {key: old_meta[key] for key in ('root', 'created', 'total_files', 'total_size')}
+    result['new'] = {key: new_meta[key] for key in ('root', 'created', 'total_files', 'total_size')}
+    result['largest'] = {kind: {category: [{'path': os.fsdecode(name), 'change': amount, 'old': old_size, 'new': new_size}
+                                           for amount, name, old_size, new_size in sorted(heap, reverse=True)]
+                                for category, heap in categories_heaps.items()}
+                         for kind, categories_heaps in largest.items()}
+    return result
+
+
+def format_diff(diff: Dict[str, Any], top: int = 10) -> str:
+    def when(meta):
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(meta['created']))
+
+    lines = [f"Snapshot diff: {diff['old']['root']} ({when(diff['old'])}) -> {diff['new']['root']} ({when(diff['new'])})",
+             f"Total: {diff['total']['files']:+d} files, {diff['total']['size']:+d} bytes"]
+    for kind in KINDS.values():
+        parts = ", ".join(f"{category} {stats['count']} ({stats['bytes']} bytes)" if category != "modified"
+                          else f"{category} {stats['count']}" for category, stats in diff[kind].items()
+                          if stats['count'] and not (kind == "dirs" and category == "modified"))
+        lines.append(f"{kind.capitalize()}: {parts or 'no changes'}")
+    for kind in KINDS.values():
+        for category, rows in diff['largest'][kind].items():
+            if not rows:
+                continue
+            lines.append(f"Largest {category} {kind}:")
+            for row in rows[:top]:
+                if category in ("grown", "shrunk"):
+                    lines.append(f" {row['change']:>14} bytes  {row['path']} ({row['old']} -> {row['new']})")
+                else:
+                    lines.append(f" {row['change']:>14} bytes  {row['path']}")
+    if diff['by_type']:
+        lines.append("By type:")
+        for type_name, delta in list(diff['by_type'].items())[:top]:
+            lines.append(f" {type_name:<20} {delta['count']:+9d} files {delta['size']:+16d} bytes")
+    return "\n".join(lines)
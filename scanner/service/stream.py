@@ -0,0 +1,162 @@
+import os
+import queue
+import threading
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from scanner.service.prune import PruneRules
+from scanner.service.scan import BLOCK_SIZE, HAS_BLOCKS, file_type_of, _error_entry, _list_entries
+from scanner.service.scheduler import WorkStealingScheduler
+
+# Streaming traversal: iter_scan() yields records while the tree is still being walked, so one pass
+# can feed several consumers (aggregation, age filters, duplicate buckets) without first collecting
+# every file. Workers put batches of records into a bounded queue and block when the consumer falls
+# behind, so memory stays around queue_size * BATCH records whatever the tree size.
+# Leaving the loop early (break, an exception, generator.close()) cancels the walk: workers stop
+# after the entry they are on and the generator returns once they have exited.
+#   for record in iter_scan("/data", threads=8):
+#       if record.size > 1 << 30: ...
+# The directory listing itself is scan._list_entries, the same as a scan's. `dupes` walks with it.
+
+BATCH = 512 # records per queue item, one queue operation per batch and not per file
+DEFAULT_QUEUE_SIZE = 64
+PUT_TIMEOUT = 0.05 # seconds a blocked worker waits before it checks for cancellation again
+
+
+class FileRecord(NamedTuple):
+    path: str
+    size: int # apparent size, st_size
+    allocated: int # st_blocks * 512, st_size where there are no blocks
+    mtime: float
+    atime: float
+    ctime: float
+    type: str # file_type_of(name), the extension or "no_extension"
+    dev: int
+    ino: int
+    nlink: int # above 1 the same (dev, ino) may come again under another name
+
+
+class DirRecord(NamedTuple):
+    # yielded after the directory's files, with include_dirs=True
+    path: str
+    files: int
+    size: int # direct files only, not the subtree
+    subdirs: int
+    errors: Tuple[Dict[str, str], ...] # _error_entry dicts, the directory itself or entries that failed
+
+
+_DONE = object()
+
+
+class _Stream:
+    def __init__(self, root: str, threads: int, include_dirs: bool, queue_size: int, prune: PruneRules):
+        self.root = root
+        self.prune = prune if prune.active else None
+        self.pruned: Dict[str, int] = {}
+        self.include_dirs = include_dirs
+        self.queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, queue_size))
+        self.cancelled = threading.Event()
+        st = os.stat(root)
+        self.visited = {(st.st_dev, st.st_ino)}
+        self.visited_lock = threading.Lock()
+        self.scheduler = WorkStealingScheduler(threads, self._list, on_error=self._failed, name="filelens-stream")
+        self.failure: Optional[BaseException] = None
+        self.thread = threading.Thread(target=self._walk, name="filelens-stream", daemon=True)
+
+    def _put(self, item) -> bool:
+        # blocks while the queue is full, gives up when the consumer went away
+        while not self.cancelled.is_set():
+            try:
+                self.queue.put(item, timeout=PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _list(self, state, dir: str) -> List[str]:
+        batch: List[Union[FileRecord, DirRecord]] = []
+        subdirs: List[Tuple[str, int, int]] = []
+        errors: List[Dict[str, str]] = []
+        files = 0
+        size = 0
+        try:
+            entries = os.scandir(dir)
+        except OSError as e:
+            errors.append(_error_entry(dir, e))
+        else:
+            for item, st in _list_entries(entries, subdirs, errors):
+                if self.cancelled.is_set():
+                    return []
+                batch.append(FileRecord(item.path, st.st_size, st.st_blocks * BLOCK_SIZE if HAS_BLOCKS else st.st_size,
+                                        st.st_mtime, st.st_atime, st.st_ctime, file_type_of(item.name),
+                                        st.st_dev, st.st_ino, st.st_nlink))
+                files += 1
+                size += st.st_size
+                if len(batch) >= BATCH:
+                    if not self._put(batch):
+                        return []
+                    batch = []
+        if self.include_dirs:
+            batch.append(DirRecord(dir, files, size, len(subdirs), tuple(errors)))
+        if batch and not self._put(batch):
+            return []
+        if not subdirs:
+            return []
+        fresh = []
+        with self.visited_lock:
+            if self.prune is not None: # the counts are shared, so under the lock too
+                subdirs = self.prune.filter(subdirs, self.pruned)
+            for path, dev, ino in subdirs:
+                if (dev, ino) not in self.visited:
+                    self.visited.add((dev, ino))
+                    fresh.append(path)
+        return fresh
+
+    def _failed(self, state, dir: str, e: Exception):
+        if self.include_dirs:
+            self._put([DirRecord(dir, 0, 0, 0, (_error_entry(dir, e),))])
+
+    def _walk(self):
+        try:
+            self.scheduler.run([self.root], lambda: None)
+        except BaseException as e: # handed to the consumer, raised from the generator
+            self.failure = e
+        finally:
+            self._put(_DONE)
+
+    def cancel(self):
+        self.cancelled.set()
+        self.scheduler.cancel()
+        while self.thread.is_alive(): # drain, so no worker stays blocked on a full queue
+            try:
+                self.queue.get(timeout=PUT_TIMEOUT)
+            except queue.Empty:
+                pass
+        self.thread.join()
+
+
+def iter_scan(root, threads: int = 1, include_dirs: bool = False, queue_size: int = DEFAULT_QUEUE_SIZE,
+              prune: Optional[PruneRules] = None) -> Iterator[Union[FileRecord, DirRecord]]:
+    # yields a FileRecord per regular file, and a DirRecord per directory with include_dirs.
+    # order follows the walk, files of one directory come together. symlinks are not followed and
+    # a directory reached twice (bind mounts) is listed once. hardlinked files come under every name,
+    # consumers that add up sizes keep the (dev, ino) of records with nlink > 1.
+    # prune: as ScanOptions.prune, pseudo and network filesystems are skipped by default
+    root = os.path.abspath(root)
+    if not os.path.isdir(root):
+        raise NotADirectoryError(f"Directory '{root}' is not valid.")
+    stream = _Stream(root, max(1, threads), include_dirs, queue_size, (prune or PruneRules()).bind(root))
+    stream.thread.start()
+    finished = False
+    try:
+        while True:
+            batch = stream.queue.get()
+            if batch is _DONE:
+                finished = True
+                break
+            yield from batch
+    finally:
+        if not finished:
+            stream.cancel()
+        stream.thread.join()
+    if stream.failure is not None:
+        raise stream.failure
@@ -0,0 +1,267 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Any, Callable, List, Optional
+
+from scanner.utils.sketches import LogHistogram, TopK
+
+# Scan telemetry. Workers time their own directories into a ScanMetrics that travels with the
+# directory's partial summary (summary['metrics']) and is merged like every other partial, so
+# nothing is shared between threads. The coordinating thread owns a ScanTelemetry: phase timings,
+# a timeline of rates, queue depth and worker utilization, sampled at most once per interval.
+# At the end it is exported as JSON or Prometheus text.
+
+MAX_TIMELINE = 600 # points kept, older ones are thinned out when the scan runs longer
+SLOWEST_DIRS = 20
+ERROR_SAMPLES = 5
+
+
+class ScanMetrics:
+    # per-partial, mergeable. latencies in ns, power-of-two buckets
+    def __init__(self):
+        self.dirs = 0
+        self.busy_ns = 0 # time workers spent inside directory tasks
+        self.scandir_ns = LogHistogram() # per directory: opening and iterating the listing, without stat calls
+        self.stat_ns = LogHistogram() # per file: one stat call
+        self.slowest = TopK(SLOWEST_DIRS) # (elapsed ns, directory)
+
+    def add_dir(self, dir: str, elapsed_ns: int, stat_total_ns: int):
+        self.dirs += 1
+        self.busy_ns += elapsed_ns
+        self.scandir_ns.add(max(0, elapsed_ns - stat_total_ns))
+        self.slowest.add(elapsed_ns, dir)
+
+    def merge(self, other: "ScanMetrics") -> "ScanMetrics":
+        self.dirs += other.dirs
+        self.busy_ns += other.busy_ns
+        self.scandir_ns.merge(other.scandir_ns)
+        self.stat_ns.merge(other.stat_ns)
+        self.slowest.merge(other.slowest)
+        return self
+
+
+def merge_metrics(into: Optional[ScanMetrics], part: Optional[ScanMetrics]) -> Optional[ScanMetrics]:
+    if part is None:
+        return into
+    if into is None:
+        return part
+    return into.merge(part)
+
+
+def _histogram_dict(histogram: LogHistogram) -> List[Dict[str, Any]]:
+    return [{'le_us': high / 1000, 'count': count} for low, high, count, _ in histogram.rows()]
+
+
+def _quantile_us(histogram: LogHistogram, q: float) -> float:
+    # upper bound of the bucket holding the q-quantile, good to a factor of two
+    total = sum(histogram.counts)
+    if not total:
+        return 0.0
+    seen = 0
+    for low, high, count, _ in histogram.rows():
+        seen += count
+        if seen >= q * total:
+            return high / 1000
+    return 0.0
+
+
+class ScanTelemetry:
+    def __init__(self, threads: int = 1, interval: float = 1.0, snapshot_path: Optional[Path] = None,
+                 snapshot_format: Optional[str] = None, on_snapshot: Optional[Callable[[Dict[str, Any]], None]] = None):
+        # with snapshot_path the current state is written there every interval (and at the end),
+        # e.g. for a Prometheus textfile collector. on_snapshot gets every timeline point.
+        self.threads = max(1, threads)
+        self.interval = interval
+        self.snapshot_path = Path(snapshot_path) if snapshot_path is not None else None
+        self.snapshot_format = snapshot_format or export_format_for(self.snapshot_path)
+        self.on_snapshot = on_snapshot
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.phases: Dict[str, float] = {}
+        self.timeline: List[Dict[str, Any]] = []
+        self.max_queue = 0
+        self._next_tick = self.started + interval
+        self._last = (self.started, 0, 0, 0) # time, dirs, files, busy_ns at the last timeline point
+        self._summary: Optional[Dict[str, Any]] = None
+
+    def phase(self, name: str) -> "_Phase":
+        return _Phase(self, name)
+
+    def tick(self, summary: Dict[str, Any], queue_depth: int):
+        # called by the coordinator after every merge, only does work once per interval
+        if queue_depth > self.max_queue:
+            self.max_queue = queue_depth
+        now = time.perf_counter()
+        if now < self._next_tick:
+            return
+        self._next_tick = now + self.interval
+        self._summary = summary
+        self._point(summary, queue_depth, now)
+        if self.snapshot_path is not None:
+            self.write(self.snapshot_path, self.snapshot_format)
+
+    def queue_peak(self, depth: int):
+        # the exact peak, from a walk that tracks it (the thread engine's scheduler). ticks only sample the depth
+        if depth > self.max_queue:
+            self.max_queue = depth
+
+    def _point(self, summary: Dict[str, Any], queue_depth: int, now: float):
+        metrics = summary.get('metrics') or ScanMetrics()
+        last_time, last_dirs, last_files, last_busy = self._last
+        elapsed = max(now - last_time, 1e-9)
+        point = {
+            't': round(now - self.started, 3),
+            'dirs': metrics.dirs,
+            'files': summary['total_files'],
+            'dirs_per_s': round((metrics.dirs - last_dirs) / elapsed, 1),
+            'files_per_s': round((summary['total_files'] - last_files) / elapsed, 1),
+            'queue_depth': queue_depth,
+            'busy_ratio': round(min(1.0, (metrics.busy_ns - last_busy) / 1e9 / (elapsed * self.threads)), 3),
+        }
+        self._last = (now, metrics.dirs, summary['total_files'], metrics.busy_ns)
+        self.timeline.append(point)
+        if len(self.timeline) > MAX_TIMELINE: # thin out instead of growing, and sample half as often from now on
+            self.timeline = self.timeline[::2]
+            self.interval *= 2
+        if self.on_snapshot is not None:
+            self.on_snapshot(point)
+
+    def finish(self, summary: Dict[str, Any]) -> Dict[str, Any]:
+        self.finished = time.perf_counter()
+        self._summary = summary
+        self._point(summary, 0, self.finished)
+        report = self.report()
+        if self.snapshot_path is not None:
+            self.write(self.snapshot_path, self.snapshot_format)
+        return report
+
+    def report(self, summary: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        summary = summary or self._summary or {}
+        metrics: ScanMetrics = summary.get('metrics') or ScanMetrics()
+        wall = (self.finished or time.perf_counter()) - self.started
+        errors: Dict[str, Dict[str, Any]] = {}
+        for error in summary.get('errors', []):
+            kind = error['error'].split(":", 1)[0]
+            entry = errors.setdefault(kind, {'count': 0, 'samples': []})
+            entry['count'] += 1
+            if len(entry['samples']) < ERROR_SAMPLES:
+                entry['samples'].append(error['path'])
+        return {
+            'wall_seconds': round(wall, 3),
+            'threads': self.threads,
+            'phases': {name: round(seconds, 3) for name, seconds in self.phases.items()},
+            'dirs': metrics.dirs,
+            'files': summary.get('total_files', 0),
+            'bytes': summary.get('total_size', 0),
+            'dirs_per_s': round(metrics.dirs / wall, 1) if wall else 0.0,
+            'files_per_s': round(summary.get('total_files', 0) / wall, 1) if wall else 0.0,
+            'worker_utilization': round(min(1.0, metrics.busy_ns / 1e9 / (wall * self.threads)), 3) if wall else 0.0,
+            'max_queue_depth': self.max_queue,
+            'scandir_latency': {'p50_us': _quantile_us(metrics.scandir_ns, 0.5),
+                                'p99_us': _quantile_us(metrics.scandir_ns, 0.99),
+                                'buckets': _histogram_dict(metrics.scandir_ns)},
+            'stat_latency': {'p50_us': _quantile_us(metrics.stat_ns, 0.5),
+                             'p99_us': _quantile_us(metrics.stat_ns, 0.99),
+                             'buckets': _histogram_dict(metrics.stat_ns)},
+            'slowest_dirs': [{'path': path, 'seconds': round(ns / 1e9, 4)} for ns, path in metrics.slowest.items()],
+            'errors': errors,
+            'timeline': self.timeline,
+        }
+
+    def write(self, path: Path, format: Optional[str] = None):
+        # replaced atomically, a collector never reads half a file
+        format = format or export_format_for(path)
+        text = to_prometheus(self.report(), self._summary) if format == "prom" else json.dumps(self.report(), indent=2)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, path)
+
+
+class _Phase:
+    def __init__(self, telemetry: ScanTelemetry, name: str):
+        self.telemetry = telemetry
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        phases = self.telemetry.phases
+        phases[self.name] = phases.get(self.name, 0.0) + time.perf_counter() - self.started
+
+
+def export_format_for(path: Optional[Path]) -> str:
+    return "prom" if path is not None and Path(path).suffix in (".prom", ".txt") else "json"
+
+
+def _label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _prom_histogram(lines: List[str], name: str, help: str, histogram: LogHistogram):
+    lines.append(f"# HELP {name} {help}")
+    lines.append(f"# TYPE {name} histogram")
+    cumulative = 0
+    for low, high, count, _ in histogram.rows():
+        cumulative += count
+        lines.append(f'{name}_bucket{{le="{high / 1e9:.9g}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{le="+Inf"}} {cumulative}')
+    lines.append(f"{name}_sum {sum(histogram.bytes) / 1e9:.9g}")
+    lines.append(f"{name}_count {cumulative}")
+
+
+def to_prometheus(report: Dict[str, Any], summary: Optional[Dict[str, Any]] = None) -> str:
+    # Prometheus text exposition format
+    lines: List[str] = []
+
+    def metric(name: str, kind: str, help: str, samples):
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{_label(val)}"' for key, val in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    metric("filelens_scan_duration_seconds", "gauge", "Wall time of the scan.", [({}, report['wall_seconds'])])
+    metric("filelens_scan_threads", "gauge", "Worker threads per process.", [({}, report['threads'])])
+    metric("filelens_scan_phase_seconds", "gauge", "Wall time per scan phase.",
+           [({'phase': name}, seconds) for name, seconds in report['phases'].items()])
+    metric("filelens_scan_directories_total", "counter", "Directories listed.", [({}, report['dirs'])])
+    metric("filelens_scan_files_total", "counter", "Files scanned.", [({}, report['files'])])
+    metric("filelens_scan_bytes_total", "counter", "Bytes in scanned files.", [({}, report['bytes'])])
+    metric("filelens_scan_files_per_second", "gauge", "Average file throughput.", [({}, report['files_per_s'])])
+    metric("filelens_scan_worker_utilization", "gauge", "Share of worker time spent in directory tasks.",
+           [({}, report['worker_utilization'])])
+    metric("filelens_scan_queue_depth_max", "gauge", "Most directory tasks in flight at once.",
+           [({}, report['max_queue_depth'])])
+    metric("filelens_scan_errors_total", "counter", "Entries that could not be read, by error type.",
+           [({'type': kind}, entry['count']) for kind, entry in report['errors'].items()])
+    # ranked, not labelled by path: a path label makes a new series for every directory that is ever slow
+    metric("filelens_scan_slow_directory_seconds", "gauge", "Slowest directories of the scan by rank, "
+           "their paths are in the JSON report.",
+           [({'rank': rank}, entry['seconds']) for rank, entry in enumerate(report['slowest_dirs'][:10], 1)])
+    metrics = (summary or {}).get('metrics')
+    if metrics is not None:
+        _prom_histogram(lines, "filelens_scandir_latency_seconds", "Listing time per directory without stat calls.",
+                        metrics.scandir_ns)
+        _prom_histogram(lines, "filelens_stat_latency_seconds", "Time per file stat call.", metrics.stat_ns)
+    return "\n".join(lines) + "\n"
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [f"Telemetry: {report['dirs']} dirs, {report['files']} files in {report['wall_seconds']} s "
+             f"({report['dirs_per_s']} dirs/s, {report['files_per_s']} files/s)",
+             f"  worker utilization {report['worker_utilization']:.0%} over {report['threads']} threads, "
+             f"max {report['max_queue_depth']} directory tasks in flight",
+             f"  scandir p50 {report['scandir_latency']['p50_us']} us, p99 {report['scandir_latency']['p99_us']} us; "
+             f"stat p50 {report['stat_latency']['p50_us']} us, p99 {report['stat_latency']['p99_us']} us"]
+    if report['phases']:
+        lines.append("  phases: " + ", ".join(f"{name} {seconds} s" for name, seconds in report['phases'].items()))
+    for entry in report['slowest_dirs'][:5]:
+        lines.append(f"  slow: {entry['seconds']:>8} s  {entry['path']}")
+    for kind, entry in report['errors'].items():
+        lines.append(f"  {kind}: {entry['count']} (e.g. {', '.join(entry['samples'][:2])})")
+    return "\n".join(lines)
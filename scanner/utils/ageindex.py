@@ -0,0 +1,117 @@
+import bisect
+import time
+from array import array
+from typing import Callable, Dict, Any, Iterable, List, Optional, Sequence, Union
+
+from scanner.utils.filetable import FileTable, _numpy
+
+# Age queries over one scan result without touching the filesystem. For every time field the row
+# indices are sorted once by timestamp, "older than N days" is then a binary search for the cutoff
+# and a slice of the sorted order: O(log n + k) per query instead of a pass over all files.
+
+DAY = 86400.0
+FIELDS = ("mtime", "atime", "ctime")
+
+
+class CleanupPolicy:
+    # which files a cleanup selects, every condition that is set must match
+    def __init__(self, older_than_days: Optional[float] = None, field: str = "mtime", min_size: Optional[int] = None,
+                 types: Optional[Iterable[str]] = None, path_prefixes: Optional[Iterable[str]] = None):
+        if field not in FIELDS:
+            raise ValueError(f"Unknown time field '{field}', expected one of {', '.join(FIELDS)}")
+        self.older_than_days = older_than_days
+        self.field = field
+        self.min_size = min_size # bytes, files of at least this size
+        self.types = [t.lower() for t in types] if types is not None else None # ".log", "no_extension", ...
+        self.path_prefixes = list(path_prefixes) if path_prefixes is not None else None
+
+
+class AgeIndex:
+    # build once per scan, query as often as needed. with `now` every query measures ages from that
+    # time (e.g. the scan start), otherwise from the time of the query. `version` is the table's
+    # version the index was built at, it is stale once the table changed (see FileTable.version)
+    def __init__(self, files: Union[FileTable, Iterable[Dict[str, Any]]], fields: Sequence[str] = ("mtime",),
+                 now: Optional[float] = None, on_invalid: Optional[Callable[[Dict[str, Any]], None]] = None):
+        # on_invalid: called with every record FileTable.from_records skips (no path, no numeric mtime)
+        self.table = files if isinstance(files, FileTable) else FileTable.from_records(files, on_invalid)
+        self.now = now
+        self.version = self.table.version
+        self._sorted: Dict[str, tuple] = {}
+        for field in fields:
+            self._build(field)
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def _column(self, field: str):
+        if field not in FIELDS:
+            raise ValueError(f"Unknown time field '{field}', expected one of {', '.join(FIELDS)}")
+        return getattr(self.table, field + "s")
+
+    def _build(self, field: str):
+        # (row indices ordered by timestamp, the timestamps in that order)
+        # rows with an unknown timestamp (NaN) are not in the order, no age query selects them
+        column = self._column(field)
+        np = _numpy()
+        if np is not None:
+            values = np.frombuffer(column, dtype=np.float64)
+            order = np.argsort(values, kind='stable')
+            order = order[~np.isnan(values[order])]
+            self._sorted[field] = (order, values[order])
+        else:
+            known = [i for i in range(len(column)) if column[i] == column[i]] # NaN != NaN
+            order = array('q', sorted(known, key=column.__getitem__))
+            self._sorted[field] = (order, array('d', (column[i] for i in order)))
+        return self._sorted[field]
+
+    def _index(self, field: str):
+        # fields that were not asked for up front are built on their first query
+        return self._sorted.get(field) or self._build(field)
+
+    def older_than(self, days: float, field: str = "mtime", now: Optional[float] = None) -> Sequence[int]:
+        # row indices with field < now - days, oldest first
+        if now is None:
+            now = time.time() if self.now is None else self.now
+        return self.before(now - days * DAY, field)
+
+    def before(self, cutoff: float, field: str = "mtime") -> Sequence[int]:
+        order, values = self._index(field)
+        np = _numpy()
+        if np is not None and not isinstance(values, array):
+            k = int(np.searchsorted(values, cutoff, side='left'))
+        else:
+            k = bisect.bisect_left(values, cutoff)
+        return order[:k]
+
+    def count_older_than(self, days: float, field: str = "mtime", now: Optional[float] = None) -> int:
+        return len(self.older_than(days, field, now))
+
+    def select(self, policy: CleanupPolicy, now: Optional[float] = None) -> Sequence[int]:
+        # the age condition narrows the rows first (binary search), the other filters only look at those
+        table = self.table
+        if policy.older_than_days is not None:
+            rows: Sequence[int] = self.older_than(policy.older_than_days, policy.field, now)
+        else:
+            rows = range(len(table))
+
+        checks = []
+        if policy.min_size is not None:
+            sizes, min_size = table.sizes, policy.min_size
+            checks.append(lambda i: sizes[i] >= min_size)
+        if policy.types is not None:
+            wanted_types = set(table.type_ids_for(policy.types))
+            type_ids = table.type_ids
+            checks.append(lambda i: type_ids[i] in wanted_types)
+        if policy.path_prefixes is not None:
+            wanted_dirs = set(table.dir_ids_under(policy.path_prefixes))
+            dir_ids = table.dir_ids
+            checks.append(lambda i: dir_ids[i] in wanted_dirs)
+        if not checks:
+            return rows
+        return array('q', (int(i) for i in rows if all(check(i) for check in checks)))
+
+    def paths(self, rows: Iterable[int]) -> List[str]:
+        return self.table.paths(rows)
+
+    def total_size(self, rows: Iterable[int]) -> int:
+        return self.table.total_size(rows)
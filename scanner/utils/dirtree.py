@@ -0,0 +1,197 @@
+import heapq
+import os
+from array import array
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+from scanner.utils.filetable import _numpy
+
+# du style rollup of a scan: one row per listed directory, in parallel arrays indexed by directory id.
+# The scan appends each directory's own files (own_*), rollup() links every row to its parent by
+# path and adds the subtree totals (total_*) bottom up in one pass, deepest level first.
+# heaviest() answers "which directories are biggest" at any depth without walking the tree again.
+# A file with several names counts once, in the directory where the scan counted it for the totals;
+# merge_summary discount()s the rows that listed another name of it.
+
+SORT_KEYS = ("size", "files", "allocated")
+
+
+class DirTree:
+    def __init__(self):
+        self.paths: List[str] = []
+        self.own_files = array('q')
+        self.own_size = array('q')
+        self.own_allocated = array('q')
+        # filled by rollup()
+        self.parents = array('q') # -1 for the root (and rows whose parent was not listed)
+        self.depths = array('I') # 0 for the root
+        self.total_files = array('q')
+        self.total_size = array('q')
+        self.total_allocated = array('q')
+        self._ids: Optional[Dict[str, int]] = None
+        self._children: Optional[List[List[int]]] = None
+        self._discounts: List[Tuple[str, int, int, int]] = [] # (path, files, size, allocated), see discount()
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def add(self, path: str, files: int, size: int, allocated: int):
+        self.paths.append(path)
+        self.own_files.append(files)
+        self.own_size.append(size)
+        self.own_allocated.append(allocated)
+        self._ids = None
+
+    def extend(self, other: "DirTree"):
+        # merges another tree (a worker's or shard's rows), rollup() runs once after the last merge
+        self.paths.extend(other.paths)
+        self.own_files.extend(other.own_files)
+        self.own_size.extend(other.own_size)
+        self.own_allocated.extend(other.own_allocated)
+        self._discounts.extend(other._discounts)
+        self._ids = None
+
+    def discount(self, path: str, files: int, size: int, allocated: int):
+        # takes files out of a row's own counts, applied when the tree is linked: the row may only
+        # come in with a later extend()
+        self._discounts.append((path, files, size, allocated))
+        self._ids = None
+
+    @property
+    def rolled_up(self) -> bool:
+        return self._ids is not None and len(self.total_size) == len(self.paths)
+
+    def link(self) -> List[int]:
+        # parents and depths only, returns the row ids ordered parents first
+        n = len(self.paths)
+        paths = self.paths
+        ids = self._ids = {path: i for i, path in enumerate(paths)}
+        self._children = None
+        for path, files, size, allocated in self._discounts:
+            i = ids.get(path)
+            if i is not None:
+                self.own_files[i] -= files
+                self.own_size[i] -= size
+                self.own_allocated[i] -= allocated
+        self._discounts = []
+        parents = array('q', [-1]) * n
+        sep = os.sep
+        get = ids.get
+        for i, path in enumerate(paths):
+            parent = get(path[:path.rfind(sep)] or sep, -1) # os.path.dirname without its per call overhead
+            if parent != i: # the parent of "/" is "/"
+                parents[i] = parent
+        self.parents = parents
+
+        # parents come before children in this order, a path is longer than its parent's
+        order = sorted(range(n), key=list(map(len, paths)).__getitem__)
+        depths = array('I', [0]) * n
+        for i in order:
+            parent = parents[i]
+            if parent >= 0:
+                depths[i] = depths[parent] + 1
+        self.depths = depths
+        return order
+
+    def rollup(self) -> "DirTree":
+        order = self.link()
+        parents = self.parents
+        depths = self.depths
+        n = len(self.paths)
+        np = _numpy()
+        if np is not None and n:
+            parent_ids = np.frombuffer(parents, dtype=np.int64)
+            depth_ids = np.frombuffer(depths, dtype=np.uint32)
+            by_depth = np.argsort(depth_ids, kind='stable')
+            bounds = np.searchsorted(depth_ids[by_depth], np.arange(int(depth_ids.max()) + 2))
+            for own, name in ((self.own_files, 'total_files'), (self.own_size, 'total_size'),
+                              (self.own_allocated, 'total_allocated')):
+                totals = np.frombuffer(own, dtype=np.int64).copy()
+                for depth in range(len(bounds) - 2, 0, -1): # one vectorised step per level, deepest first
+                    level = by_depth[bounds[depth]:bounds[depth + 1]]
+                    level = level[parent_ids[level] >= 0]
+                    np.add.at(totals, parent_ids[level], totals[level])
+                setattr(self, name, array('q', totals.tobytes()))
+            return self
+
+        total_files = array('q', self.own_files)
+        total_size = array('q', self.own_size)
+        total_allocated = array('q', self.own_allocated)
+        for i in reversed(order):
+            parent = parents[i]
+            if parent >= 0:
+                total_files[parent] += total_files[i]
+                total_size[parent] += total_size[i]
+                total_allocated[parent] += total_allocated[i]
+        self.total_files = total_files
+        self.total_size = total_size
+        self.total_allocated = total_allocated
+        return self
+
+    def _check(self):
+        if not self.rolled_up:
+            self.rollup()
+
+    # queries
+
+    def find(self, path: str) -> Optional[int]:
+        self._check()
+        return self._ids.get(os.path.abspath(path).rstrip(os.sep) or os.sep)
+
+    def children(self, i: int) -> List[int]:
+        self._check()
+        if self._children is None:
+            children: List[List[int]] = [[] for _ in range(len(self.paths))]
+            for child, parent in enumerate(self.parents):
+                if parent >= 0:
+                    children[parent].append(child)
+            self._children = children
+        return self._children[i]
+
+    def roots(self) -> List[int]:
+        self._check()
+        return [i for i, parent in enumerate(self.parents) if parent < 0]
+
+    def heaviest(self, n: int = 20, by: str = "size", depth: Optional[int] = None, max_depth: Optional[int] = None,
+                 own: bool = False) -> Sequence[int]:
+        # ids of the n directories with the largest subtree (own=True: largest own files), heaviest first.
+        # depth picks one level (1 = the root's subdirectories), max_depth everything down to a level
+        if by not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key '{by}', expected one of {', '.join(SORT_KEYS)}")
+        self._check()
+        values = getattr(self, ("own_" if own else "total_") + by)
+        count = len(values)
+        if not count or n <= 0:
+            return []
+        np = _numpy()
+        if np is not None:
+            column = np.frombuffer(values, dtype=np.int64)
+            candidates = None
+            if depth is not None or max_depth is not None:
+                depths = np.frombuffer(self.depths, dtype=np.uint32)
+                mask = depths == depth if depth is not None else depths <= max_depth
+                candidates = np.flatnonzero(mask)
+                column = column[candidates]
+            if n < len(column):
+                top = np.argpartition(column, len(column) - n)[len(column) - n:]
+            else:
+                top = np.arange(len(column))
+            top = top[np.argsort(column[top], kind='stable')[::-1]]
+            return (candidates[top] if candidates is not None else top).tolist()
+        ids = range(count)
+        if depth is not None:
+            ids = [i for i in ids if self.depths[i] == depth]
+        elif max_depth is not None:
+            ids = [i for i in ids if self.depths[i] <= max_depth]
+        return heapq.nlargest(n, ids, key=values.__getitem__)
+
+    def row(self, i: int) -> Dict[str, Any]:
+        self._check()
+        return {
+            'path': self.paths[i],
+            'depth': self.depths[i],
+            'files': self.total_files[i],
+            'size': self.total_size[i],
+            'allocated': self.total_allocated[i],
+            'own_files': self.own_files[i],
+            'own_size': self.own_size[i],
+        }
@@ -0,0 +1,337 @@
+import os
+import sys
+from array import array
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# numpy only makes the filters faster, everything works without it. it is imported on the
+# first query, not with this module, it costs ~100 ms of startup otherwise
+np = None
+_numpy_checked = False
+
+
+def _numpy():
+    global np, _numpy_checked
+    if not _numpy_checked:
+        _numpy_checked = True
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+    return np
+
+
+UNKNOWN_TIME = float("nan") # a timestamp the source did not have, never older or newer than a cutoff
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+_FS_ENCODING = sys.getfilesystemencoding()
+_FS_ERRORS = sys.getfilesystemencodeerrors() # names that are not valid in the encoding survive the round trip
+
+
+class _NamePool:
+    # File names of a FileTable in one shared buffer: row i is data[starts[i]:starts[i] + lengths[i]],
+    # encoded like os.fsencode. 12 bytes of offsets plus the name's bytes instead of a str object
+    # (~50 bytes + the name) and its list slot. Reads like a list of str: pool[i], len(), iteration.
+    # A replaced name that does not fit its old slot goes to the end, the buffer is compacted once
+    # more than half of it is unused.
+
+    def __init__(self):
+        self.data = bytearray()
+        self.starts = array('Q')
+        self.lengths = array('I')
+        self._unused = 0
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, i: int) -> str:
+        start = self.starts[i]
+        return self.data[start:start + self.lengths[i]].decode(_FS_ENCODING, _FS_ERRORS)
+
+    def __iter__(self) -> Iterator[str]:
+        data = self.data
+        for start, length in zip(self.starts, self.lengths):
+            yield data[start:start + length].decode(_FS_ENCODING, _FS_ERRORS)
+
+    def append(self, name: str):
+        encoded = name.encode(_FS_ENCODING, _FS_ERRORS)
+        self.starts.append(len(self.data))
+        self.lengths.append(len(encoded))
+        self.data += encoded
+
+    def __setitem__(self, i: int, name: str):
+        encoded = name.encode(_FS_ENCODING, _FS_ERRORS)
+        n, old = len(encoded), self.lengths[i]
+        if n <= old:
+            start = self.starts[i]
+            self.data[start:start + n] = encoded
+        else:
+            self.starts[i] = len(self.data)
+            self.data += encoded
+        self.lengths[i] = n
+        self._unused += old if n > old else old - n
+        if self._unused > 4096 and self._unused * 2 > len(self.data):
+            self._compact()
+
+    def extend(self, other: "_NamePool"):
+        base = len(self.data)
+        self.data += other.data
+        self.starts.extend(start + base for start in other.starts)
+        self.lengths.extend(other.lengths)
+        self._unused += other._unused
+
+    def _compact(self):
+        data, starts = bytearray(), array('Q')
+        old = self.data
+        for start, length in zip(self.starts, self.lengths):
+            starts.append(len(data))
+            data += old[start:start + length]
+        self.data, self.starts, self._unused = data, starts, 0
+
+
+class FileTable:
+    # Columnar store of scanned files, used instead of one dict per file.
+    # Paths are split into an interned directory pool and the file name, names share one byte buffer
+    # (_NamePool), the numeric fields live in typed arrays (8 bytes per value), file types are ids
+    # into a small type pool.
+    # Iterating a table yields the same {'path', 'size', 'mtime', 'atime', 'ctime', 'type'} dicts the
+    # list-of-dicts code expects, so it can be passed anywhere `all_files_details` was.
+    # Files with more than one name keep their (st_dev, st_ino) in the sparse `links` map, row -> key.
+    # `version` goes up with every change, indexes built over a table (AgeIndex) compare it to see they are stale.
+
+    def __init__(self):
+        self._dirs: List[str] = []
+        self._dir_ids: Dict[str, int] = {}
+        self._types: List[str] = []
+        self._type_ids: Dict[str, int] = {}
+
+        self.dir_ids = array('I')
+        self.names = _NamePool()
+        self.sizes = array('q')
+        self.mtimes = array('d')
+        self.atimes = array('d')
+        self.ctimes = array('d')
+        self.type_ids = array('I')
+        self.allocated = array('q') # bytes on disk, the size where the source did not have it
+        self.links: Dict[int, Tuple[int, int]] = {}
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _dir_id(self, dir: str) -> int:
+        dir_id = self._dir_ids.get(dir)
+        if dir_id is None:
+            dir_id = len(self._dirs)
+            self._dirs.append(dir)
+            self._dir_ids[dir] = dir_id
+        return dir_id
+
+    def _type_id(self, type_name: str) -> int:
+        type_id = self._type_ids.get(type_name)
+        if type_id is None:
+            type_id = len(self._types)
+            self._types.append(type_name)
+            self._type_ids[type_name] = type_id
+        return type_id
+
+    def dir_id(self, dir: str) -> int:
+        # id of dir in the directory pool, added when it is new
+        return self._dir_id(dir)
+
+    def append(self, dir: str, name: str, size: int, mtime: float, atime: float, type_name: str, ctime: float = 0.0,
+               allocated: Optional[int] = None, link: Optional[Tuple[int, int]] = None):
+        if link is not None:
+            self.links[len(self.names)] = link
+        self.version += 1
+        self.dir_ids.append(self._dir_id(dir))
+        self.names.append(name)
+        self.sizes.append(size)
+        self.mtimes.append(mtime)
+        self.atimes.append(atime)
+        self.ctimes.append(ctime)
+        self.type_ids.append(self._type_id(type_name))
+        self.allocated.append(size if allocated is None else allocated)
+
+    def replace(self, i: int, dir: str, name: str, size: int, mtime: float, atime: float, type_name: str,
+                ctime: float = 0.0, allocated: Optional[int] = None, link: Optional[Tuple[int, int]] = None):
+        # overwrites row i, the monitor reuses the rows of deleted files
+        self.version += 1
+        self.dir_ids[i] = self._dir_id(dir)
+        self.names[i] = name
+        self.sizes[i] = size
+        self.mtimes[i] = mtime
+        self.atimes[i] = atime
+        self.ctimes[i] = ctime
+        self.type_ids[i] = self._type_id(type_name)
+        self.allocated[i] = size if allocated is None else allocated
+        if link is not None:
+            self.links[i] = link
+        else:
+            self.links.pop(i, None)
+
+    def forget(self, i: int):
+        # row i no longer holds a file (the monitor keeps it for reuse): no size, unknown times,
+        # so age and size queries leave it out until replace() fills it again
+        self.version += 1
+        self.sizes[i] = 0
+        self.allocated[i] = 0
+        self.mtimes[i] = self.atimes[i] = self.ctimes[i] = UNKNOWN_TIME
+        self.links.pop(i, None)
+
+    def append_path(self, path: str, size: int, mtime: float, atime: float, type_name: str, ctime: float = 0.0,
+                    allocated: Optional[int] = None):
+        dir, name = os.path.split(path)
+        self.append(dir, name, size, mtime, atime, type_name, ctime, allocated)
+
+    def extend(self, other: "FileTable"):
+        # merges another table (e.g. a worker's partial), only the small pools are remapped
+        dir_map = [self._dir_id(dir) for dir in other._dirs]
+        type_map = [self._type_id(type_name) for type_name in other._types]
+        offset = len(self.names)
+        self.version += 1
+        self.links.update((offset + i, key) for i, key in other.links.items())
+        self.dir_ids.extend(dir_map[i] for i in other.dir_ids)
+        self.names.extend(other.names)
+        self.sizes.extend(other.sizes)
+        self.mtimes.extend(other.mtimes)
+        self.atimes.extend(other.atimes)
+        self.ctimes.extend(other.ctimes)
+        self.type_ids.extend(type_map[i] for i in other.type_ids)
+        self.allocated.extend(other.allocated)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]],
+                     on_invalid: Optional[Callable[[Dict[str, Any]], None]] = None) -> "FileTable":
+        # converts the old list-of-dicts shape. records without a path, or whose mtime or size is
+        # missing or not a number, are skipped and handed to on_invalid. a missing atime or ctime
+        # is stored as UNKNOWN_TIME, age queries leave those rows out
+        table = cls()
+        for record in records:
+            path = record.get('path')
+            mtime = record.get('mtime')
+            size = record.get('size', 0)
+            if not path or not _is_number(mtime) or not _is_number(size):
+                if on_invalid is not None:
+                    on_invalid(record)
+                continue
+            path = str(path)
+            atime = record.get('atime')
+            ctime = record.get('ctime')
+            allocated = record.get('allocated')
+            type_name = record.get('type') or os.path.splitext(path)[1].lower() or "no_extension"
+            table.append_path(path, int(size), float(mtime), float(atime) if _is_number(atime) else UNKNOWN_TIME,
+                              type_name, float(ctime) if _is_number(ctime) else UNKNOWN_TIME,
+                              int(allocated) if _is_number(allocated) else None)
+        return table
+
+    # row access
+
+    @property
+    def dir_pool(self) -> List[str]:
+        # directory of each dir id, self.dir_ids[i] indexes into it
+        return self._dirs
+
+    def path(self, i: int) -> str:
+        return os.path.join(self._dirs[self.dir_ids[i]], self.names[i])
+
+    def type_name(self, i: int) -> str:
+        return self._types[self.type_ids[i]]
+
+    def row(self, i: int) -> Dict[str, Any]:
+        return {
+            'path': self.path(i),
+            'size': self.sizes[i],
+            'mtime': self.mtimes[i],
+            'atime': self.atimes[i],
+            'ctime': self.ctimes[i],
+            'type': self._types[self.type_ids[i]],
+        }
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self.names)):
+            yield self.row(i)
+
+    def type_ids_for(self, types: Iterable[str]) -> List[int]:
+        # pool ids of the given type names, unknown names are left out
+        return [self._type_ids[t] for t in types if t in self._type_ids]
+
+    def dir_ids_under(self, prefixes: Iterable[str]) -> List[int]:
+        # ids of the pooled directories equal to or below one of prefixes, checked once per directory
+        prefixes = [p.rstrip(os.sep) or os.sep for p in prefixes]
+        result = []
+        for dir_id, dir in enumerate(self._dirs):
+            for prefix in prefixes:
+                if dir == prefix or dir.startswith(prefix if prefix.endswith(os.sep) else prefix + os.sep):
+                    result.append(dir_id)
+                    break
+        return result
+
+    def paths(self, indices: Optional[Iterable[int]] = None) -> List[str]:
+        if indices is None:
+            indices = range(len(self.names))
+        return [self.path(i) for i in indices]
+
+    def total_size(self, indices: Optional[Iterable[int]] = None) -> int:
+        if indices is None:
+            return sum(self.sizes)
+        sizes = self.sizes
+        return sum(sizes[i] for i in indices)
+
+    # vectorized queries, all return a sequence of row indices
+
+    def where(self, mtime_before: Optional[float] = None, atime_before: Optional[float] = None,
+              size_over: Optional[int] = None, types: Optional[Iterable[str]] = None) -> Sequence[int]:
+        # rows matching every given condition ("mtime < cutoff", "size > N", type in types)
+        type_ids = None
+        if types is not None:
+            type_ids = self.type_ids_for(types)
+
+        np = _numpy()
+        if np is not None:
+            # zero-copy views over the arrays, dropped before returning so the arrays stay growable
+            mask = np.ones(len(self.names), dtype=bool)
+            if mtime_before is not None:
+                mask &= np.frombuffer(self.mtimes, dtype=np.float64) < mtime_before
+            if atime_before is not None:
+                mask &= np.frombuffer(self.atimes, dtype=np.float64) < atime_before
+            if size_over is not None:
+                mask &= np.frombuffer(self.sizes, dtype=np.int64) > size_over
+            if type_ids is not None:
+                mask &= np.isin(np.frombuffer(self.type_ids, dtype=np.uint32), type_ids)
+            return np.flatnonzero(mask)
+
+        checks = []
+        if mtime_before is not None:
+            checks.append((self.mtimes, lambda v: v < mtime_before))
+        if atime_before is not None:
+            checks.append((self.atimes, lambda v: v < atime_before))
+        if size_over is not None:
+            checks.append((self.sizes, lambda v: v > size_over))
+        if type_ids is not None:
+            wanted = set(type_ids)
+            checks.append((self.type_ids, wanted.__contains__))
+        return array('q', (i for i in range(len(self.names))
+                           if all(test(column[i]) for column, test in checks)))
+
+    def where_mtime_before(self, cutoff: float) -> Sequence[int]:
+        return self.where(mtime_before=cutoff)
+
+    def where_size_over(self, size: int) -> Sequence[int]:
+        return self.where(size_over=size)
+
+    def order_by_size(self, descending: bool = True, limit: Optional[int] = None) -> Sequence[int]:
+        # row indices sorted by size, largest first by default
+        n = len(self.names)
+        np = _numpy()
+        if np is not None:
+            order = np.argsort(np.frombuffer(self.sizes, dtype=np.int64), kind='stable')
+            if descending:
+                order = order[::-1]
+            return order[:limit] if limit is not None else order
+        order = sorted(range(n), key=self.sizes.__getitem__, reverse=descending)
+        return order[:limit] if limit is not None else order
@@ -1,16 +1,29 @@
 import threading
-from typing import List
+from typing import List, Sequence, Tuple
 
 class Locking:
+    # Banker's algorithm. need = max_claim - allocated is kept up to date on every grant/release
+    # instead of being rebuilt, and a request is granted without a full safety pass when one of
+    # two cheap sufficient conditions holds:
+    #   - headroom: after the grant every resource still has as much available as the largest claim
+    #     any process can make, so every process can run to completion in any order
+    #   - the state was safe and pid could finish right away after the grant (need <= available)
+    # only the remaining requests run the safety algorithm, on the live matrices (no copies).
     def __init__(self, total_resources: List[int], max_claim: List[List[int]]):
 
         self._lock = threading.RLock()
+        self.total = total_resources[:]
         self.available = total_resources[:]                  # r 
         self.max_claim = [row[:] for row in max_claim]      # p x r
         self.num_processe = len(max_claim)
         self.num_resources = len(total_resources)
         # initially zero allocated
         self.allocated = [[0]*self.num_resources for _ in range(self.num_processe)]
+        self.need = [row[:] for row in self.max_claim]       # p x r, max_claim - allocated
+        # the biggest need any process can ever have per resource, fixed by the claims
+        self._claim_ceiling = [max((row[i] for row in self.max_claim), default=0) for i in range(self.num_resources)]
+        self._safe = self._is_safe(self.available[:], self.allocated) # known safe state, see _grant
+        self.stats = {'granted': 0, 'fast_path': 0, 'safety_checks': 0, 'denied': 0}
 
         self.var_states = {}
 
@@ -21,58 +34,93 @@ class Locking:
         #return True if granted.
         
         with self._lock:
-            if any(r > self.max_claim[pid][i] - self.allocated[pid][i]
-                   for i, r in enumerate(req)):
-                return False
+            return self._grant(pid, req)
 
-            if any(r > self.available[i] for i, r in enumerate(req)):
+    def request_many(self, requests: Sequence[Tuple[int, List[int]]]) -> List[bool]:
+        # several (pid, req) requests under one lock acquisition, decided in order as if
+        # request() had been called for each of them
+        with self._lock:
+            return [self._grant(pid, req) for pid, req in requests]
+
+    def _grant(self, pid: int, req: List[int]) -> bool:
+        need = self.need[pid]
+        available = self.available
+        r = range(self.num_resources)
+        for i in r:
+            if req[i] > need[i] or req[i] > available[i]:
+                self.stats['denied'] += 1
                 return False
 
-            new_available = [a - r for a, r in zip(self.available, req)]
-            new_allocated = [row[:] for row in self.allocated]
-            for i in range(self.num_resources):
-                new_allocated[pid][i] += req[i]
-
-            if not self._is_safe(new_available, new_allocated):
+        fast = all(available[i] - req[i] >= self._claim_ceiling[i] for i in r) or \
+            (self._safe and all(need[i] <= available[i] for i in r))
+
+        allocated = self.allocated[pid]
+        for i in r: # applied in place, undone below if the new state is unsafe
+            available[i] -= req[i]
+            allocated[i] += req[i]
+            need[i] -= req[i]
+
+        if fast:
+            self.stats['fast_path'] += 1
+        else:
+            self.stats['safety_checks'] += 1
+            if not self._is_safe(available[:], self.allocated):
+                for i in r:
+                    available[i] += req[i]
+                    allocated[i] -= req[i]
+                    need[i] += req[i]
+                self.stats['denied'] += 1
                 return False
-
-            self.available = new_available
-            self.allocated = new_allocated
-            return True
+        self._safe = True
+        self.stats['granted'] += 1
+        return True
 
     def release(self, pid: int, rel: List[int]) -> None:
         #Release resources from process pid.
+        #a release never turns a safe state unsafe, nothing to check
         with self._lock:
+            allocated = self.allocated[pid]
+            need = self.need[pid]
             for i, r in enumerate(rel):
-                to_release = min(r, self.allocated[pid][i])
+                to_release = min(r, allocated[i])
                 self.available[i] += to_release
-                self.allocated[pid][i] -= to_release
+                allocated[i] -= to_release
+                need[i] += to_release
+
+    def release_all(self, pid: int) -> None:
+        with self._lock:
+            self.release(pid, self.allocated[pid])
 
     def _is_safe(self, work: List[int], allocated: List[List[int]]) -> bool:
         #Banker's safety algorithm.
-
-        # compute need = max_claim – alloc
-        need = [
-            [self.max_claim[p][i] - allocated[p][i]
-             for i in range(self.num_resources)]
-            for p in range(self.num_processe)
-        ]
-        finish = [False]*self.num_processe
-
-        while True:
-            progressed = False
-            for p in range(self.num_processe):
-                if not finish[p] and all(need[p][i] <= work[i]
-                                         for i in range(self.num_resources)):
+        #work is consumed, allocated is only read. need is taken from self.need, which
+        #must match allocated (it always does for self.allocated)
+        if allocated is not self.allocated:
+            need = [[self.max_claim[p][i] - allocated[p][i] for i in range(self.num_resources)]
+                    for p in range(self.num_processe)]
+        else:
+            need = self.need
+        r = range(self.num_resources)
+
+        # every pass finishes the processes whose need fits in work, the ones left are retried
+        # while a pass makes progress. usually the first pass finishes almost everyone
+        pending = [p for p in range(self.num_processe) if any(allocated[p]) or any(need[p])]
+        while pending:
+            left = []
+            for p in pending:
+                need_p = need[p]
+                if all(need_p[i] <= work[i] for i in r):
                     # pretend this process completes
-                    for i in range(self.num_resources):
-                        work[i] += allocated[p][i]
-                    finish[p] = True
-                    progressed = True
-            if not progressed:
-                break
-
-        return all(finish)
+                    alloc_p = allocated[p]
+                    for i in r:
+                        work[i] += alloc_p[i]
+                else:
+                    left.append(p)
+            if len(left) == len(pending):
+                return False
+            pending = left
+
+        return True
     
 
     # state machine 
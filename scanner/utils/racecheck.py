@@ -0,0 +1,155 @@
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, FrozenSet, List, Optional, Tuple
+
+from scanner.utils.locking import Locking
+
+# Sampling data race check for the threaded scan (scan --race-check).
+# Instrumented code reads the module global CHECKER and does nothing when it is None, so a normal
+# scan pays one global lookup per directory or batch. When a check runs, accesses to shared scan
+# state are appended to per-thread buffers (no lock on the hot path). Each thread keeps the first and
+# then one in `sample_every` of its accesses to each variable, so a rarely touched variable is not
+# sampled away by a busy one. report() orders the events and replays them through the Locking variable state machine
+# (Virgin -> Exclusive -> Shared -> Shared-Modified) and an Eraser style lockset: a write that the
+# state machine flags as a race is only reported when no lock was held on every shared access to it.
+
+CHECKER: Optional["RaceChecker"] = None
+
+READ = "read"
+WRITE = "write"
+MAX_EVENTS_PER_THREAD = 200000
+
+
+class RaceChecker:
+    def __init__(self, sample_every: int = 4, max_events: int = MAX_EVENTS_PER_THREAD):
+        self.sample_every = max(1, sample_every)
+        self.max_events = max_events
+        self._seq = itertools.count() # next() is atomic, gives one global order for the replay
+        self._local = threading.local()
+        self._buffers: List[Tuple[int, list, list, dict]] = [] # (thread id, events, [dropped], var -> seen)
+        self._register_lock = threading.Lock()
+
+    def _buffer(self):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = self._local.buffer = (threading.get_ident(), [], [0], {})
+            with self._register_lock: # once per thread
+                self._buffers.append(buffer)
+        return buffer
+
+    def _record(self, var: str, op: str, locks: Tuple[str, ...]):
+        tid, events, dropped, seen = self._buffer()
+        n = seen.get(var, 0)
+        seen[var] = n + 1
+        if n % self.sample_every:
+            return
+        if len(events) >= self.max_events:
+            dropped[0] += 1
+            return
+        events.append((next(self._seq), var, op, tid, locks))
+
+    def read(self, var: str, *locks: str):
+        # locks: names of the locks held during the access
+        self._record(var, READ, locks)
+
+    def write(self, var: str, *locks: str):
+        self._record(var, WRITE, locks)
+
+    def report(self) -> Dict[str, Any]:
+        with self._register_lock:
+            buffers = list(self._buffers)
+        events = sorted(event for _, thread_events, _, _ in buffers for event in thread_events)
+        pids: Dict[int, int] = {}
+        machine = Locking([], [])
+        variables: Dict[str, Dict[str, Any]] = {}
+        locksets: Dict[str, Optional[FrozenSet[str]]] = {}
+        last_thread: Dict[str, int] = {}
+
+        for seq, var, op, tid, locks in events:
+            pid = pids.setdefault(tid, len(pids))
+            info = variables.get(var)
+            if info is None:
+                machine.register_var(var)
+                info = variables[var] = {'accesses': 0, 'reads': 0, 'writes': 0, 'threads': set(),
+                                         'handoffs': 0, 'transitions': {}, 'races': 0, 'unprotected_races': 0,
+                                         'first_race': None}
+                locksets[var] = None
+            info['accesses'] += 1
+            info['reads' if op == READ else 'writes'] += 1
+            info['threads'].add(pid)
+            if last_thread.get(var, pid) != pid:
+                info['handoffs'] += 1 # consecutive sampled accesses from different threads
+            last_thread[var] = pid
+            held = frozenset(locks)
+            before = machine.var_states[var]['state']
+            raced = False
+            try:
+                if op == READ:
+                    machine.read(var, pid)
+                else:
+                    machine.write(var, pid)
+            except RuntimeError:
+                raced = True
+            after = machine.var_states[var]['state']
+            if after in ("Shared", "Shared-Modified"):
+                # locks only matter once a second thread touches the variable, initialisation is lock free
+                locksets[var] = held if locksets[var] is None else locksets[var] & held
+            if after != before:
+                key = f"{before} -> {after}"
+                info['transitions'][key] = info['transitions'].get(key, 0) + 1
+            if raced:
+                info['races'] += 1
+                if not locksets[var]:
+                    info['unprotected_races'] += 1
+                    if info['first_race'] is None:
+                        info['first_race'] = {'seq': seq, 'thread': pid, 'op': op, 'locks': sorted(held)}
+
+        for var, info in variables.items():
+            info['threads'] = len(info['threads'])
+            info['state'] = machine.var_states[var]['state']
+            info['lockset'] = sorted(locksets[var] or ())
+        return {
+            'sample_every': self.sample_every,
+            'events': len(events),
+            'dropped': sum(dropped[0] for _, _, dropped, _ in buffers),
+            'threads': len(pids),
+            'variables': variables,
+            'races': sum(info['unprotected_races'] for info in variables.values()),
+        }
+
+
+def enable(sample_every: int = 4) -> RaceChecker:
+    global CHECKER
+    CHECKER = RaceChecker(sample_every)
+    return CHECKER
+
+
+def disable():
+    global CHECKER
+    CHECKER = None
+
+
+@contextmanager
+def session(sample_every: int = 4):
+    checker = enable(sample_every)
+    try:
+        yield checker
+    finally:
+        disable()
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [f"Race check: {report['events']} sampled accesses (1 in {report['sample_every']} per variable) "
+             f"from {report['threads']} threads, {report['dropped']} dropped"]
+    for var, info in sorted(report['variables'].items()):
+        transitions = ", ".join(f"{key} x{count}" for key, count in info['transitions'].items()) or "none"
+        lockset = ", ".join(info['lockset']) or "none"
+        lines.append(f"  {var}: {info['accesses']} accesses ({info['reads']} r / {info['writes']} w), "
+                     f"{info['threads']} threads, {info['handoffs']} handoffs, state {info['state']}, "
+                     f"common locks: {lockset}")
+        lines.append(f"    transitions: {transitions}")
+        if info['races']:
+            lines.append(f"    racy writes: {info['races']}, without a common lock: {info['unprotected_races']}")
+    lines.append(f"{report['races']} unprotected data races found." if report['races'] else "No data races found.")
+    return "\n".join(lines)
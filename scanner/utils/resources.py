@@ -0,0 +1,242 @@
+import errno
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+from scanner.utils import racecheck
+from scanner.utils.locking import Locking
+
+# Resource budgets for scan workers, handed out through the Banker's allocator (utils/locking.py).
+# Every worker thread is one Banker's process, the resources are
+#   DIR_HANDLES  open directory handles (os.scandir keeps one open while a directory is listed)
+#   READS        file header reads in flight (content sniffing)
+#   lanes        I/O slots per device, one resource per device seen (up to MAX_DEVICE_LANES)
+# On top of that the number of workers allowed to list directories at the same time is adapted to
+# the measured per-entry listing latency (AIMD): +1 while latency stays near the best seen, halved
+# when it degrades or the process runs out of file descriptors. The scheduler's thread count is fixed,
+# what adapts is how many of its workers may be inside a listing at once; the others wait for a claim.
+
+DIR_HANDLES = 0
+READS = 1
+MAX_DEVICE_LANES = 8 # devices beyond this share lanes
+FD_RESERVE = 64 # descriptors kept free for the index, sniff cache, reports and stdio
+
+WINDOW = 32 # listings per AIMD decision
+INCREASE_BELOW = 1.5 # latency / best latency under which one more worker is allowed
+DECREASE_ABOVE = 3.0 # latency / best latency over which the worker limit is halved
+BEST_DRIFT = 1.05
+EMFILE_RETRIES = 5
+
+
+def open_fd_count() -> int:
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return 16 # no procfs, a typical interpreter start
+
+
+def fd_budget(wanted: int) -> int:
+    # directory handles this process can keep open next to what is already open. the soft
+    # RLIMIT_NOFILE is raised toward the hard limit when it is too low for `wanted` handles
+    try:
+        import resource # unix only
+    except ImportError:
+        return wanted
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    in_use = open_fd_count()
+    needed = in_use + FD_RESERVE + wanted
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(hard, needed)
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        except (ValueError, OSError):
+            pass
+    if soft == resource.RLIM_INFINITY:
+        return wanted
+    return max(1, min(wanted, soft - in_use - FD_RESERVE))
+
+
+class _Claim:
+    def __init__(self, governor: "ResourceGovernor", vector: List[int], listing: bool):
+        self.governor = governor
+        self.vector = vector
+        self.listing = listing
+        self.pid = -1
+        self.started = 0.0
+        self.entries = 0 # set by the caller, used to normalize the latency
+
+    def __enter__(self):
+        self.governor._acquire(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.governor._release(self)
+
+
+class _NoClaim:
+    # stands in for a claim when the scan is not governed
+    entries = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+NO_CLAIM = _NoClaim()
+
+
+class ResourceGovernor:
+    def __init__(self, max_workers: int, sniff_threads: int = 0, max_open_dirs: Optional[int] = None,
+                 read_slots: Optional[int] = None, device_slots: int = 16, min_workers: int = 1,
+                 start_workers: Optional[int] = None):
+        self.max_workers = max(1, max_workers)
+        self.min_workers = max(1, min(min_workers, self.max_workers))
+        self.limit = max(self.min_workers, min(self.max_workers, start_workers or 4)) # slow start
+        processes = self.max_workers + max(0, sniff_threads)
+
+        # header reads hold a descriptor too, both come out of the same fd budget
+        handles = max_open_dirs or self.max_workers
+        reads = read_slots or max(1, sniff_threads)
+        budget = fd_budget(handles + (reads if sniff_threads else 0))
+        if sniff_threads:
+            reads = max(1, min(reads, budget // 2))
+            budget -= reads
+        handles = max(1, min(handles, budget))
+        total = [handles, reads] + [max(1, device_slots)] * MAX_DEVICE_LANES
+        # every worker holds at most one of each at a time
+        self.locking = Locking(total, [[1] * len(total) for _ in range(processes)])
+
+        self._lock = threading.Lock()
+        # listings and reads wait separately, a release wakes one of each instead of every thread
+        self._listing_waiters = threading.Condition(self._lock)
+        self._read_waiters = threading.Condition(self._lock)
+        self._local = threading.local()
+        self._next_pid = 0
+        self._processes = processes
+        self._lanes: Dict[int, int] = {}
+        self._active = 0
+        self._best = None # best per-entry listing latency seen
+        self._window_time = 0.0
+        self._window_entries = 0
+        self._window_count = 0
+        self.stats = {'dir_claims': 0, 'read_claims': 0, 'waits': 0, 'emfile_retries': 0,
+                      'increases': 0, 'decreases': 0, 'peak_workers': self.limit, 'fd_budget': handles}
+
+    def _pid(self) -> int:
+        pid = getattr(self._local, 'pid', None)
+        if pid is None:
+            with self._lock:
+                # more threads than expected share pids, a shared pid just waits for its own claim
+                pid = self._local.pid = self._next_pid % self._processes
+                self._next_pid += 1
+        return pid
+
+    def _lane(self, dev: int) -> int:
+        race = racecheck.CHECKER
+        if race is not None:
+            race.read("governor.lanes") # the fast path looks up without the lock
+        lane = self._lanes.get(dev)
+        if lane is None:
+            with self._lock:
+                if race is not None:
+                    race.write("governor.lanes", "governor.lock")
+                lane = self._lanes.setdefault(dev, len(self._lanes) % MAX_DEVICE_LANES)
+        return 2 + lane
+
+    def _vector(self, resource: int, dev: int) -> List[int]:
+        vector = [0] * (2 + MAX_DEVICE_LANES)
+        vector[resource] = 1
+        vector[self._lane(dev)] = 1
+        return vector
+
+    def listing(self, dev: int) -> _Claim:
+        # a directory handle plus a lane on dev, for one os.scandir pass. dev is the directory's st_dev
+        # as its parent's listing saw it, so claiming costs no stat
+        return _Claim(self, self._vector(DIR_HANDLES, dev), listing=True)
+
+    def reading(self, dev: int) -> _Claim:
+        # one read slot plus a lane on dev, for reading file headers
+        return _Claim(self, self._vector(READS, dev), listing=False)
+
+    def _acquire(self, claim: _Claim):
+        claim.pid = self._pid()
+        waiters = self._listing_waiters if claim.listing else self._read_waiters
+        with self._lock:
+            self.stats['dir_claims' if claim.listing else 'read_claims'] += 1
+            race = racecheck.CHECKER
+            if race is not None:
+                race.read("governor.limit", "governor.lock")
+            waited = False
+            while not ((not claim.listing or self._active < self.limit) and self.locking.request(claim.pid, claim.vector)):
+                waited = True
+                waiters.wait(0.05) # the timeout covers a wakeup that went to a claim for another lane
+            self.stats['waits'] += waited
+            if claim.listing:
+                self._active += 1
+        claim.started = time.perf_counter()
+
+    def _release(self, claim: _Claim):
+        elapsed = time.perf_counter() - claim.started
+        with self._lock:
+            self.locking.release(claim.pid, claim.vector)
+            if claim.listing:
+                self._active -= 1
+                self._observe(elapsed, claim.entries)
+            self._listing_waiters.notify()
+            self._read_waiters.notify()
+
+    def _observe(self, elapsed: float, entries: int):
+        # AIMD on the listing latency per directory entry, decided once per WINDOW listings
+        self._window_time += elapsed
+        self._window_entries += max(1, entries)
+        self._window_count += 1
+        if self._window_count < WINDOW:
+            return
+        latency = self._window_time / self._window_entries
+        race = racecheck.CHECKER
+        if race is not None:
+            race.write("governor.limit", "governor.lock")
+        self._window_time = 0.0
+        self._window_entries = self._window_count = 0
+        # the best latency drifts up a little every window, one unusually fast window must not pin it
+        self._best = latency if self._best is None else min(latency, self._best * BEST_DRIFT)
+        if latency <= self._best * INCREASE_BELOW:
+            if self.limit < self.max_workers:
+                self.limit += 1
+                self.stats['increases'] += 1
+                self.stats['peak_workers'] = max(self.stats['peak_workers'], self.limit)
+        elif latency > self._best * DECREASE_ABOVE:
+            self._decrease()
+
+    def _decrease(self):
+        if self.limit > self.min_workers:
+            self.limit = max(self.min_workers, self.limit // 2)
+            self.stats['decreases'] += 1
+
+    def scandir(self, dir):
+        # os.scandir that backs off instead of failing when the process runs out of descriptors
+        for attempt in range(EMFILE_RETRIES):
+            try:
+                return os.scandir(dir)
+            except OSError as e:
+                if e.errno not in (errno.EMFILE, errno.ENFILE):
+                    raise
+                with self._lock:
+                    race = racecheck.CHECKER
+                    if race is not None:
+                        race.write("governor.limit", "governor.lock")
+                    self.stats['emfile_retries'] += 1
+                    self._decrease()
+                time.sleep(0.01 * 2 ** attempt)
+        return os.scandir(dir)
+
+    @property
+    def workers(self) -> int:
+        return self.limit
+
+    def summary(self) -> Dict[str, Any]:
+        return {**self.stats, 'final_workers': self.limit}
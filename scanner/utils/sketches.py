@@ -0,0 +1,211 @@
+import bisect
+import heapq
+import math
+from typing import Dict, Any, List, Optional, Tuple
+
+# Fixed-size, mergeable aggregates that are filled during the scan, so reports don't need
+# one record per file. Every class has add() for a single file and merge() for a partial
+# from another worker or process; merging is cheap and order independent. remove() takes a file
+# back out, for a hardlinked file that turned out to be counted under another name already.
+
+DAY = 86400.0
+# upper bounds of the age buckets in days, the last bucket is everything older
+AGE_EDGES_DAYS = [1, 7, 30, 90, 180, 365, 730, 1825]
+AGE_LABELS = ["< 1 day", "1-7 days", "7-30 days", "1-3 months", "3-6 months", "6-12 months",
+              "1-2 years", "2-5 years", "> 5 years"]
+
+
+class TopK:
+    # k largest (size, path) pairs, a min-heap so a file only costs a compare unless it gets in
+    def __init__(self, k: int = 100):
+        self.k = k
+        self.heap: List[Tuple[int, str]] = []
+
+    def add(self, size: int, path: str):
+        heap = self.heap
+        if len(heap) < self.k:
+            heapq.heappush(heap, (size, path))
+        elif size > heap[0][0]:
+            heapq.heapreplace(heap, (size, path))
+
+    def merge(self, other: "TopK"):
+        for size, path in other.heap:
+            self.add(size, path)
+
+    def remove(self, size: int, path: str):
+        # the heap may hold one entry less than k afterwards, the file that was pushed out is gone
+        try:
+            self.heap.remove((size, path))
+        except ValueError:
+            return
+        heapq.heapify(self.heap)
+
+    def items(self) -> List[Tuple[int, str]]:
+        # largest first
+        return sorted(self.heap, reverse=True)
+
+
+class LogHistogram:
+    # power-of-two buckets: bucket b holds sizes in [2**(b-1), 2**b), bucket 0 holds empty files
+    BUCKETS = 65
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.bytes = [0] * self.BUCKETS
+
+    def add(self, size: int):
+        b = size.bit_length()
+        self.counts[b] += 1
+        self.bytes[b] += size
+
+    def remove(self, size: int):
+        b = size.bit_length()
+        self.counts[b] -= 1
+        self.bytes[b] -= size
+
+    def merge(self, other: "LogHistogram"):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.bytes = [a + b for a, b in zip(self.bytes, other.bytes)]
+
+    def rows(self) -> List[Tuple[int, int, int, int]]:
+        # (low, high, count, bytes) of the non-empty buckets
+        result = []
+        for b, count in enumerate(self.counts):
+            if count:
+                low = 0 if b == 0 else 1 << (b - 1)
+                high = 0 if b == 0 else (1 << b) - 1
+                result.append((low, high, count, self.bytes[b]))
+        return result
+
+
+class QuantileSketch:
+    # DDSketch style: logarithmic buckets with relative accuracy `alpha`, so every quantile is
+    # within alpha of the true value. sizes from 1 B to 1 PB fit in under 2000 buckets.
+    def __init__(self, alpha: float = 0.01):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float):
+        self.count += 1
+        if value <= 0:
+            self.zero_count += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        buckets = self.buckets
+        buckets[key] = buckets.get(key, 0) + 1
+
+    def remove(self, value: float):
+        self.count -= 1
+        if value <= 0:
+            self.zero_count -= 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        buckets = self.buckets
+        buckets[key] -= 1
+        if not buckets[key]:
+            del buckets[key]
+
+    def merge(self, other: "QuantileSketch"):
+        self.count += other.count
+        self.zero_count += other.zero_count
+        buckets = self.buckets
+        for key, count in other.buckets.items():
+            buckets[key] = buckets.get(key, 0) + count
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1) # middle of the bucket
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class AgeHistogram:
+    # file count and bytes per age bucket, ages relative to the scan start (reference_time)
+    def __init__(self, reference_time: float):
+        self.reference_time = reference_time
+        self._edges = sorted(reference_time - days * DAY for days in AGE_EDGES_DAYS) # oldest first
+        self.counts = [0] * (len(AGE_EDGES_DAYS) + 1)
+        self.bytes = [0] * (len(AGE_EDGES_DAYS) + 1)
+
+    def add(self, timestamp: float, size: int):
+        b = len(self._edges) - bisect.bisect_right(self._edges, timestamp) # number of edges newer than timestamp
+        self.counts[b] += 1
+        self.bytes[b] += size
+
+    def remove(self, timestamp: float, size: int):
+        b = len(self._edges) - bisect.bisect_right(self._edges, timestamp)
+        self.counts[b] -= 1
+        self.bytes[b] -= size
+
+    def merge(self, other: "AgeHistogram"):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.bytes = [a + b for a, b in zip(self.bytes, other.bytes)]
+
+    def rows(self) -> List[Tuple[str, int, int]]:
+        return list(zip(AGE_LABELS, self.counts, self.bytes))
+
+
+class ScanAggregates:
+    # everything the reporter needs beyond totals and by_type, one instance per worker partial
+    def __init__(self, reference_time: float, top_k: int = 100):
+        self.largest = TopK(top_k)
+        self.size_histogram = LogHistogram()
+        self.size_quantiles = QuantileSketch()
+        self.mtime_ages = AgeHistogram(reference_time)
+        self.atime_ages = AgeHistogram(reference_time)
+
+    def add(self, path: str, size: int, mtime: float, atime: float):
+        self.largest.add(size, path)
+        self.size_histogram.add(size)
+        self.size_quantiles.add(size)
+        self.mtime_ages.add(mtime, size)
+        self.atime_ages.add(atime, size)
+
+    def remove(self, path: str, size: int, mtime: float, atime: float):
+        # the exact arguments of an earlier add()
+        self.largest.remove(size, path)
+        self.size_histogram.remove(size)
+        self.size_quantiles.remove(size)
+        self.mtime_ages.remove(mtime, size)
+        self.atime_ages.remove(atime, size)
+
+    def merge(self, other: "ScanAggregates"):
+        self.largest.merge(other.largest)
+        self.size_histogram.merge(other.size_histogram)
+        self.size_quantiles.merge(other.size_quantiles)
+        self.mtime_ages.merge(other.mtime_ages)
+        self.atime_ages.merge(other.atime_ages)
+        return self
+
+    def quantiles(self, qs=(0.5, 0.9, 0.99)) -> Dict[str, float]:
+        return {f"p{round(q * 100)}": self.size_quantiles.quantile(q) for q in qs}
+
+    def to_dict(self) -> Dict[str, Any]:
+        # plain data for json export
+        return {
+            'largest': [{'path': path, 'size': size} for size, path in self.largest.items()],
+            'size_histogram': [{'low': low, 'high': high, 'count': count, 'size': size}
+                               for low, high, count, size in self.size_histogram.rows()],
+            'size_quantiles': self.quantiles(),
+            'mtime_ages': [{'age': label, 'count': count, 'size': size} for label, count, size in self.mtime_ages.rows()],
+            'atime_ages': [{'age': label, 'count': count, 'size': size} for label, count, size in self.atime_ages.rows()],
+        }
+
+
+def merge_aggregates(into: Optional[ScanAggregates], part: Optional[ScanAggregates]) -> Optional[ScanAggregates]:
+    if part is None:
+        return into
+    if into is None:
+        return part
+    return into.merge(part)
@@ -0,0 +1,329 @@
+import concurrent.futures
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+from scanner.utils import racecheck
+
+
+# Content based file type detection. Only the first HEAD_BYTES of a file are read (os.pread),
+# detection runs in a thread pool on batches of files, and results are cached by
+# (st_dev, st_ino, size, mtime_ns) so an unchanged file is never read twice.
+
+HEAD_BYTES = 4096
+DEFAULT_BUDGET = 256 * 1024 * 1024 # total bytes one scan may read for sniffing
+BATCH_SIZE = 64
+
+UNCLASSIFIED = "unclassified" # not sniffed because the read budget ran out
+UNREADABLE = "unreadable"
+
+# (offset, magic bytes, mime type), checked in order, used when libmagic is not available
+_SIGNATURES: List[Tuple[int, bytes, str]] = [
+    (0, b"%PDF-", "application/pdf"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (0, b"BM", "image/bmp"),
+    (0, b"II*\x00", "image/tiff"),
+    (0, b"MM\x00*", "image/tiff"),
+    (0, b"PK\x03\x04", "application/zip"),
+    (0, b"\x1f\x8b", "application/gzip"),
+    (0, b"BZh", "application/x-bzip2"),
+    (0, b"\xfd7zXZ\x00", "application/x-xz"),
+    (0, b"(\xb5/\xfd", "application/zstd"),
+    (0, b"7z\xbc\xaf\x27\x1c", "application/x-7z-compressed"),
+    (0, b"Rar!\x1a\x07", "application/vnd.rar"),
+    (257, b"ustar", "application/x-tar"),
+    (0, b"\x7fELF", "application/x-executable"),
+    (0, b"MZ", "application/x-dosexec"),
+    (0, b"\xca\xfe\xba\xbe", "application/x-java-applet"),
+    (0, b"SQLite format 3\x00", "application/vnd.sqlite3"),
+    (0, b"ID3", "audio/mpeg"),
+    (0, b"OggS", "audio/ogg"),
+    (0, b"fLaC", "audio/flac"),
+    (4, b"ftyp", "video/mp4"),
+    (0, b"\x1aE\xdf\xa3", "video/webm"),
+    (0, b"%!PS", "application/postscript"),
+    (0, b"{\\rtf", "text/rtf"),
+    (0, b"<?xml", "text/xml"),
+    (0, b"#!", "text/x-shellscript"),
+]
+
+
+def _detect_builtin(head: bytes) -> str:
+    for offset, signature, mime in _SIGNATURES:
+        if head.startswith(signature, offset):
+            return mime
+    if head.startswith(b"RIFF") and len(head) >= 12:
+        return {b"WAVE": "audio/x-wav", b"WEBP": "image/webp", b"AVI ": "video/x-msvideo"}.get(
+            head[8:12], "application/octet-stream")
+    lowered = head[:256].lstrip().lower()
+    if lowered.startswith((b"<!doctype html", b"<html")):
+        return "text/html"
+    if b"\x00" in head:
+        return "application/octet-stream"
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        if e.start < len(head) - 4: # a multibyte char cut at the end of the head is fine
+            return "application/octet-stream"
+    return "text/plain"
+
+
+class _Detector(threading.local):
+    # libmagic handles are not thread safe, every pool thread gets its own
+    def __init__(self):
+        try:
+            import magic # python-magic (libmagic), used when installed
+            self.magic = magic.Magic(mime=True)
+        except ImportError:
+            self.magic = None
+
+    def detect(self, head: bytes) -> str:
+        if self.magic is not None:
+            try:
+                return self.magic.from_buffer(head)
+            except Exception:
+                pass
+        return _detect_builtin(head)
+
+
+def _read_head(path: str, length: int) -> bytes:
+    flags = os.O_RDONLY | getattr(os, "O_BINARY", 0)
+    noatime = getattr(os, "O_NOATIME", 0) # don't touch atime, findold relies on it
+    try:
+        fd = os.open(path, flags | noatime)
+    except PermissionError:
+        if not noatime:
+            raise
+        fd = os.open(path, flags) # O_NOATIME is only allowed for the file owner
+    try:
+        if hasattr(os, "pread"):
+            return os.pread(fd, length, 0)
+        return os.read(fd, length)
+    finally:
+        os.close(fd)
+
+
+class SniffCache:
+    # (dev, ino, size, mtime_ns) -> mime, kept in memory and optionally persisted to SQLite
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path) if db_path is not None else None
+        self._entries: Dict[Tuple[int, int, int, int], str] = {}
+        self._new: List[tuple] = []
+        self._lock = threading.Lock()
+        if self.db_path is not None and self.db_path.exists():
+            with sqlite3.connect(str(self.db_path)) as conn:
+                self._create(conn)
+                mimes: Dict[str, str] = {}
+                for dev, ino, size, mtime_ns, mime in conn.execute("SELECT dev, ino, size, mtime_ns, mime FROM sniff"):
+                    self._entries[(dev, ino, size, mtime_ns)] = mimes.setdefault(mime, mime) # one string per mime type
+
+    @staticmethod
+    def _create(conn):
+        conn.execute("CREATE TABLE IF NOT EXISTS sniff (dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER,"
+                     " mime TEXT NOT NULL, PRIMARY KEY (dev, ino, size, mtime_ns))")
+
+    def get(self, key) -> Optional[str]:
+        return self._entries.get(key)
+
+    def get_many(self, keys: Sequence[tuple]) -> List[Optional[str]]:
+        # scan workers look up while sniff threads insert, one lock per batch
+        with self._lock:
+            race = racecheck.CHECKER
+            if race is not None:
+                race.read("sniff.cache", "sniff.cache_lock")
+            entries = self._entries
+            return [entries.get(key) for key in keys]
+
+    def put_many(self, results: Sequence[Tuple[tuple, str]]):
+        with self._lock:
+            race = racecheck.CHECKER
+            if race is not None:
+                race.write("sniff.cache", "sniff.cache_lock")
+            for key, mime in results:
+                self._entries[key] = mime
+                self._new.append((*key, mime))
+
+    def save(self):
+        if self.db_path is None or not self._new:
+            return
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            rows, self._new = self._new, []
+        conn = sqlite3.connect(str(self.db_path), timeout=60) # pool processes may save at the same time
+        try:
+            with conn:
+                self._create(conn)
+                conn.executemany("INSERT OR REPLACE INTO sniff VALUES (?, ?, ?, ?, ?)", rows)
+        finally:
+            conn.close()
+
+
+class TypeSniffer:
+    # Scan workers hand over batches of (path, dev, ino, size, mtime_ns, nlink) with submit(), detection
+    # runs in this sniffer's own pool. finish() waits and returns by_mime {'mime': {'count', 'size'}}.
+    # A file with several names is sniffed and counted once: `links` maps its (dev, ino) to
+    # (mime, size, stats key or None), merge_summary takes out files another sniffer counted too.
+    def __init__(self, max_total_bytes: int = DEFAULT_BUDGET, threads: int = 4, cache_path: Optional[Path] = None,
+                 head_bytes: int = HEAD_BYTES, batch_size: int = BATCH_SIZE, governor=None):
+        self.head_bytes = head_bytes
+        self.batch_size = batch_size
+        self.budget_left = max_total_bytes
+        self.cache = SniffCache(cache_path)
+        self.stats = {'sniffed': 0, 'cached': 0, 'unclassified': 0, 'bytes_read': 0}
+        self.by_mime: Dict[str, Dict[str, int]] = {}
+        self.links: Dict[Tuple[int, int], Optional[Tuple[str, int, Optional[str]]]] = {} # None until sniffed
+
+        self._lock = threading.Lock() # budget, stats and by_mime, taken once per batch
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, threads),
+                                                               thread_name_prefix="filelens-sniff")
+        self._slots = threading.BoundedSemaphore(max(1, threads) * 4) # backpressure on scan workers
+        self._futures: List[concurrent.futures.Future] = []
+        self._detector = _Detector()
+        self._governor = governor # optional ResourceGovernor, a batch claims a read slot and a device lane
+
+    def _count(self, counts: Dict[str, List[int]], mime: str, size: int):
+        entry = counts.get(mime)
+        if entry is None:
+            counts[mime] = [1, size]
+        else:
+            entry[0] += 1
+            entry[1] += size
+
+    def _claim_links(self, batch: List[tuple]) -> List[tuple]:
+        # drops names of files another name of which was already submitted
+        with self._lock:
+            kept = []
+            for candidate in batch:
+                if candidate[5] > 1:
+                    key = (candidate[1], candidate[2])
+                    if key in self.links:
+                        continue
+                    self.links[key] = None
+                kept.append(candidate)
+            return kept
+
+    def _note_links(self, noted: List[tuple]):
+        # callers hold self._lock
+        for key, mime, size, stat in noted:
+            self.links[key] = (mime, size, stat)
+
+    def submit(self, candidates: List[Tuple[str, int, int, int, int, int]]):
+        # called from scan workers with the files of one directory
+        for start in range(0, len(candidates), self.batch_size):
+            batch = candidates[start:start + self.batch_size]
+            if any(candidate[5] > 1 for candidate in batch):
+                batch = self._claim_links(batch)
+            counts: Dict[str, List[int]] = {}
+            noted = [] # (key, mime, size, stats key) of files with several names
+            to_read = []
+            cached = 0
+            mimes = self.cache.get_many([candidate[1:5] for candidate in batch])
+            for candidate, mime in zip(batch, mimes):
+                _, dev, ino, size, _, nlink = candidate
+                if not size:
+                    self._count(counts, "application/x-empty", 0)
+                    if nlink > 1:
+                        noted.append(((dev, ino), "application/x-empty", 0, None))
+                    continue
+                if mime is not None:
+                    self._count(counts, mime, size)
+                    cached += 1
+                    if nlink > 1:
+                        noted.append(((dev, ino), mime, size, 'cached'))
+                else:
+                    to_read.append(candidate)
+
+            with self._lock:
+                race = racecheck.CHECKER
+                if race is not None:
+                    race.write("sniff.budget", "sniffer.lock")
+                self.stats['cached'] += cached
+                # the budget is reserved for the whole batch up front, reads never go over it
+                wanted = sum(min(c[3], self.head_bytes) for c in to_read)
+                if wanted > self.budget_left:
+                    allowed, reserved = [], 0
+                    for c in to_read:
+                        n = min(c[3], self.head_bytes)
+                        if reserved + n > self.budget_left:
+                            self._count(counts, UNCLASSIFIED, c[3])
+                            self.stats['unclassified'] += 1
+                            if c[5] > 1:
+                                noted.append(((c[1], c[2]), UNCLASSIFIED, c[3], 'unclassified'))
+                        else:
+                            allowed.append(c)
+                            reserved += n
+                    to_read, wanted = allowed, reserved
+                self.budget_left -= wanted
+                self._merge(counts)
+                self._note_links(noted)
+
+            if to_read:
+                self._slots.acquire()
+                future = self._executor.submit(self._read_batch, to_read)
+                future.add_done_callback(lambda _: self._slots.release())
+                with self._lock:
+                    race = racecheck.CHECKER
+                    if race is not None:
+                        race.write("sniff.queue", "sniffer.lock")
+                    self._futures.append(future)
+
+    def _read_batch(self, batch):
+        if self._governor is None:
+            return self._read_batch_unclaimed(batch)
+        with self._governor.reading(batch[0][1]): # one directory per batch, so one device
+            return self._read_batch_unclaimed(batch)
+
+    def _read_batch_unclaimed(self, batch):
+        counts: Dict[str, List[int]] = {}
+        noted = []
+        results = []
+        bytes_read = 0
+        for path, dev, ino, size, mtime_ns, nlink in batch:
+            try:
+                head = _read_head(path, min(size, self.head_bytes))
+            except OSError:
+                self._count(counts, UNREADABLE, size)
+                if nlink > 1:
+                    noted.append(((dev, ino), UNREADABLE, size, None))
+                continue
+            bytes_read += len(head)
+            mime = self._detector.detect(head)
+            results.append(((dev, ino, size, mtime_ns), mime))
+            self._count(counts, mime, size)
+            if nlink > 1:
+                noted.append(((dev, ino), mime, size, 'sniffed'))
+        self.cache.put_many(results)
+        with self._lock:
+            race = racecheck.CHECKER
+            if race is not None:
+                race.write("sniff.stats", "sniffer.lock")
+            self.stats['sniffed'] += len(results)
+            self.stats['bytes_read'] += bytes_read
+            self._merge(counts)
+            self._note_links(noted)
+
+    def _merge(self, counts: Dict[str, List[int]]):
+        for mime, (count, size) in counts.items():
+            entry = self.by_mime.get(mime)
+            if entry is None:
+                self.by_mime[mime] = {'count': count, 'size': size}
+            else:
+                entry['count'] += count
+                entry['size'] += size
+
+    def finish(self) -> Dict[str, Dict[str, int]]:
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            race = racecheck.CHECKER
+            if race is not None:
+                race.read("sniff.queue", "sniffer.lock")
+            futures = list(self._futures)
+        for future in futures:
+            future.result() # re-raises unexpected errors from the pool
+        self.cache.save()
+        return self.by_mime
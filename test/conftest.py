@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the tests import the scanner package from the repository root: python -m pytest test
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
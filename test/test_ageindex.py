@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+from scanner.service.cleanup import CleanupManager
+from scanner.utils import filetable
+from scanner.utils.ageindex import AgeIndex, CleanupPolicy, DAY
+from scanner.utils.filetable import FileTable
+
+NOW = 1_700_000_000.0
+INVALID = [
+    {'path': '/tmp/a', 'mtime': None, 'size': 1},
+    {'path': '/tmp/b', 'size': 3},
+    {'path': '/tmp/c', 'mtime': 'x', 'size': 1},
+    {'path': '/tmp/d', 'mtime': NOW, 'size': 'big'},
+    {'mtime': NOW - 400 * DAY, 'size': 1},
+]
+VALID = [
+    {'path': '/tmp/old.log', 'mtime': NOW - 400 * DAY, 'atime': NOW - 400 * DAY, 'size': 10},
+    {'path': '/tmp/new.log', 'mtime': NOW - DAY, 'size': 20}, # no atime
+    {'path': '/tmp/mid.txt', 'mtime': NOW - 40 * DAY, 'atime': NOW, 'size': 30},
+]
+
+
+@pytest.fixture(params=["numpy", "python"])
+def backend(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(filetable, "_numpy_checked", True)
+        monkeypatch.setattr(filetable, "np", None)
+    return request.param
+
+
+def test_invalid_records_are_skipped_and_reported():
+    skipped = []
+    table = FileTable.from_records(INVALID + VALID, on_invalid=skipped.append)
+    assert len(table) == len(VALID)
+    assert skipped == INVALID
+
+
+def test_find_old_files_skips_invalid_records(capsys):
+    old = CleanupManager(30, True).find_old_files(INVALID + [{'path': '/tmp/e', 'mtime': time.time() - 60 * DAY}])
+    assert [str(path) for path in old] == ['/tmp/e']
+    assert capsys.readouterr().err.count("Invalid file for age check") == len(INVALID)
+
+
+def test_age_index_is_cached_per_input_object():
+    manager = CleanupManager(30, False)
+    records = INVALID + VALID
+    index = manager.age_index(records)
+    assert manager.age_index(records) is index
+    assert manager.age_index(list(records)) is not index
+
+
+def test_age_index_follows_table_changes():
+    # the monitor changes a scan's FileTable in place, the cached index must not answer from before
+    manager = CleanupManager(30, False)
+    table = FileTable.from_records(VALID)
+    index = manager.age_index(table)
+    assert manager.age_index(table) is index
+    table.append("/tmp", "older.bin", 5, NOW - 500 * DAY, NOW, ".bin")
+    index = manager.age_index(table)
+    assert index.paths(index.older_than(30, now=NOW)) == ['/tmp/older.bin', '/tmp/old.log', '/tmp/mid.txt']
+    table.forget(0) # old.log deleted, its row kept for reuse
+    index = manager.age_index(table)
+    assert index.paths(index.older_than(30, now=NOW)) == ['/tmp/older.bin', '/tmp/mid.txt']
+    table.replace(0, "/tmp", "fresh.txt", 1, NOW, NOW, ".txt")
+    assert manager.age_index(table) is not index
+    assert len(manager.age_index(table).older_than(0, now=NOW + 1)) == 4
+
+
+def test_now_is_taken_per_query(monkeypatch):
+    clock = [NOW]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    index = AgeIndex(VALID)
+    assert index.paths(index.older_than(30)) == ['/tmp/old.log', '/tmp/mid.txt']
+    clock[0] = NOW + 60 * DAY # the same index, queried two months later
+    assert index.paths(index.older_than(30)) == ['/tmp/old.log', '/tmp/mid.txt', '/tmp/new.log']
+    assert index.count_older_than(30, now=NOW) == 2
+    assert index.paths(AgeIndex(VALID, now=NOW).older_than(30)) == ['/tmp/old.log', '/tmp/mid.txt'] # a fixed now
+
+
+def test_unknown_atime_is_never_old(backend):
+    index = AgeIndex(VALID, fields=("mtime", "atime"), now=NOW)
+    assert index.paths(index.older_than(30, "atime")) == ['/tmp/old.log']
+    assert index.paths(index.older_than(30)) == ['/tmp/old.log', '/tmp/mid.txt']
+
+
+def test_policy_filters(backend):
+    index = AgeIndex(INVALID + VALID, now=NOW)
+    rows = index.select(CleanupPolicy(older_than_days=30, min_size=15))
+    assert index.paths(rows) == ['/tmp/mid.txt']
+    rows = index.select(CleanupPolicy(older_than_days=30, types=[".log"]))
+    assert index.paths(rows) == ['/tmp/old.log']
+    assert index.total_size(index.older_than(0)) == 60
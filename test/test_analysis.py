@@ -0,0 +1,60 @@
+import os
+
+from scanner.service.analysis import DuplicateFinder, EDGE_BYTES, duplicate_candidates, wasted_bytes
+
+BIG = 3 * EDGE_BYTES # over 2 * EDGE_BYTES, the edge hash does not cover it
+
+
+def records(root):
+    return [{'path': str(path), 'size': path.stat().st_size} for path in sorted(root.iterdir())]
+
+
+def test_stages(tmp_path):
+    (tmp_path / "alone").write_bytes(b"a" * 10) # unique size, never read
+    (tmp_path / "s1").write_bytes(b"1" * 100) # same size, different content
+    (tmp_path / "s2").write_bytes(b"2" * 100)
+    (tmp_path / "d1").write_bytes(b"d" * 1000) # small duplicates, the edge hash read them whole
+    (tmp_path / "d2").write_bytes(b"d" * 1000)
+    edge = b"e" * EDGE_BYTES
+    middle = b"m" * EDGE_BYTES
+    (tmp_path / "b1").write_bytes(edge + middle + edge) # big duplicates, need the full hash
+    (tmp_path / "b2").write_bytes(edge + middle + edge)
+    (tmp_path / "b3").write_bytes(edge + b"x" * EDGE_BYTES + edge) # same edges, other middle
+
+    finder = DuplicateFinder(threads=2)
+    groups = finder.find(records(tmp_path))
+    assert [group['paths'] for group in groups] == [[str(tmp_path / "b1"), str(tmp_path / "b2")],
+                                                    [str(tmp_path / "d1"), str(tmp_path / "d2")]]
+    assert groups[0]['wasted'] == BIG
+    assert wasted_bytes(groups) == BIG + 1000
+    assert finder.stats['candidates'] == 7 # everything but "alone"
+    assert finder.stats['edge_hashed'] == 7
+    assert finder.stats['full_hashed'] == 3 # only the big files got past the edge hash
+
+
+def test_same_edges_different_middle_are_not_duplicates(tmp_path):
+    edge = os.urandom(EDGE_BYTES)
+    (tmp_path / "one").write_bytes(edge + b"\0" * EDGE_BYTES + edge)
+    (tmp_path / "two").write_bytes(edge + b"\0" * (EDGE_BYTES - 1) + b"\1" + edge)
+    finder = DuplicateFinder()
+    assert finder.find(records(tmp_path)) == []
+    assert finder.stats['full_hashed'] == 2
+
+
+def test_hardlinks_are_not_duplicates(tmp_path):
+    (tmp_path / "a").write_bytes(b"x" * 500)
+    os.link(tmp_path / "a", tmp_path / "a_link")
+    (tmp_path / "only").write_bytes(b"y" * 700)
+    os.link(tmp_path / "only", tmp_path / "only_link") # one file under two names, no copy at all
+    (tmp_path / "z_copy").write_bytes(b"x" * 500)
+
+    finder = DuplicateFinder()
+    assert finder._links == {}
+    groups = finder.find(records(tmp_path))
+    assert len(groups) == 1
+    group = groups[0]
+    assert group['paths'] == [str(tmp_path / "a"), str(tmp_path / "z_copy")]
+    assert group['wasted'] == 500
+    assert group['hardlinks'] == {str(tmp_path / "a"): [str(tmp_path / "a_link")]}
+    assert finder.stats['hardlinks_skipped'] == 2
+    assert duplicate_candidates(groups) == [str(tmp_path / "z_copy")]
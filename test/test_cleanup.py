@@ -0,0 +1,72 @@
+import os
+import sys
+
+import pytest
+
+from scanner.service.cleanup import CleanupManager, _HomeTrash
+
+pytestmark = pytest.mark.skipif(sys.platform in ("win32", "darwin", "cygwin"), reason="freedesktop trash only")
+
+
+@pytest.fixture
+def trash(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+    trash = _HomeTrash.detect()
+    assert trash is not None
+    return trash
+
+
+def test_detect_creates_nothing(tmp_path, trash):
+    assert not (tmp_path / "data").exists()
+    assert trash.dev == os.stat(tmp_path).st_dev
+
+
+def test_move_writes_info_and_file(tmp_path, trash):
+    victim = tmp_path / "old file.log"
+    victim.write_bytes(b"x" * 10)
+    assert trash.move(str(victim))
+    assert not victim.exists()
+    assert (trash.files_dir / "old file.log").read_bytes() == b"x" * 10
+    info = (trash.info_dir / "old file.log.trashinfo").read_text()
+    assert info.startswith("[Trash Info]\n")
+    assert f"Path={tmp_path}/old%20file.log\n" in info
+    assert (trash.files_dir.stat().st_mode & 0o777) == 0o700
+
+
+def test_leftover_target_is_not_replaced(tmp_path, trash):
+    trash.files_dir.mkdir(parents=True)
+    trash.info_dir.mkdir(parents=True)
+    (trash.files_dir / "a").write_bytes(b"leftover") # no info file, another tool's or a crash's
+    victim = tmp_path / "a"
+    victim.write_bytes(b"new")
+    assert trash.move(str(victim))
+    assert (trash.files_dir / "a").read_bytes() == b"leftover"
+    assert (trash.files_dir / "a.2").read_bytes() == b"new"
+    assert not (trash.info_dir / "a.trashinfo").exists()
+    assert (trash.info_dir / "a.2.trashinfo").exists()
+
+
+def test_same_name_twice(tmp_path, trash):
+    for content in (b"1", b"2"):
+        victim = tmp_path / "same"
+        victim.write_bytes(content)
+        assert trash.move(str(victim))
+    assert sorted(os.listdir(trash.files_dir)) == ["same", "same.2"]
+
+
+def test_files_in_the_trash_are_left_to_send2trash(trash):
+    trash.files_dir.mkdir(parents=True)
+    inside = trash.files_dir / "x"
+    inside.write_bytes(b"x")
+    assert not trash.move(str(inside))
+
+
+def test_execute_takes_the_fast_path(tmp_path, trash, capsys):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"f{i}"
+        path.write_bytes(b"x")
+        paths.append(path)
+    result = CleanupManager(0, False).execute_send_to_trash(paths + [tmp_path / "missing"], workers=2)
+    assert (result['trashed'], result['fast_path'], result['failed']) == (3, 3, 1)
+    assert sorted(os.listdir(trash.files_dir)) == ["f0", "f1", "f2"]
@@ -0,0 +1,44 @@
+import os
+import pickle
+
+from scanner.utils.filetable import FileTable, _NamePool
+
+NAMES = ["a.txt", "ünïcödé.log", "no_extension", os.fsdecode(b"bad\xffname"), ""]
+
+
+def table_of(names, dir="/d"):
+    table = FileTable()
+    for i, name in enumerate(names):
+        table.append(dir, name, i, 1.0, 1.0, "t")
+    return table
+
+
+def test_names_round_trip_through_the_pool():
+    table = table_of(NAMES)
+    assert list(table.names) == NAMES
+    assert [table.names[i] for i in range(len(table))] == NAMES
+    assert table.path(3) == os.path.join("/d", NAMES[3]) # undecodable bytes survive (surrogateescape)
+    assert len(table.names.data) == sum(len(os.fsencode(name)) for name in NAMES)
+
+
+def test_replace_and_extend():
+    table = table_of(NAMES)
+    table.replace(0, "/d", "longer-than-before.txt", 1, 1.0, 1.0, "t")
+    table.replace(1, "/d", "x", 1, 1.0, 1.0, "t")
+    other = table_of(["o1", "o2"], "/e")
+    other.replace(0, "/e", "o1-renamed", 1, 1.0, 1.0, "t")
+    table.extend(other)
+    expected = ["longer-than-before.txt", "x", *NAMES[2:], "o1-renamed", "o2"]
+    assert list(table.names) == expected
+    assert table.paths()[-2:] == ["/e/o1-renamed", "/e/o2"]
+    assert list(pickle.loads(pickle.dumps(table)).names) == expected # partials cross process boundaries
+
+
+def test_pool_compacts_after_many_replacements():
+    pool = _NamePool()
+    for i in range(100):
+        pool.append(f"f{i}")
+    for round in range(200):
+        pool[round % 100] = f"renamed-{round}-" + "x" * 40 # never fits the old slot
+    assert [pool[i] for i in range(100)] == [f"renamed-{100 + i}-" + "x" * 40 for i in range(100)]
+    assert len(pool.data) < 2 * sum(pool.lengths) + 4096
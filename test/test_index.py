@@ -0,0 +1,92 @@
+import os
+import shutil
+import time
+
+import pytest
+
+from scanner.service.index import ScanIndex
+from scanner.service.scan import scan_tree
+
+OLD = time.time() - 3600 # far outside the racy window
+
+
+def age(root, when=OLD):
+    # directory mtimes back in time, a rescan only sees what the test changes afterwards
+    for dir, _, _ in os.walk(root):
+        os.utime(dir, (when, when))
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "root"
+    (root / "a").mkdir(parents=True)
+    (root / "b" / "c").mkdir(parents=True)
+    (root / "top.txt").write_bytes(b"t" * 7)
+    (root / "a" / "one.bin").write_bytes(b"1" * 100)
+    (root / "b" / "two.log").write_bytes(b"2" * 20)
+    (root / "b" / "c" / "three.log").write_bytes(b"3" * 30)
+    os.link(root / "a" / "one.bin", root / "b" / "c" / "one.link") # names in two directories
+    age(root)
+    return root
+
+
+def totals(summary):
+    return (summary['total_files'], summary['total_size'], summary['total_allocated'], summary['by_type'],
+            summary.get('hardlinks'))
+
+
+def test_unchanged_directories_are_reused(tree, tmp_path):
+    db = tmp_path / "index.db"
+    first = scan_tree(str(tree), index_path=db)
+    assert first['index'] == {'reused': 0, 'listed': 4}
+    second = scan_tree(str(tree), index_path=db)
+    assert second['index'] == {'reused': 4, 'listed': 0}
+    assert totals(second) == totals(first)
+
+
+def test_changed_directory_is_listed_again(tree, tmp_path):
+    db = tmp_path / "index.db"
+    scan_tree(str(tree), index_path=db)
+    (tree / "a" / "new.bin").write_bytes(b"n" * 50)
+    os.utime(tree / "a", (OLD + 10, OLD + 10)) # a new mtime, still outside the racy window
+    summary = scan_tree(str(tree), index_path=db)
+    assert summary['index'] == {'reused': 3, 'listed': 1}
+    assert summary['total_files'] == 5
+    with ScanIndex(db) as index:
+        assert index.get(str(tree / "a"))[3] == 2 # the refreshed row has both files
+
+
+def test_racy_directory_is_not_stored(tree, tmp_path):
+    db = tmp_path / "index.db"
+    now = time.time()
+    os.utime(tree / "a", (now, now)) # modified in the same tick the scan starts in
+    scan_tree(str(tree), index_path=db)
+    with ScanIndex(db) as index:
+        assert index.get(str(tree / "a")) is None
+        assert index.get(str(tree / "b")) is not None
+    assert scan_tree(str(tree), index_path=db)['index'] == {'reused': 3, 'listed': 1}
+
+
+def test_removed_subtree_is_deleted(tree, tmp_path):
+    db = tmp_path / "index.db"
+    scan_tree(str(tree), index_path=db)
+    shutil.rmtree(tree / "b")
+    os.utime(tree, (OLD + 10, OLD + 10))
+    summary = scan_tree(str(tree), index_path=db)
+    assert summary['total_files'] == 2
+    with ScanIndex(db) as index:
+        assert index.get(str(tree / "b")) is None
+        assert index.get(str(tree / "b" / "c")) is None
+        assert set(index.load(str(tree))) == {str(tree), str(tree / "a")}
+
+
+@pytest.mark.parametrize("kwargs", [{'threads': 1}, {'threads': 4},
+                                    {'threads': 2, 'engine': 'process', 'processes': 2}])
+def test_rescan_matches_fresh_scan(tree, tmp_path, kwargs):
+    fresh = scan_tree(str(tree), **kwargs)
+    assert fresh['total_files'] == 4 and fresh['hardlinks'] == {'files': 1, 'bytes': 100}
+    db = tmp_path / "index.db"
+    scan_tree(str(tree), index_path=db, **kwargs)
+    rescan = scan_tree(str(tree), index_path=db, **kwargs)
+    assert rescan['index']['listed'] == 0
+    assert totals(rescan) == totals(fresh)
@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+from scanner.cli.interactive import InteractiveSession
+from scanner.service import scan as scan_module
+
+
+@pytest.fixture
+def session(tmp_path, capsys):
+    (tmp_path / "a.txt").write_bytes(b"a" * 10)
+    (tmp_path / "b.log").write_bytes(b"b" * 20)
+    session = InteractiveSession()
+    session.execute(f"scan {tmp_path} --reportdir {tmp_path / 'reports'}")
+    capsys.readouterr()
+    return session
+
+
+@pytest.fixture
+def held_refresh(monkeypatch):
+    # refreshes block in their scan until release is set, scans from the prompt do not
+    release = threading.Event()
+    real_scan_tree = scan_module.scan_tree
+
+    def scan_tree(*args, **kwargs):
+        if threading.current_thread().name == "filelens-refresh":
+            assert release.wait(10)
+        return real_scan_tree(*args, **kwargs)
+
+    monkeypatch.setattr(scan_module, "scan_tree", scan_tree)
+    yield release
+    release.set()
+
+
+def test_swap_generation():
+    session = InteractiveSession()
+    assert session._swap({'total_files': 1}, None, None, 1.0)
+    generation = session._generation
+    assert session._swap({'total_files': 2}, None, None, 2.0) # a scan in between
+    assert not session._swap({'total_files': 3}, None, None, 3.0, generation=generation)
+    assert session.summary == {'total_files': 2}
+    assert session._swap({'total_files': 4}, None, None, 4.0, generation=session._generation)
+    assert session.summary == {'total_files': 4}
+
+
+def test_refresh_replaces_the_scan(session, tmp_path, capsys):
+    before = session.summary
+    (tmp_path / "c.bin").write_bytes(b"c" * 5)
+    session.execute("refresh --wait")
+    assert session.summary is not before
+    assert session.summary['total_files'] == 3
+    session._flush_notices()
+    assert "Refreshed" in capsys.readouterr().out
+
+
+def test_refresh_older_than_a_scan_is_dropped(session, tmp_path, held_refresh, capsys):
+    assert session.start_refresh()
+    (tmp_path / "c.bin").write_bytes(b"c" * 5)
+    session.execute(f"scan {tmp_path}") # newer than the refresh
+    newer = session.summary
+    held_refresh.set()
+    session._refresh.join(10)
+    assert session.summary is newer
+    assert session.summary['total_files'] == 3
+
+
+def test_cleanup_waits_for_a_running_refresh(session, held_refresh, capsys):
+    assert session.start_refresh()
+    capsys.readouterr()
+    session.execute("cleanup -d 0 --yes")
+    assert "refresh is running" in capsys.readouterr().out
+    held_refresh.set()
+    session._refresh.join(10)
+    assert session.summary['total_files'] == 2 # nothing was trashed
+
+
+def test_findold_from_the_resident_scan(session, capsys):
+    session.execute("findold -d 0 --top 1")
+    out = capsys.readouterr().out
+    assert out.startswith("2 files with mtime older than 0 days, 30 bytes.")
+    assert "... and 1 more" in out
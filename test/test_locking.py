@@ -0,0 +1,49 @@
+import pytest
+
+from bench.banker import LegacyLocking, replay, replay_batched, workload
+from scanner.utils.locking import Locking
+
+
+@pytest.mark.parametrize("processes, resources", [(4, 1), (8, 3), (32, 2), (64, 8)])
+@pytest.mark.parametrize("seed", [1, 7, 42])
+def test_same_decisions_as_legacy(processes, resources, seed):
+    total, claims, steps = workload(processes, resources, 3000, seed)
+    _, old, _ = replay(LegacyLocking, total, claims, steps)
+    _, new, _ = replay(Locking, total, claims, steps)
+    assert new == old
+    assert any(old) and not all(old) # a contended workload, both answers occur
+    for batch in (1, 5, 16):
+        assert replay_batched(total, claims, steps, batch)[1] == old
+
+
+def test_fast_paths_and_safety_pass_agree_with_legacy():
+    # headroom: the pool covers the biggest claim after every grant, no safety pass at all
+    roomy = Locking([100, 100], [[4, 4], [4, 4]])
+    assert roomy.request_many([(0, [2, 1]), (1, [3, 3]), (0, [2, 3])]) == [True, True, True]
+    assert roomy.stats['fast_path'] == 3 and roomy.stats['safety_checks'] == 0
+
+    # need <= available: the first grant leaves less than a claim, but pid 0 could still finish.
+    # the second one needs the safety pass, which finds the state unsafe
+    steps = [(0, [3]), (1, [3]), (0, [5]), (1, [3])]
+    legacy = LegacyLocking([10], [[8], [8]])
+    expected = [legacy.request(pid, req) for pid, req in steps]
+    assert expected == [True, False, True, False]
+
+    one_by_one = Locking([10], [[8], [8]])
+    assert [one_by_one.request(pid, req) for pid, req in steps] == expected
+    assert one_by_one.stats['fast_path'] == 2 and one_by_one.stats['safety_checks'] == 1
+    batched = Locking([10], [[8], [8]])
+    assert batched.request_many(steps) == expected
+    assert batched.stats == one_by_one.stats
+
+    # a denied request changes nothing, releasing everything brings back the headroom
+    assert batched.allocated == [[8], [0]] and batched.need == [[0], [8]]
+    batched.release_all(0)
+    assert batched.available == [10] and batched.request(1, [8])
+
+
+def test_over_claim_and_over_available_are_denied():
+    allocator = Locking([2], [[3]])
+    assert allocator.request(0, [4]) is False # more than the claim
+    assert allocator.request(0, [3]) is False # more than is available
+    assert allocator.stats['denied'] == 2 and allocator.available == [2]
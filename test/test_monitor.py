@@ -0,0 +1,87 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("watchdog")
+
+from scanner.service.monitor import DirMonitor
+from scanner.service.prune import PruneRules
+from scanner.service.scan import scan_tree, ScanOptions
+
+RULES = PruneRules(["node_modules"], mounts={})
+
+
+@pytest.fixture
+def tree(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "big").write_bytes(b"\0" * 10000)
+    os.link(tmp_path / "a" / "big", tmp_path / "a" / "big2")
+    (tmp_path / "b.txt").write_bytes(b"abc")
+    (tmp_path / "node_modules").mkdir()
+    (tmp_path / "node_modules" / "dep.js").write_bytes(b"x" * 500)
+    return tmp_path
+
+
+def wait_for(monitor, check, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        snapshot = monitor.snapshot()
+        if check(snapshot):
+            return snapshot
+        time.sleep(0.05)
+    return monitor.snapshot()
+
+
+def totals(summary):
+    return summary['total_files'], summary['total_size'], summary['total_allocated']
+
+
+@pytest.mark.parametrize("seeded", [False, True])
+def test_initial_state_matches_scan(tree, seeded):
+    scan = scan_tree(str(tree), 1, options=ScanOptions(collect_files=True, prune=RULES))
+    expected = totals(scan)
+    assert expected[:2] == (2, 10003)
+    monitor = DirMonitor(tree, debounce=0.05, prune=RULES)
+    monitor.start(scan if seeded else None)
+    try:
+        snapshot = monitor.snapshot()
+    finally:
+        monitor.stop()
+    assert totals(snapshot) == expected
+    assert snapshot['hardlinks'] == {'files': 1, 'bytes': 10000}
+    assert snapshot['by_dir'][str(tree / "a")] == {'count': 1, 'size': 10000}
+    assert str(tree / "node_modules") not in snapshot['by_dir']
+
+
+def test_changes_before_start_are_applied(tree):
+    scan = scan_tree(str(tree), 1, options=ScanOptions(collect_files=True, prune=RULES))
+    monitor = DirMonitor(tree, debounce=0.05, prune=RULES).watch()
+    (tree / "b.txt").unlink() # after the scan, before the monitor took it over
+    (tree / "new.bin").write_bytes(b"y" * 20)
+    monitor.start(scan)
+    try:
+        snapshot = wait_for(monitor, lambda s: s['total_size'] == 10020)
+    finally:
+        monitor.stop()
+    assert snapshot['total_files'] == 2
+    assert snapshot['total_size'] == 10020
+    assert 'txt' not in snapshot['by_type'] and '.txt' not in snapshot['by_type']
+
+
+def test_hardlink_names_and_pruned_events(tree):
+    monitor = DirMonitor(tree, debounce=0.05, prune=RULES)
+    monitor.start()
+    try:
+        (tree / "node_modules" / "more.js").write_bytes(b"z" * 700)
+        os.unlink(tree / "a" / "big") # the counted name goes, big2 takes over
+        snapshot = wait_for(monitor, lambda s: s['hardlinks']['files'] == 0)
+        assert snapshot['total_files'] == 2
+        assert snapshot['total_size'] == 10003
+        assert snapshot['by_dir'][str(tree / "a")] == {'count': 1, 'size': 10000}
+        os.unlink(tree / "a" / "big2")
+        snapshot = wait_for(monitor, lambda s: s['total_files'] == 1)
+    finally:
+        monitor.stop()
+    assert totals(snapshot)[:2] == (1, 3)
+    assert str(tree / "a") not in snapshot['by_dir']
@@ -0,0 +1,85 @@
+import pytest
+
+from scanner.service.prune import PruneRules, compile_excludes, format_pruned
+
+
+def matches(pattern, rel):
+    return compile_excludes([pattern]).match(rel) is not None
+
+
+@pytest.mark.parametrize("pattern, rel, expected", [
+    ("node_modules", "node_modules", True),
+    ("node_modules", "a/b/node_modules", True),
+    ("node_modules", "node_modules_old", False),
+    ("/build", "build", True),
+    ("/build", "src/build", False),
+    ("src/tmp", "src/tmp", True),
+    ("src/tmp", "x/src/tmp", False),
+    ("*.cache", "a/b.cache", True),
+    ("*.cache", "a/b/c", False),
+    ("a*", "x/ab", True),
+    ("/a*", "ab/c", False), # * does not match /
+    ("?.d", "x.d", True),
+    ("?.d", "xy.d", False),
+    ("a/**/b", "a/b", True),
+    ("a/**/b", "a/x/y/b", True),
+    ("**/cache", "cache", True),
+    ("**/cache", "p/q/cache", True),
+    ("/data/**", "data/x/y", True),
+    ("[a-c]x", "bx", True),
+    ("[a-c]x", "dx", False),
+    ("[!a-c]x", "dx", True),
+    ("[!a-c]x", "ax", False),
+    ("[]abc]x", "]x", True), # a ] right after [ is a member, like fnmatch
+    ("[]abc]x", "bx", True),
+    ("[]abc]x", "dx", False),
+    ("[!]a]x", "bx", True),
+    ("[!]a]x", "]x", False),
+    ("[]", "[]", True), # no closing ], so a literal
+    ("[!]", "[!]", True),
+    ("[\\^]x", "^x", True), # regex set syntax is literal inside a glob set
+    ("a[", "a[", True), # an unclosed [ is a literal
+    ("build/", "build", True),
+    ("v1.0", "v1x0", False), # regex characters are literals
+])
+def test_translate(pattern, rel, expected):
+    if expected is None:
+        with pytest.raises(ValueError, match="invalid prune pattern"):
+            compile_excludes([pattern])
+    else:
+        assert matches(pattern, rel) is expected
+
+
+@pytest.mark.parametrize("pattern", ["[z-a]", "x/[!z-a]"])
+def test_invalid_pattern_names_the_glob(pattern):
+    with pytest.raises(ValueError) as e:
+        PruneRules([pattern], mounts={})
+    assert str(e.value) == f"invalid prune pattern {pattern!r}"
+
+
+def test_comments_blanks_and_negation():
+    assert compile_excludes(["", "# comment", "   "]) is None
+    with pytest.raises(ValueError, match="Negated"):
+        compile_excludes(["!keep"])
+
+
+def test_reason_and_filter(tmp_path):
+    rules = PruneRules(["node_modules", "/out"], max_depth=2, mounts={}).bind(tmp_path)
+    root = str(tmp_path)
+    assert rules.reason(f"{root}/a/node_modules") == "exclude"
+    assert rules.reason(f"{root}/out") == "exclude"
+    assert rules.reason(f"{root}/a/out") is None
+    assert rules.reason(f"{root}/a/b/c") == "depth"
+    counts = {}
+    kept = rules.filter([(f"{root}/src", 1, 2), (f"{root}/node_modules", 1, 3)], counts)
+    assert kept == [(f"{root}/src", 1, 2)]
+    assert format_pruned(counts) == "Pruned 1 directories (1 by exclude)."
+
+
+def test_mounts_skipped_except_root():
+    mounts = {"/proc": "proc", "/mnt/share": "nfs", "/home": "ext4"}
+    rules = PruneRules(mounts=mounts).bind("/")
+    assert rules.reason("/proc") == "mount"
+    assert rules.reason("/mnt/share") == "mount"
+    assert rules.reason("/home") is None
+    assert PruneRules(mounts=mounts).bind("/proc").reason("/proc") is None
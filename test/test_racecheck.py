@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+from scanner.utils import racecheck
+from scanner.utils.racecheck import RaceChecker
+
+
+def run_writers(checker, locked):
+    lock = threading.Lock()
+    counter = [0]
+    step = threading.Barrier(2)
+
+    def writer():
+        for _ in range(50):
+            step.wait() # the two threads take turns, every write follows one of the other thread
+            if locked:
+                with lock:
+                    checker.write("counter", "lock")
+                    counter[0] += 1
+            else:
+                checker.write("counter")
+                counter[0] += 1
+
+    threads = [threading.Thread(target=writer) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return checker.report()
+
+
+@pytest.mark.parametrize("sample_every", [1, 4])
+def test_unlocked_writes_from_two_threads_race(sample_every):
+    report = run_writers(RaceChecker(sample_every), locked=False)
+    assert report['races'] > 0
+    info = report['variables']['counter']
+    assert info['threads'] == 2 and info['state'] == "Shared-Modified"
+    assert info['first_race']['locks'] == []
+
+
+@pytest.mark.parametrize("sample_every", [1, 4])
+def test_locked_writes_do_not_race(sample_every):
+    report = run_writers(RaceChecker(sample_every), locked=True)
+    assert report['races'] == 0
+    info = report['variables']['counter']
+    assert info['races'] > 0 # the state machine alone flags them, the common lock clears them
+    assert info['lockset'] == ["lock"]
+
+
+def test_sampling_is_per_variable():
+    # alternating accesses to two variables, one shared counter would only ever sample one of them
+    checker = RaceChecker(sample_every=2)
+    for _ in range(10):
+        checker.read("a")
+        checker.read("b")
+    variables = checker.report()['variables']
+    assert variables['a']['accesses'] == variables['b']['accesses'] == 5
+
+
+def test_session_enables_the_global_checker():
+    with racecheck.session(1) as checker:
+        assert racecheck.CHECKER is checker
+    assert racecheck.CHECKER is None
@@ -0,0 +1,93 @@
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("matplotlib")
+pytest.importorskip("reportlab")
+
+from scanner.service import reporter
+from scanner.service.batch import report_many
+from scanner.service.reporter import Reporter, clear_render_cache
+from scanner.utils.dirtree import DirTree
+
+BY_TYPE = {'.txt': {'count': 5, 'size': 50}, '.log': {'count': 3, 'size': 900}, 'no_extension': {'count': 1, 'size': 7}}
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    # counts the charts actually drawn, a cache hit never loads pyplot
+    clear_render_cache()
+    calls = []
+    real = reporter._pyplot
+
+    def counting():
+        calls.append(1)
+        return real()
+
+    monkeypatch.setattr(reporter, "_pyplot", counting)
+    yield calls
+    clear_render_cache()
+
+
+def test_render_cache_hit_and_miss(tmp_path, renders):
+    png = Reporter(tmp_path, "bar", False)._generate_chart_image({'by_type': BY_TYPE})
+    assert png.startswith(b"\x89PNG")
+    # an equal chart: same counts, other sizes and order
+    same = {'no_extension': {'count': 1, 'size': 1}, '.log': {'count': 3, 'size': 1}, '.txt': {'count': 5, 'size': 1}}
+    assert Reporter(tmp_path, "bar", False)._generate_chart_image({'by_type': same}) is png
+    assert len(renders) == 1
+
+    changed = {**BY_TYPE, '.txt': {'count': 6, 'size': 50}}
+    assert Reporter(tmp_path, "bar", False)._generate_chart_image({'by_type': changed}) != png
+    assert Reporter(tmp_path, "pie", False)._generate_chart_image({'by_type': BY_TYPE}) != png
+    assert len(renders) == 3
+
+
+def test_cache_dir_round_trip(tmp_path, renders):
+    cache_dir = tmp_path / "cache"
+    png = Reporter(tmp_path, "bar", False, cache_dir=cache_dir)._generate_chart_image({'by_type': BY_TYPE})
+    stored = list(cache_dir.iterdir())
+    assert len(stored) == 1 and stored[0].suffix == ".png" # no temporary file left behind
+    assert stored[0].read_bytes() == png
+
+    clear_render_cache() # like another process or a later run
+    again = Reporter(tmp_path, "bar", False, cache_dir=cache_dir)._generate_chart_image({'by_type': BY_TYPE})
+    assert again == png
+    assert len(renders) == 1
+    clear_render_cache()
+    Reporter(tmp_path, "bar", False)._generate_chart_image({'by_type': BY_TYPE}) # no cache_dir, drawn again
+    assert len(renders) == 2
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_report_many_isolates_failing_sources(tmp_path, processes):
+    good = tmp_path / "good"
+    good.mkdir()
+    (good / "a.txt").write_bytes(b"a" * 10)
+    empty = tmp_path / "empty"
+    empty.mkdir()
+    broken = tmp_path / "broken.flsnap"
+    broken.write_bytes(b"not a snapshot")
+    sources = [tmp_path / "missing", good, broken, empty]
+
+    seen = []
+    results = report_many(sources, tmp_path / "reports", processes=processes, on_result=seen.append)
+    assert [row['source'] for row in results] == [str(source) for source in sources]
+    assert len(seen) == 4
+    missing, good_row, broken_row, empty_row = results
+    assert missing['error'] and missing['report'] is None
+    assert broken_row['error'] and broken_row['report'] is None
+    assert good_row['error'] is None and good_row['files'] == 1
+    assert Path(good_row['report']).is_file()
+    assert empty_row['error'] is None and empty_row['report'] is None # nothing to report is not an error
+
+
+def test_largest_dirs_leave_out_the_root_not_the_first_row(tmp_path):
+    # everything is in /t/a, so /t/a ties with the root
+    tree = DirTree()
+    tree.add("/t", 0, 0, 0)
+    tree.add("/t/a", 1, 60, 60)
+    tree.add("/t/a/x", 2, 40, 40)
+    paths = [row['path'] for row in Reporter(tmp_path, "none", False, top_dirs=5)._largest_dirs({'dir_tree': tree})]
+    assert paths == ["/t/a", "/t/a/x"]
+    assert len(Reporter(tmp_path, "none", False, top_dirs=1)._largest_dirs({'dir_tree': tree})) == 1
@@ -0,0 +1,131 @@
+import os
+
+import pytest
+
+from scanner.service.scan import merge_summary, new_summary, scan_tree, ScanOptions
+from scanner.utils.dirtree import DirTree
+from scanner.utils.sketches import ScanAggregates
+
+NOW = 1_700_000_000.0
+
+
+@pytest.fixture
+def linked_tree(tmp_path):
+    # one 10000 byte file under three names in two directories, plus a 3 byte file
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    (tmp_path / "a" / "big").write_bytes(b"\0" * 10000)
+    os.link(tmp_path / "a" / "big", tmp_path / "a" / "big3")
+    os.link(tmp_path / "a" / "big", tmp_path / "b" / "big2")
+    (tmp_path / "b" / "small").write_bytes(b"abc")
+    return tmp_path
+
+
+def partial(dir, names, key=(1, 42), size=10000):
+    # what _scan_dir returns for a directory holding names of one hardlinked file
+    part = new_summary()
+    part['aggregates'] = ScanAggregates(NOW)
+    path = f"{dir}/{names[0]}"
+    part['aggregates'].add(path, size, NOW, NOW)
+    part['total_files'] = 1
+    part['total_size'] = size
+    part['total_allocated'] = size
+    part['by_type'] = {'no_extension': {'count': 1, 'size': size}}
+    part['links'] = {key: (size, size, 'no_extension', dir, (path, NOW, NOW))}
+    part['dir_tree'] = DirTree()
+    part['dir_tree'].add(dir, 1, size, size)
+    if len(names) > 1:
+        part['hardlinks'] = {'files': len(names) - 1, 'bytes': (len(names) - 1) * size}
+    return part
+
+
+def aggregated_files(aggregates):
+    return sum(count for _, _, count, _ in aggregates.size_histogram.rows())
+
+
+def test_merge_takes_cross_directory_links_out_of_totals_and_aggregates():
+    summary = merge_summary(new_summary(), partial("/t/a", ["big", "big3"]))
+    merge_summary(summary, partial("/t/b", ["big2"]))
+    assert summary['total_files'] == 1
+    assert summary['total_size'] == 10000
+    assert summary['by_type'] == {'no_extension': {'count': 1, 'size': 10000}}
+    assert summary['hardlinks'] == {'files': 2, 'bytes': 20000}
+    aggregates = summary['aggregates']
+    assert aggregated_files(aggregates) == 1
+    assert aggregates.size_quantiles.count == 1
+    assert aggregates.largest.items() == [(10000, "/t/a/big")]
+    assert sum(aggregates.mtime_ages.counts) == 1
+    tree = summary['dir_tree']
+    tree.add("/t", 0, 0, 0)
+    tree.rollup()
+    root = tree.row(tree.find("/t"))
+    assert (root['files'], root['size']) == (summary['total_files'], summary['total_size'])
+    assert tree.row(tree.find("/t/b"))['own_size'] == 0
+
+
+def test_reused_index_rows_have_nothing_to_remove():
+    part = partial("/t/b", ["big2"])
+    part['links'] = {key: (*value[:4], None) for key, value in part['links'].items()}
+    summary = merge_summary(new_summary(), partial("/t/a", ["big"]))
+    merge_summary(summary, part)
+    assert summary['total_files'] == 1
+    assert aggregated_files(summary['aggregates']) == 2 # the reused side never removes what it did not add
+
+
+@pytest.mark.parametrize("kwargs", [{'threads': 1}, {'threads': 4},
+                                    {'threads': 2, 'engine': 'process', 'processes': 2}])
+def test_scan_counts_hardlinks_once(linked_tree, kwargs):
+    summary = scan_tree(str(linked_tree), options=ScanOptions(dir_tree=True), **kwargs)
+    assert summary['total_files'] == 2
+    assert summary['total_size'] == 10003
+    assert summary['hardlinks'] == {'files': 2, 'bytes': 20000}
+    aggregates = summary['aggregates']
+    assert aggregated_files(aggregates) == 2
+    assert [size for size, _ in aggregates.largest.items()] == [10000, 3]
+    tree = summary['dir_tree']
+    root = tree.row(tree.find(str(linked_tree)))
+    assert (root['files'], root['size']) == (2, 10003)
+    assert sum(tree.own_size) == 10003
+
+
+@pytest.mark.parametrize("kwargs", [{'threads': 1}, {'threads': 4},
+                                    {'threads': 2, 'engine': 'process', 'processes': 2}])
+def test_sniff_counts_hardlinks_once(linked_tree, kwargs):
+    summary = scan_tree(str(linked_tree), options=ScanOptions(sniff=True), **kwargs)
+    assert sum(entry['count'] for entry in summary['by_mime'].values()) == summary['total_files'] == 2
+    assert sum(entry['size'] for entry in summary['by_mime'].values()) == summary['total_size']
+    stats = summary['sniff']
+    assert stats['sniffed'] + stats['cached'] + stats['unclassified'] == 2
+    assert 'sniff_links' not in summary
+
+
+def test_discount_applies_to_rows_merged_later():
+    tree = DirTree()
+    tree.discount("/t/b", 1, 100, 100)
+    later = DirTree()
+    later.add("/t/b", 2, 150, 150)
+    tree.add("/t", 0, 0, 0)
+    tree.extend(later)
+    tree.rollup()
+    assert tree.row(tree.find("/t"))['files'] == 1
+    assert tree.row(tree.find("/t"))['size'] == 50
+
+
+def test_governed_scan_claims_lanes_without_stat(linked_tree, monkeypatch):
+    # the governor takes each directory's st_dev from the walk, a governed scan stats nothing more
+    real_stat = os.stat
+    calls = []
+
+    def counting_stat(*args, **kwargs):
+        calls.append(args[0])
+        return real_stat(*args, **kwargs)
+
+    monkeypatch.setattr(os, "stat", counting_stat)
+    plain = scan_tree(str(linked_tree), 2)
+    plain_calls = len(calls)
+    del calls[:]
+    governed = scan_tree(str(linked_tree), 2, options=ScanOptions(govern=True))
+    monkeypatch.undo()
+    assert len(calls) == plain_calls
+    assert (governed['total_files'], governed['total_size']) == (plain['total_files'], plain['total_size'])
+    assert governed['governor']['dir_claims'] == 3
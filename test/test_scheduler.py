@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+from scanner.service.scheduler import WorkStealingScheduler
+
+
+def tree_handler(fanout=3, depth=4):
+    # items are (depth, id), every item below `depth` has `fanout` children
+    def handler(state, item):
+        state.append(item)
+        level, ident = item
+        if level >= depth:
+            return ()
+        return [(level + 1, ident * fanout + k) for k in range(fanout)]
+    return handler
+
+
+def run_with_timeout(scheduler, roots, timeout=10):
+    # run() on another thread, so a hang fails the test instead of blocking it
+    outcome = {}
+
+    def target():
+        try:
+            outcome['states'] = scheduler.run(roots, list)
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "run() did not return"
+    return outcome
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_walks_every_item_once(threads):
+    scheduler = WorkStealingScheduler(threads, tree_handler(), batch_size=2)
+    states = run_with_timeout(scheduler, [(0, 0)])['states']
+    items = [item for state in states for item in state]
+    assert len(items) == len(set(items)) == sum(3 ** level for level in range(5))
+    assert scheduler.stats['items'] == len(items)
+    assert scheduler.pending == 0
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_handler_error_without_on_error_is_raised(threads):
+    inner = tree_handler()
+
+    def handler(state, item):
+        if item == (2, 5):
+            raise RuntimeError("boom")
+        return inner(state, item)
+
+    outcome = run_with_timeout(WorkStealingScheduler(threads, handler, batch_size=2), [(0, 0)])
+    assert isinstance(outcome.get('error'), RuntimeError)
+
+
+def test_raising_on_error_is_raised():
+    def handler(state, item):
+        raise OSError("listing failed")
+
+    def on_error(state, item, e):
+        raise ValueError("on_error failed")
+
+    outcome = run_with_timeout(WorkStealingScheduler(2, handler, on_error=on_error), [1, 2, 3])
+    assert isinstance(outcome.get('error'), ValueError)
+
+
+def test_on_error_keeps_walking():
+    failed = []
+
+    def handler(state, item):
+        if item == 2:
+            raise OSError("listing failed")
+        state.append(item)
+        return ()
+
+    states = run_with_timeout(WorkStealingScheduler(2, handler, on_error=lambda state, item, e: failed.append(item)),
+                              [1, 2, 3])['states']
+    assert sorted(item for state in states for item in state) == [1, 3]
+    assert failed == [2]
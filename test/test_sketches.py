@@ -0,0 +1,106 @@
+import random
+
+import pytest
+
+from scanner.utils.sketches import DAY, LogHistogram, QuantileSketch, ScanAggregates, TopK
+
+NOW = 1_700_000_000.0
+
+
+@pytest.fixture
+def files():
+    # (path, size, mtime, atime), log-normal sizes like a real tree, a few empty files
+    rng = random.Random(3)
+    result = []
+    for i in range(5000):
+        size = 0 if i % 97 == 0 else int(rng.lognormvariate(9, 3))
+        result.append((f"/t/{i}", size, NOW - rng.uniform(0, 3000) * DAY, NOW - rng.uniform(0, 900) * DAY))
+    return result
+
+
+def split(items, parts):
+    return [items[i::parts] for i in range(parts)]
+
+
+def state(aggregates):
+    return (aggregates.largest.items(), aggregates.size_histogram.counts, aggregates.size_histogram.bytes,
+            aggregates.size_quantiles.buckets, aggregates.size_quantiles.zero_count, aggregates.size_quantiles.count,
+            aggregates.mtime_ages.counts, aggregates.mtime_ages.bytes, aggregates.atime_ages.rows())
+
+
+def build(files, top_k=20):
+    aggregates = ScanAggregates(NOW, top_k)
+    for file in files:
+        aggregates.add(*file)
+    return aggregates
+
+
+@pytest.mark.parametrize("parts", [2, 7])
+def test_merged_workers_equal_one_sketch(files, parts):
+    whole = build(files)
+    merged = build([])
+    for chunk in split(files, parts):
+        merged.merge(build(chunk))
+    assert state(merged) == state(whole)
+
+
+@pytest.mark.parametrize("parts", [2, 7])
+def test_each_sketch_merges_exactly(files, parts):
+    sizes = [size for _, size, _, _ in files]
+    top, histogram, quantiles = TopK(10), LogHistogram(), QuantileSketch()
+    for path, size, _, _ in files:
+        top.add(size, path)
+        histogram.add(size)
+        quantiles.add(size)
+    merged_top, merged_histogram, merged_quantiles = TopK(10), LogHistogram(), QuantileSketch()
+    for chunk in split(files, parts):
+        part_top, part_histogram, part_quantiles = TopK(10), LogHistogram(), QuantileSketch()
+        for path, size, _, _ in chunk:
+            part_top.add(size, path)
+            part_histogram.add(size)
+            part_quantiles.add(size)
+        merged_top.merge(part_top)
+        merged_histogram.merge(part_histogram)
+        merged_quantiles.merge(part_quantiles)
+    assert merged_top.items() == top.items()
+    assert [size for size, _ in top.items()] == sorted(sizes, reverse=True)[:10]
+    assert merged_histogram.rows() == histogram.rows()
+    assert sum(count for _, _, count, _ in histogram.rows()) == len(sizes)
+    assert merged_quantiles.buckets == quantiles.buckets and merged_quantiles.count == quantiles.count
+
+
+@pytest.mark.parametrize("alpha", [0.01, 0.05])
+def test_quantiles_within_relative_error(files, alpha):
+    sizes = sorted(size for _, size, _, _ in files)
+    sketch = QuantileSketch(alpha)
+    for size in sizes:
+        sketch.add(size)
+    for q in (0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0):
+        exact = sizes[int(q * (len(sizes) - 1))]
+        estimate = sketch.quantile(q)
+        if exact == 0:
+            assert estimate == 0
+        else:
+            assert abs(estimate - exact) <= alpha * exact * (1 + 1e-9), q
+
+
+def test_remove_reverses_add(files):
+    kept, extra = files[:4000], files[4000:]
+    expected = build(kept)
+    aggregates = build(files)
+    top = aggregates.largest.items()
+    for file in extra:
+        aggregates.remove(*file)
+    # the top list keeps what was not removed, files pushed out earlier do not come back
+    removed = {(size, path) for path, size, _, _ in extra}
+    assert aggregates.largest.items() == [item for item in top if item not in removed]
+    assert state(aggregates)[1:] == state(expected)[1:]
+
+    aggregates = build(kept)
+    for file in extra[:50]:
+        aggregates.add(*file)
+    for file in extra[:50]:
+        aggregates.remove(*file)
+    assert aggregates.size_quantiles.buckets == expected.size_quantiles.buckets
+    assert aggregates.size_histogram.rows() == expected.size_histogram.rows()
+    assert aggregates.quantiles() == expected.quantiles()
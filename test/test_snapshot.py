@@ -0,0 +1,96 @@
+import math
+import os
+
+import pytest
+
+from scanner.service import snapshot
+from scanner.service.scan import scan_tree, new_summary, ScanOptions
+from scanner.service.snapshot import diff_snapshots, read_summary, write_snapshot, SnapshotReader
+from scanner.utils.ageindex import AgeIndex
+from scanner.utils.filetable import FileTable
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "root"
+    (root / "a" / "deep").mkdir(parents=True)
+    (root / "b").mkdir()
+    (root / "top.txt").write_bytes(b"t" * 7)
+    (root / "a" / "one.bin").write_bytes(b"1" * 100)
+    (root / "a" / "deep" / "two.bin").write_bytes(b"2" * 2000)
+    (root / "b" / "three.log").write_bytes(b"3" * 30)
+    return root
+
+
+def scan(root):
+    return scan_tree(str(root), 1, options=ScanOptions(collect_files=True, dir_tree=True))
+
+
+def dir_rows(tree):
+    tree._check()
+    return {tree.paths[i]: (tree.own_files[i], tree.own_size[i], tree.total_files[i], tree.total_size[i])
+            for i in range(len(tree))}
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_round_trip(tree, tmp_path, compress):
+    summary = scan(tree)
+    path = write_snapshot(summary, tmp_path / "s.flsnap", tree, compress=compress)
+    loaded = read_summary(path)
+
+    for key in ('total_files', 'total_size', 'by_type'):
+        assert loaded[key] == summary[key]
+    files = loaded['all_files_details']
+    assert sorted((row['path'], row['size'], row['mtime']) for row in files) == \
+        sorted((row['path'], row['size'], row['mtime']) for row in summary['all_files_details'])
+    assert all(math.isnan(row['atime']) for row in files)
+    assert dir_rows(loaded['dir_tree']) == dir_rows(summary['dir_tree'])
+    assert loaded['dir_tree'].row(loaded['dir_tree'].find(str(tree / "a")))['own_size'] == 100
+
+
+def test_unknown_atimes_are_not_old(tree, tmp_path):
+    loaded = read_summary(write_snapshot(scan(tree), tmp_path / "s.flsnap", tree))
+    index = AgeIndex(loaded['all_files_details'], now=2e9)
+    assert len(index.older_than(1, field='atime')) == 0
+    assert len(index.older_than(1)) == 4 # mtimes are stored
+
+
+def test_long_paths(tmp_path):
+    # front coded suffixes longer than 65535 bytes, only in a synthetic table
+    long_dir = "/x/" + "d" * 70000
+    files = FileTable()
+    files.append(long_dir, "f1", 5, 1.0, 1.0, "no_extension")
+    files.append(long_dir + "e" * 70000, "f2", 6, 2.0, 2.0, "no_extension")
+    summary = {**new_summary(), 'all_files_details': files, 'total_files': 2, 'total_size': 11}
+    path = write_snapshot(summary, tmp_path / "long.flsnap", "/x")
+    paths = sorted(row['path'] for row in read_summary(path)['all_files_details'])
+    assert paths == sorted([long_dir + "/f1", long_dir + "e" * 70000 + "/f2"])
+
+
+def test_version_1_is_read(tree, tmp_path, monkeypatch):
+    summary = scan(tree)
+    monkeypatch.setattr(snapshot, "VERSION", 1)
+    monkeypatch.setattr(snapshot, "_RECORD", snapshot._RECORDS[1])
+    path = write_snapshot(summary, tmp_path / "v1.flsnap", tree)
+    monkeypatch.undo()
+    with SnapshotReader(path) as reader:
+        assert reader.version == 1
+        assert sum(1 for record in reader if record[1] == snapshot.FILE) == 4
+
+
+def test_diff(tree, tmp_path):
+    old = write_snapshot(scan(tree), tmp_path / "old.flsnap", tree)
+    (tree / "a" / "one.bin").write_bytes(b"1" * 150) # grown by 50
+    (tree / "b" / "three.log").unlink()
+    (tree / "b" / "four.log").write_bytes(b"4" * 40)
+    os.utime(tree / "top.txt", (1, 1)) # same size, new mtime
+    new = write_snapshot(scan(tree), tmp_path / "new.flsnap", tree)
+
+    diff = diff_snapshots(old, new)
+    assert diff['files']['grown'] == {'count': 1, 'bytes': 50}
+    assert diff['files']['removed'] == {'count': 1, 'bytes': 30}
+    assert diff['files']['added'] == {'count': 1, 'bytes': 40}
+    assert diff['files']['modified']['count'] == 1
+    assert diff['total'] == {'files': 0, 'size': 60}
+    assert diff['largest']['files']['grown'][0]['path'] == str(tree / "a" / "one.bin")
+    assert diff['by_type']['.log'] == {'count': 0, 'size': 10}
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from scanner.utils.sniff import TypeSniffer, UNCLASSIFIED, _detect_builtin
+
+
+@pytest.mark.parametrize("head, mime", [
+    (b"%PDF-1.7\n", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n\0\0\0\rIHDR", "image/png"),
+    (b"PK\x03\x04\x14\0", "application/zip"),
+    (b"\0" * 257 + b"ustar\x0000", "application/x-tar"), # signature at an offset
+    (b"\0\0\0\x18ftypmp42", "video/mp4"),
+    (b"RIFF\0\0\0\0WAVEfmt ", "audio/x-wav"),
+    (b"  <!DOCTYPE html><html>", "text/html"),
+    (b"#!/bin/sh\necho hi\n", "text/x-shellscript"),
+    (b"plain text\n", "text/plain"),
+    ("café".encode() * 10 + "é".encode()[:1], "text/plain"), # a character cut at the end of the head
+    (b"\xff\xfe\xfd\xfc" * 8, "application/octet-stream"),
+    (b"abc\0def", "application/octet-stream"),
+])
+def test_builtin_signatures(head, mime):
+    assert _detect_builtin(head) == mime
+
+
+def candidates(*paths):
+    result = []
+    for path in paths:
+        st = os.stat(path)
+        result.append((str(path), st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_nlink))
+    return result
+
+
+def sniff(paths, **kwargs):
+    sniffer = TypeSniffer(threads=1, **kwargs)
+    sniffer.submit(candidates(*paths))
+    return sniffer.finish(), sniffer.stats
+
+
+@pytest.fixture
+def files(tmp_path):
+    (tmp_path / "doc").write_bytes(b"%PDF-1.4\n" + b"x" * 9000)
+    (tmp_path / "pic").write_bytes(b"\x89PNG\r\n\x1a\n" + b"\0" * 9000)
+    (tmp_path / "notes").write_bytes(b"hello\n" * 1500)
+    (tmp_path / "empty").write_bytes(b"")
+    return [tmp_path / name for name in ("doc", "pic", "notes", "empty")]
+
+
+def test_contents_decide_the_type(files):
+    by_mime, stats = sniff(files)
+    assert by_mime == {'application/pdf': {'count': 1, 'size': 9009}, 'image/png': {'count': 1, 'size': 9008},
+                       'text/plain': {'count': 1, 'size': 9000}, 'application/x-empty': {'count': 1, 'size': 0}}
+    assert stats['sniffed'] == 3
+    assert stats['bytes_read'] == 3 * 4096 # only the head of each file
+
+
+def test_read_budget_is_never_exceeded(files):
+    by_mime, stats = sniff(files, max_total_bytes=5000)
+    assert stats['bytes_read'] <= 5000
+    assert (stats['sniffed'], stats['unclassified']) == (1, 2)
+    assert by_mime[UNCLASSIFIED]['count'] == 2
+    assert sum(entry['count'] for entry in by_mime.values()) == len(files)
+
+
+def test_cache_hits_skip_the_read(files, tmp_path):
+    db = tmp_path / "sniff.db"
+    first, _ = sniff(files, cache_path=db)
+    second, stats = sniff(files, cache_path=db)
+    assert second == first
+    assert (stats['cached'], stats['sniffed'], stats['bytes_read']) == (3, 0, 0)
+
+
+def test_changed_files_are_sniffed_again(files, tmp_path):
+    db = tmp_path / "sniff.db"
+    _, pic, notes = files[:3]
+    sniff(files, cache_path=db)
+    st = os.stat(pic)
+    os.utime(pic, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9)) # same size, new mtime
+    notes.write_bytes(b"%PDF-1.5\n") # new size
+    by_mime, stats = sniff(files, cache_path=db)
+    assert (stats['cached'], stats['sniffed']) == (1, 2)
+    assert by_mime['application/pdf']['count'] == 2
+    assert 'text/plain' not in by_mime
@@ -0,0 +1,39 @@
+from scanner.service.analysis import DuplicateFinder
+from scanner.service.prune import PruneRules
+from scanner.service.scan import scan_tree, ScanOptions
+from scanner.service.stream import iter_scan, DirRecord, FileRecord
+
+
+def make_tree(root):
+    (root / "a" / "skip").mkdir(parents=True)
+    (root / "a" / "one").write_bytes(b"1" * 10)
+    (root / "a" / "skip" / "hidden").write_bytes(b"h")
+    (root / "b").write_bytes(b"1" * 10)
+    (root / "c").write_bytes(b"c" * 3)
+
+
+def test_same_files_as_scan(tmp_path):
+    make_tree(tmp_path)
+    rules = PruneRules(["skip"], mounts={})
+    summary = scan_tree(str(tmp_path), 2, options=ScanOptions(collect_files=True, prune=rules))
+    records = list(iter_scan(tmp_path, threads=2, include_dirs=True, prune=rules))
+    files = [record for record in records if isinstance(record, FileRecord)]
+    assert sorted((f.path, f.size) for f in files) == \
+        sorted((row['path'], row['size']) for row in summary['all_files_details'])
+    dirs = {record.path: record for record in records if isinstance(record, DirRecord)}
+    assert dirs[str(tmp_path)].files == 2
+    assert dirs[str(tmp_path)].subdirs == 1
+    assert str(tmp_path / "a" / "skip") not in dirs
+
+
+def test_duplicates_from_stream(tmp_path):
+    make_tree(tmp_path)
+    groups = DuplicateFinder(threads=2).find(iter_scan(tmp_path, threads=2))
+    assert [sorted(group['paths']) for group in groups] == [[str(tmp_path / "a" / "one"), str(tmp_path / "b")]]
+
+
+def test_scan_with_telemetry(tmp_path):
+    make_tree(tmp_path)
+    summary = scan_tree(str(tmp_path), 1, options=ScanOptions(telemetry=True))
+    assert summary['total_files'] == 4
+    assert sum(summary['metrics'].stat_ns.counts) == 4
@@ -0,0 +1,30 @@
+from scanner.service.scan import scan_tree
+from scanner.service.telemetry import ScanTelemetry, to_prometheus
+
+
+def make_tree(root, width=6, depth=2):
+    dirs = [root]
+    for _ in range(depth):
+        dirs = [d / f"d{i}" for d in dirs for i in range(width)]
+        for d in dirs:
+            d.mkdir()
+            (d / "f").write_bytes(b"x")
+
+
+def test_thread_engine_reports_the_scheduler_peak(tmp_path):
+    make_tree(tmp_path)
+    telemetry = ScanTelemetry(2, interval=3600) # no tick ever samples
+    summary = scan_tree(str(tmp_path), 2, telemetry=telemetry)
+    assert summary['total_files'] == 42
+    assert summary['telemetry']['max_queue_depth'] >= 2
+
+
+def test_prometheus_has_no_path_labels(tmp_path):
+    make_tree(tmp_path)
+    telemetry = ScanTelemetry(1, interval=3600)
+    summary = scan_tree(str(tmp_path), 1, telemetry=telemetry)
+    text = to_prometheus(summary['telemetry'], summary)
+    assert str(tmp_path) not in text
+    slow = [line for line in text.splitlines() if line.startswith("filelens_scan_slow_directory_seconds{")]
+    assert slow[0].startswith('filelens_scan_slow_directory_seconds{rank="1"}')
+    assert len(slow) == 10